@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+MP3 encoders fed directly with PCM from a TTS backend
+
+Each encoder takes a `produce(sink)` callable that writes signed 16-bit
+mono PCM to `sink`, so no intermediate audio file is ever written. The
+output goes to '<output>.part' and is renamed only once encoding succeeds,
+so an interrupted run never leaves a truncated MP3 behind.
+
+Encoders:
+    ffmpeg - PCM is piped to an ffmpeg child process through stdin
+    lame   - PCM is encoded in-process with the optional lameenc package
+             (pip install lameenc)
+"""
+
+import os
+
+from ffmpeg_runner import run_ffmpeg
+
+
+def _partial_path(output_path):
+    return output_path + '.part'
+
+
+def encode_with_ffmpeg(produce, output_path, sample_rate, bitrate='128k', log_dir=None):
+    """Encode PCM to MP3 by piping it into ffmpeg (logging to log_dir, see run_ffmpeg)."""
+    part_path = _partial_path(output_path)
+    cmd = [
+        'ffmpeg',
+        '-v', 'error',
+        '-f', 's16le',
+        '-ar', str(sample_rate),
+        '-ac', '1',
+        '-i', 'pipe:0',
+        '-acodec', 'mp3',
+        '-ab', bitrate,
+        '-f', 'mp3',
+        part_path,
+        '-y'
+    ]
+    try:
+        run_ffmpeg(cmd, stdin_writer=produce, log_dir=log_dir,
+                   label=f"mp3_{os.path.splitext(os.path.basename(output_path))[0]}")
+        os.replace(part_path, output_path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    return output_path
+
+
+class _LameSink:
+    """Encodes each PCM block as it arrives and appends the MP3 data."""
+
+    def __init__(self, encoder, output):
+        self.encoder = encoder
+        self.output = output
+
+    def write(self, data):
+        self.output.write(self.encoder.encode(data))
+
+
+def encode_in_process(produce, output_path, sample_rate, bitrate='128k', log_dir=None):
+    """Encode PCM to MP3 inside this process with lameenc (log_dir is unused)."""
+    try:
+        import lameenc
+    except ImportError:
+        raise RuntimeError("The 'lame' encoder requires lameenc: pip install lameenc")
+
+    encoder = lameenc.Encoder()
+    encoder.set_bit_rate(int(bitrate.rstrip('k')))
+    encoder.set_in_sample_rate(sample_rate)
+    encoder.set_channels(1)
+    encoder.set_quality(2)
+
+    part_path = _partial_path(output_path)
+    try:
+        with open(part_path, 'wb') as f:
+            produce(_LameSink(encoder, f))
+            f.write(encoder.flush())
+        os.replace(part_path, output_path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    return output_path
+
+
+ENCODERS = {
+    'ffmpeg': encode_with_ffmpeg,
+    'lame': encode_in_process,
+}
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Assemble the narration track for the whole video in one encode
+
+Every narration is decoded once to PCM and placed on a sample-accurate
+timeline, with silence filling each scene's gap. The finished timeline is
+encoded to a single AAC track that is muxed with the video, so there is no
+per-scene lossy-to-lossy transcoding and no AAC priming gap at scene
+boundaries.
+
+Scene boundaries are quantised to whole video frames so the audio and
+video timelines line up exactly.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from build_profiler import propagate
+from ffmpeg_runner import progress_printer, run_ffmpeg
+
+sample_rate = 48000
+bytes_per_sample = 2  # signed 16-bit mono
+
+
+def frame_aligned_timeline(scenes, fps):
+    """Return [(start_seconds, frame_count)] for each scene.
+
+    A scene lasts duration + gap seconds, rounded to the nearest frame; the
+    next scene starts on the frame after it.
+    """
+    timeline = []
+    start_frame = 0
+    for scene in scenes:
+        frames = max(1, round((scene['duration'] + scene['gap']) * fps))
+        timeline.append((start_frame / fps, frames))
+        start_frame += frames
+    return timeline
+
+
+def decode_to_pcm(audio_file, rate=sample_rate, timeout=None, log_dir=None):
+    """Decode an audio file to signed 16-bit mono PCM bytes."""
+    cmd = [
+        'ffmpeg',
+        '-v', 'error',
+        '-i', audio_file,
+        '-f', 's16le',
+        '-ac', '1',
+        '-ar', str(rate),
+        'pipe:1'
+    ]
+    chunks = []
+    run_ffmpeg(cmd, timeout=timeout, stdout_reader=lambda stdout: chunks.append(stdout.read()),
+               label=f"decode_{os.path.splitext(os.path.basename(audio_file))[0]}", log_dir=log_dir)
+    return b''.join(chunks)
+
+
+def build_audio_track(scenes, output_path, fps, codec='aac', bitrate='192k', jobs=4,
+                      timeout=None, show_progress=False, log_dir=None):
+    """Encode all narrations, laid out on the scene timeline, to one track.
+
+    Narrations are decoded concurrently and written to the encoder in
+    scene order; each is truncated or padded with silence to the exact
+    sample length of its scene. `timeout` applies to each ffmpeg run, and
+    their logs go to log_dir (see run_ffmpeg).
+    """
+    cmd = [
+        'ffmpeg',
+        '-v', 'error',
+        '-f', 's16le',
+        '-ar', str(sample_rate),
+        '-ac', '1',
+        '-i', 'pipe:0',
+        '-c:a', codec,
+        '-b:a', bitrate,
+        output_path,
+        '-y'
+    ]
+    timeline = frame_aligned_timeline(scenes, fps)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        decode = propagate(decode_to_pcm)
+        decoded = [executor.submit(decode, scene['audio'], timeout=timeout, log_dir=log_dir)
+                   for scene in scenes]
+
+        def write_timeline(stdin):
+            written = 0
+            for (start, frames), future in zip(timeline, decoded):
+                # Place every scene at its exact sample offset
+                start_sample = round(start * sample_rate)
+                end_sample = round((start + frames / fps) * sample_rate)
+                if start_sample > written:
+                    stdin.write(bytes((start_sample - written) * bytes_per_sample))
+                    written = start_sample
+
+                length = (end_sample - start_sample) * bytes_per_sample
+                pcm = future.result()[:length]
+                stdin.write(pcm)
+                stdin.write(bytes(length - len(pcm)))
+                written = end_sample
+
+        total_duration = sum(frames for _, frames in timeline) / fps
+        run_ffmpeg(cmd, duration=total_duration, timeout=timeout, stdin_writer=write_timeline,
+                   label='narration_track', log_dir=log_dir,
+                   on_progress=progress_printer('narration') if show_progress else None)
+
+    return output_path
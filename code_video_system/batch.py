@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Batch mode: tutorial videos for a whole directory of source files
+
+For every source file matched by the given directories or globs:
+
+    segment  - scenes come from '<file>.script.txt' next to the source if
+               it exists, otherwise top-level imports, functions, classes
+               and statements become scenes with a generated narration
+    render   - each scene's code is rendered and letterboxed in memory
+    tts      - each scene's narration is synthesized to MP3 (cached)
+    encode   - the frames are piped to ffmpeg with the narration track
+               and subtitles (create_video_resized_correct.py, pipe mode)
+
+Render, TTS and encode tasks from all files go through one shared worker
+pool, so work from different files interleaves and keeps every core busy.
+A few files are in flight at once; each is coordinated by a lightweight
+thread that waits on its tasks.
+
+Progress is recorded in <output>/progress.json after every file. A rerun
+skips files whose video exists and whose inputs are unchanged (the source,
+its <file>.script.txt, the TTS backend, the renderer and the encoding
+profile), so an interrupted overnight run resumes where it stopped.
+
+Each file gets <output>/<path>/ with <name>.mp4, the narration MP3s, the
+scene manifest, its ffmpeg logs (logs/) and the script.txt the video was
+built from (copy it next to the source as <file>.script.txt to edit the
+narration).
+
+Usage:
+    python batch.py ../some_repo -o videos
+    python batch.py 'src/**/*.py' -o videos -j 8 --profile still
+"""
+
+import argparse
+import ast
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import create_video_resized_correct as video
+import generate_audio
+from build_profiler import span
+from code_to_image_simple import SimpleCodeImageGenerator
+from content_cache import ContentCache, hash_file
+from resize_screenshots import letterbox
+from scene_manifest import update_scenes
+from scene_script import format_script, load_script, settings_hash
+from tts_backends import BACKENDS, TTSError, get_backend
+
+output_dir = 'batch_output'
+progress_file = 'progress.json'
+
+# Longest scene, in source lines, before a block is split over several scenes
+max_scene_lines = 40
+
+# Silence after each scene (none after the last one)
+scene_gap = 1.0
+
+default_workers = os.cpu_count() or 1
+
+# Files coordinated at once; more keeps the pool fuller but holds more
+# rendered frames in memory
+default_files_in_flight = 2
+
+
+# -- discovery ---------------------------------------------------------------
+
+def find_sources(patterns):
+    """Return the source files for directories (searched for *.py) and globs."""
+    sources = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, '**', '*.py'), recursive=True)
+        else:
+            matches = glob.glob(pattern, recursive=True)
+        sources.extend(sorted(path for path in matches if os.path.isfile(path)))
+    # Keep the first occurrence of each file
+    return list(dict.fromkeys(os.path.normpath(path) for path in sources))
+
+
+def output_key(source):
+    """Directory name under the output folder for a source file."""
+    relative = os.path.relpath(os.path.abspath(source))
+    relative = relative.replace('..' + os.sep, '').replace(os.sep, '__')
+    return os.path.splitext(relative)[0]
+
+
+# -- segmentation ------------------------------------------------------------
+
+def _first_line(docstring):
+    return docstring.strip().splitlines()[0] if docstring and docstring.strip() else ''
+
+
+def _describe(kind, node, start, end):
+    """Narration for a top-level block."""
+    if kind == 'import':
+        names = []
+        for statement in node:
+            if isinstance(statement, ast.ImportFrom):
+                names.append(statement.module or '.')
+            else:
+                names.extend(alias.name for alias in statement.names)
+        return f"必要なモジュールとして、{'、'.join(dict.fromkeys(names))}をインポートしています。"
+    if kind in ('function', 'class'):
+        label = '関数' if kind == 'function' else 'クラス'
+        summary = _first_line(ast.get_docstring(node))
+        text = f"{node.name}{label}を定義しています。"
+        return f"{text}\n{summary}" if summary else text
+    return f"{start}行目から{end}行目の処理です。"
+
+
+def _python_blocks(source):
+    """Split Python source into (kind, name, start, end, text) top-level blocks."""
+    tree = ast.parse(source)
+    blocks = []
+    imports = []
+    for node in tree.body:
+        start = min([node.lineno] + [d.lineno for d in getattr(node, 'decorator_list', [])])
+        end = node.end_lineno
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            imports.append(node)
+            if blocks and blocks[-1][0] == 'import':
+                kind, name, block_start, _, _ = blocks.pop()
+                start = block_start
+            blocks.append(('import', 'インポート', start, end, _describe('import', imports, start, end)))
+            continue
+        imports = []
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            blocks.append(('function', node.name, start, end, _describe('function', node, start, end)))
+        elif isinstance(node, ast.ClassDef):
+            blocks.append(('class', node.name, start, end, _describe('class', node, start, end)))
+        elif blocks and blocks[-1][0] == 'code' and end - blocks[-1][2] < max_scene_lines:
+            # Merge consecutive statements into one scene
+            _, name, block_start, _, _ = blocks.pop()
+            blocks.append(('code', name, block_start, end, _describe('code', node, block_start, end)))
+        else:
+            blocks.append(('code', '処理', start, end, _describe('code', node, start, end)))
+    return blocks
+
+
+def script_path(source):
+    """The hand-written script that overrides a source file's generated scenes."""
+    return os.path.splitext(source)[0] + '.script.txt'
+
+
+def segment_source(path):
+    """Return the scenes of a source file: dicts with id, title, start, end, text."""
+    script = script_path(path)
+    if os.path.exists(script):
+        return [{'id': scene['id'], 'title': scene['title'], 'start': scene['start'],
+                 'end': scene['end'], 'text': scene['text']} for scene in load_script(script)]
+
+    with open(path, 'r', encoding='utf-8') as f:
+        source = f.read()
+    line_count = len(source.splitlines())
+    try:
+        blocks = _python_blocks(source)
+    except SyntaxError:
+        blocks = []
+    if not blocks and line_count:
+        blocks = [('code', '処理', 1, line_count, f"1行目から{line_count}行目の処理です。")]
+
+    scenes = []
+    for kind, name, start, end, text in blocks:
+        # Long blocks are shown over several scenes
+        for part, chunk_start in enumerate(range(start, end + 1, max_scene_lines)):
+            chunk_end = min(end, chunk_start + max_scene_lines - 1)
+            scenes.append({
+                'id': f"scene{len(scenes) + 1:02d}",
+                'title': name if part == 0 else f"{name}（続き）",
+                'start': chunk_start,
+                'end': chunk_end,
+                'text': (f"{chunk_start}行目から{chunk_end}行目の処理です。" if kind == 'code'
+                         else text if part == 0 else f"{name}の続きです。"),
+            })
+    return scenes
+
+
+# -- progress ----------------------------------------------------------------
+
+class Progress:
+    """Per-file results in <output>/progress.json, saved after every change."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.files = json.load(f)
+        except FileNotFoundError:
+            self.files = {}
+
+    def is_done(self, key, build_hash):
+        entry = self.files.get(key, {})
+        return (entry.get('status') == 'done' and entry.get('build_hash') == build_hash
+                and os.path.exists(entry.get('output', '')))
+
+    def record(self, key, **fields):
+        with self._lock:
+            self.files[key] = dict(fields, finished=time.strftime('%Y-%m-%dT%H:%M:%S'))
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.files, f, ensure_ascii=False, indent=2)
+                f.write('\n')
+            os.replace(tmp_path, self.path)
+
+
+# -- per-file work -----------------------------------------------------------
+
+def build_hash(source, backend, generator, profile):
+    """Hash of everything a file's video is built from, for resuming."""
+    script = script_path(source)
+    return settings_hash(
+        {'source': hash_file(source),
+         'script': hash_file(script) if os.path.exists(script) else None,
+         'max_scene_lines': max_scene_lines, 'scene_gap': scene_gap},
+        {'audio': generate_audio.audio_settings(backend), 'render': generator.settings()},
+        dict(video.encoding_profiles[profile], profile=profile),
+    )
+
+
+def render_frame(generator, code, title):
+    """Render code and letterbox it to the video resolution, in memory."""
+    width, height = (int(n) for n in video.resolution.split('x'))
+    with span('render', 'screenshots', title=title):
+        return letterbox(generator.render_image(code, title), width, height)
+
+
+def build_file(source, work_dir, pool, backend, cache, generator, profile):
+    """Build the video for one source file. Returns (output_path, scene_count).
+
+    Rendering and TTS for every scene are submitted to the shared `pool`
+    together; the encode is submitted once they are all done.
+    """
+    name = os.path.splitext(os.path.basename(source))[0]
+    output = os.path.join(work_dir, f"{name}.mp4")
+    os.makedirs(os.path.join(work_dir, 'audio'), exist_ok=True)
+    # Files in flight run ffmpeg with the same labels, so each logs to its own folder
+    log_dir = os.path.join(work_dir, 'logs')
+
+    scenes = segment_source(source)
+    if not scenes:
+        raise ValueError('no scenes (empty file?)')
+    with open(source, 'r', encoding='utf-8') as f:
+        lines = f.readlines()
+
+    for index, scene in enumerate(scenes):
+        scene['audio'] = os.path.join(work_dir, 'audio', f"{scene['id']}_narration.mp3")
+        scene['image'] = f"pic/{scene['id']}.png"  # nominal; frames stay in memory
+        scene['gap'] = scene_gap if index < len(scenes) - 1 else 0.0
+
+    renders = {
+        scene['id']: pool.submit(render_frame, generator, ''.join(lines[scene['start'] - 1:scene['end']]),
+                                 f"{os.path.basename(source)} - Lines {scene['start']}-{scene['end']}")
+        for scene in scenes
+    }
+    narrations = {
+        scene['id']: pool.submit(generate_audio.process_scene, scene, backend, cache, log_dir=log_dir)
+        for scene in scenes
+    }
+
+    frames = {scene_id: future.result() for scene_id, future in renders.items()}
+    for scene in scenes:
+        scene['duration'] = narrations[scene['id']].result()['duration']
+
+    # Record what the video is built from, in the stage formats
+    with open(os.path.join(work_dir, 'script.txt'), 'w', encoding='utf-8') as f:
+        f.write(format_script([dict(scene, display_time=round(scene['duration'], 1))
+                               for scene in scenes]))
+    settings = generate_audio.audio_settings(backend)
+    update_scenes([dict({key: scene[key] for key in ('id', 'audio', 'duration', 'gap', 'text')},
+                        audio_settings=settings)
+                   for scene in scenes], os.path.join(work_dir, 'scenes.json'), prune=True)
+
+    encode = pool.submit(video.assemble_pipe, scenes, output, work_dir, profile=profile,
+                         frame_source=lambda scene: frames[scene['id']], log_dir=log_dir)
+    if not encode.result():
+        raise RuntimeError('encoding failed')
+    return output, len(scenes)
+
+
+def run_batch(sources, out_dir=output_dir, workers=default_workers,
+              files_in_flight=default_files_in_flight, backend=None, cache=None,
+              profile=video.default_profile, force=False):
+    """Build videos for `sources`, skipping finished ones. Returns the Progress."""
+    os.makedirs(out_dir, exist_ok=True)
+    progress = Progress(os.path.join(out_dir, progress_file))
+    generator = SimpleCodeImageGenerator(theme='light', font_size=16)
+    total = len(sources)
+    counter = {'finished': 0}
+    counter_lock = threading.Lock()
+
+    def process(source):
+        key = output_key(source)
+        inputs_hash = build_hash(source, backend, generator, profile)
+        if not force and progress.is_done(key, inputs_hash):
+            status = 'up to date'
+        else:
+            start = time.perf_counter()
+            try:
+                output, scene_count = build_file(source, os.path.join(out_dir, key), pool,
+                                                 backend, cache, generator, profile)
+            except Exception as e:
+                progress.record(key, source=source, build_hash=inputs_hash, status='failed',
+                                error=str(e))
+                status = f"✗ failed: {e}"
+            else:
+                elapsed = time.perf_counter() - start
+                progress.record(key, source=source, build_hash=inputs_hash, status='done',
+                                output=output, scenes=scene_count, seconds=round(elapsed, 2))
+                status = f"✓ {output} ({scene_count} scenes, {elapsed:.1f}s)"
+        with counter_lock:
+            counter['finished'] += 1
+            print(f"[{counter['finished']}/{total}] {source}: {status}", flush=True)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='work') as pool, \
+            ThreadPoolExecutor(max_workers=max(1, files_in_flight), thread_name_prefix='file') as files:
+        list(files.map(process, sources))
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build tutorial videos for many source files')
+    parser.add_argument('sources', nargs='+', help='directories (searched for *.py) or glob patterns')
+    parser.add_argument('-o', '--output', default=output_dir, help=f'output directory (default: {output_dir})')
+    parser.add_argument('-j', '--workers', type=int, default=default_workers,
+                        help=f'shared worker pool size (default: {default_workers})')
+    parser.add_argument('--files', type=int, default=default_files_in_flight,
+                        help=f'files in flight at once (default: {default_files_in_flight})')
+    parser.add_argument('--profile', choices=sorted(video.encoding_profiles), default='still',
+                        help='encoding profile (default: still)')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default=generate_audio.backend_name,
+                        help=f'TTS engine (default: {generate_audio.backend_name})')
+    parser.add_argument('--no-cache', action='store_true', help='do not reuse cached narrations')
+    parser.add_argument('--force', action='store_true', help='rebuild files that are already done')
+    args = parser.parse_args()
+
+    sources = find_sources(args.sources)
+    if not sources:
+        print("✗ Error: no source files matched")
+        sys.exit(1)
+
+    try:
+        backend = get_backend(args.backend, voice=generate_audio.voice, rate=generate_audio.rate)
+    except TTSError as e:
+        print(f"✗ Error: {e}")
+        sys.exit(1)
+    cache = None
+    if not args.no_cache:
+        cache = ContentCache(generate_audio.cache_dir, max_bytes=generate_audio.cache_size_mb * 1024 * 1024)
+
+    print(f"Building videos for {len(sources)} files ({args.workers} workers, {args.files} files at once)")
+    start = time.perf_counter()
+    try:
+        progress = run_batch(sources, args.output, args.workers, args.files, backend, cache,
+                             args.profile, args.force)
+    finally:
+        backend.close()
+
+    keys = {output_key(source) for source in sources}
+    failed = [key for key in keys if progress.files.get(key, {}).get('status') != 'done']
+    print(f"\n{len(keys) - len(failed)}/{len(keys)} videos done in {time.perf_counter() - start:.1f}s "
+          f"(progress: {os.path.join(args.output, progress_file)})")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
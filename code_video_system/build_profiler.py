@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+Wall time, CPU time and peak memory of the video build
+
+Stages wrap their work in span() blocks, per stage and per scene:
+
+    with span('render', 'screenshots', scene=scene['id']):
+        generator.generate_image(...)
+
+Each span records its wall time, the CPU time of the thread running it
+plus that of the ffmpeg runs it started (ffmpeg_runner.py reports their
+rusage), and the peak RSS of this process and all of its child processes
+(TTS engines, ffmpeg) while it was open. Work a span hands to helper
+threads (encoder feeders, worker pools) counts too when the helper runs
+under attach(current_spans()) or a function wrapped with propagate(). Memory is sampled from /proc on
+a background thread, so the peak is that of the whole process tree and a
+scene's peak includes whatever ran concurrently with it.
+
+Profiling is off unless enable() is called or the CODEVIDEO_TRACE
+environment variable names a trace file, in which case the process writes
+its spans there on exit. Only the latest max_spans spans and max_samples
+memory samples are kept, so a long-running process (render_server.py,
+preview.py's watch mode) does not grow without bound; the process's peak
+RSS is tracked separately and is never dropped. pipeline.py sets it for every stage it runs and
+merges the stage traces into one Chrome trace (open it in chrome://tracing
+or https://ui.perfetto.dev).
+
+check_budgets() applies the budgets from the requirements: 5 minutes for
+100 lines of code, 30 minutes for 1000 lines (linear in between and
+beyond) and 4GB of memory.
+
+Usage:
+    python build_profiler.py logs/pipeline/trace.json   # summarize a trace
+"""
+
+import argparse
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Environment variable naming the trace file a process writes on exit
+TRACE_ENV = 'CODEVIDEO_TRACE'
+
+# Seconds between memory samples
+sample_interval = 0.1
+
+# Finished spans and memory samples kept for the trace (the oldest are
+# dropped): about one hour of samples, and far more spans than a build of
+# 1000 lines records
+max_spans = 20000
+max_samples = 36000
+
+# Build time budget as (lines of code, seconds) points, and memory budget
+time_budgets = [(100, 5 * 60), (1000, 30 * 60)]
+memory_budget_mb = 4 * 1024
+
+enabled = False
+
+_lock = threading.Lock()
+_local = threading.local()
+_spans = deque(maxlen=max_spans)      # finished span records
+_open = {}                            # id(record) -> record, for the memory sampler
+_samples = deque(maxlen=max_samples)  # (perf_counter time, process tree RSS in MB)
+_peak_rss_mb = 0.0
+_sampler = None
+_origin = time.perf_counter()
+_origin_epoch = time.time()
+
+
+# -- memory ------------------------------------------------------------------
+
+def _max_rss_mb(who):
+    if resource is None:
+        return 0.0
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return resource.getrusage(who).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def _rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, IndexError, ValueError):
+        return 0.0  # the process exited between listing and reading
+
+
+def _children_by_parent():
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'rb') as f:
+                stat = f.read()
+            # The command name may contain spaces; the fields after it do not
+            ppid = int(stat[stat.rindex(b')') + 2:].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    return children
+
+
+def tree_rss_mb(pid=None):
+    """Current RSS of a process and all of its descendants, in MB.
+
+    Without /proc (macOS, Windows) this falls back to the peak RSS of this
+    process so far.
+    """
+    if not os.path.isdir('/proc'):
+        return _max_rss_mb(resource.RUSAGE_SELF) if resource else 0.0
+    children = _children_by_parent()
+    total, pending = 0.0, [os.getpid() if pid is None else pid]
+    while pending:
+        current = pending.pop()
+        total += _rss_mb(current)
+        pending.extend(children.get(current, []))
+    return total
+
+
+def _sample_memory():
+    global _peak_rss_mb
+    while True:
+        rss = tree_rss_mb()
+        now = time.perf_counter()
+        with _lock:
+            _peak_rss_mb = max(_peak_rss_mb, rss)
+            _samples.append((now, rss))
+            for record in _open.values():
+                record['peak_rss_mb'] = max(record['peak_rss_mb'], rss)
+        time.sleep(sample_interval)
+
+
+def enable():
+    """Start recording spans and sampling memory in this process."""
+    global enabled, _sampler
+    enabled = True
+    if _sampler is None:
+        _sampler = threading.Thread(target=_sample_memory, name='memory-sampler', daemon=True)
+        _sampler.start()
+
+
+# -- spans -------------------------------------------------------------------
+
+@contextmanager
+def span(name, category='stage', scene=None, **args):
+    """Record the wall time, CPU time and peak RSS of the enclosed block.
+
+    Yields the span record (None while profiling is disabled); extra
+    keyword arguments are stored with it and shown in the trace.
+    """
+    if not enabled:
+        yield None
+        return
+    record = {
+        'name': name, 'category': category, 'scene': scene, 'args': args,
+        'thread': threading.get_ident(),
+        'start': time.perf_counter(), 'end': None,
+        'cpu_time': 0.0, 'helper_cpu_time': 0.0, 'child_cpu_time': 0.0,
+        # The sampler's latest value; walking /proc here would slow every span
+        'peak_rss_mb': _last_rss_mb(),
+    }
+    stack = _local.__dict__.setdefault('stack', [])
+    stack.append(record)
+    with _lock:
+        _open[id(record)] = record
+    cpu_start = time.thread_time()
+    try:
+        yield record
+    finally:
+        record['end'] = time.perf_counter()
+        record['cpu_time'] = (time.thread_time() - cpu_start + record['helper_cpu_time']
+                              + record['child_cpu_time'])
+        stack.pop()
+        with _lock:
+            del _open[id(record)]
+            _spans.append(record)
+
+
+def _last_rss_mb():
+    with _lock:
+        return _samples[-1][1] if _samples else 0.0
+
+
+def current_spans():
+    """The spans open in this thread, for a helper thread to attach() to."""
+    return list(_local.__dict__.get('stack', []))
+
+
+@contextmanager
+def attach(parents):
+    """Count the enclosed work of a helper thread towards `parents`.
+
+    `parents` is current_spans() of the thread that handed the work over.
+    The helper's CPU time is added to each of them, and the child
+    processes it runs and the spans it opens nest under them.
+    """
+    if not enabled or not parents:
+        yield
+        return
+    previous = _local.__dict__.get('stack', [])
+    _local.stack = list(parents) + previous
+    cpu_start = time.thread_time()
+    try:
+        yield
+    finally:
+        cpu_time = time.thread_time() - cpu_start
+        _local.stack = previous
+        with _lock:
+            for record in parents:
+                record['helper_cpu_time'] += cpu_time
+
+
+def propagate(function):
+    """Wrap `function` to run attached to the spans open in this thread now."""
+    parents = current_spans()
+
+    def run(*args, **kwargs):
+        with attach(parents):
+            return function(*args, **kwargs)
+    return run
+
+
+def record_child(usage):
+    """Attribute a finished child process to the spans open in this thread.
+
+    `usage` is a dict with label, wall_time, cpu_time and max_rss_mb, as
+    returned by ffmpeg_runner.run_ffmpeg(); the child also gets a span of
+    its own.
+    """
+    if not enabled:
+        return
+    end = time.perf_counter()
+    cpu_time = usage.get('cpu_time') or 0.0
+    max_rss = usage.get('max_rss_mb') or 0.0
+    stack = _local.__dict__.get('stack', [])
+    with _lock:
+        for record in stack:
+            record['child_cpu_time'] += cpu_time
+            record['peak_rss_mb'] = max(record['peak_rss_mb'], max_rss)
+        _spans.append({
+            'name': usage.get('label') or 'child', 'category': 'ffmpeg',
+            'scene': stack[-1]['scene'] if stack else None, 'args': {},
+            'thread': threading.get_ident(),
+            'start': end - usage.get('wall_time', 0.0), 'end': end,
+            'cpu_time': cpu_time, 'helper_cpu_time': 0.0, 'child_cpu_time': cpu_time,
+            'peak_rss_mb': max_rss,
+        })
+
+
+def spans():
+    """Return a copy of the finished span records."""
+    with _lock:
+        return list(_spans)
+
+
+def process_usage():
+    """Wall time, CPU time (with waited-for children) and peak RSS of this process.
+
+    The peak is the sampled peak of the process tree when profiling is
+    enabled, otherwise the larger of this process's and any child's peak.
+    """
+    cpu_time = time.process_time()
+    peak = _max_rss_mb(resource.RUSAGE_SELF) if resource else 0.0
+    if resource is not None:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_time += children.ru_utime + children.ru_stime
+        peak = max(peak, _max_rss_mb(resource.RUSAGE_CHILDREN))
+    with _lock:
+        if _samples:
+            peak = max(peak, _peak_rss_mb)
+    return {
+        'wall_time': time.perf_counter() - _origin,
+        'cpu_time': cpu_time,
+        'peak_rss_mb': peak,
+    }
+
+
+# -- Chrome trace ------------------------------------------------------------
+
+def trace_events(process_name=None):
+    """Return this process's spans and memory samples as Chrome trace events."""
+    pid = os.getpid()
+
+    def micros(t):
+        return round((t - _origin) * 1_000_000)
+
+    events = [{'ph': 'M', 'name': 'process_name', 'pid': pid, 'tid': 0,
+               'args': {'name': process_name or os.path.basename(sys.argv[0]) or 'python'}}]
+    for record in spans():
+        args = dict(record['args'])
+        if record['scene'] is not None:
+            args['scene'] = record['scene']
+        args.update(cpu_time=round(record['cpu_time'], 3),
+                    helper_cpu_time=round(record['helper_cpu_time'], 3),
+                    child_cpu_time=round(record['child_cpu_time'], 3),
+                    peak_rss_mb=round(record['peak_rss_mb'], 1))
+        events.append({
+            'ph': 'X', 'name': record['name'], 'cat': record['category'],
+            'pid': pid, 'tid': record['thread'],
+            'ts': micros(record['start']), 'dur': micros(record['end']) - micros(record['start']),
+            'args': args,
+        })
+    with _lock:
+        samples = list(_samples)
+    for when, rss in samples:
+        events.append({'ph': 'C', 'name': 'memory', 'pid': pid, 'tid': 0,
+                       'ts': micros(when), 'args': {'rss_mb': round(rss, 1)}})
+    return events
+
+
+def write_trace(path, process_name=None, events=None):
+    """Write a Chrome trace JSON file with this process's events.
+
+    The start time and resource usage of the process are stored in
+    'otherData', so traces from several processes can be merged.
+    """
+    trace = {
+        'traceEvents': trace_events(process_name) if events is None else events,
+        'displayTimeUnit': 'ms',
+        'otherData': dict(process_usage(), start_time=_origin_epoch),
+    }
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(trace, f)
+    os.replace(tmp_path, path)
+
+
+def load_trace(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def merge_events(trace, start_time=None):
+    """Return the events of a loaded trace shifted onto this process's timeline.
+
+    start_time is the epoch time the timeline starts at (default: when this
+    process started profiling).
+    """
+    start_time = _origin_epoch if start_time is None else start_time
+    offset = round((trace['otherData']['start_time'] - start_time) * 1_000_000)
+    events = []
+    for event in trace['traceEvents']:
+        event = dict(event)
+        if 'ts' in event:
+            event['ts'] += offset
+        events.append(event)
+    return events
+
+
+# -- budgets -----------------------------------------------------------------
+
+def time_budget(lines):
+    """Seconds allowed for building the video of `lines` lines of code."""
+    (low_lines, low_seconds), (high_lines, high_seconds) = time_budgets
+    if lines <= low_lines:
+        return float(low_seconds)
+    slope = (high_seconds - low_seconds) / (high_lines - low_lines)
+    return low_seconds + (lines - low_lines) * slope
+
+
+def check_budgets(wall_time, peak_rss_mb, lines, max_seconds=None, max_memory_mb=None):
+    """Return a message for every budget the run exceeded (empty if none).
+
+    max_seconds defaults to time_budget(lines), max_memory_mb to
+    memory_budget_mb.
+    """
+    max_seconds = time_budget(lines) if max_seconds is None else max_seconds
+    max_memory_mb = memory_budget_mb if max_memory_mb is None else max_memory_mb
+    violations = []
+    if wall_time > max_seconds:
+        violations.append(f"build took {wall_time:.1f}s, budget for {lines} lines is {max_seconds:.0f}s")
+    if peak_rss_mb > max_memory_mb:
+        violations.append(f"peak memory {peak_rss_mb:.0f} MB exceeds the {max_memory_mb:.0f} MB budget")
+    return violations
+
+
+def summarize_spans(events):
+    """Return report lines for the 'X' events of a trace, grouped by name."""
+    totals = {}
+    for event in events:
+        if event.get('ph') != 'X':
+            continue
+        key = (event.get('cat', ''), event['name'])
+        total = totals.setdefault(key, {'count': 0, 'wall': 0.0, 'cpu': 0.0, 'peak': 0.0})
+        total['count'] += 1
+        total['wall'] += event['dur'] / 1_000_000
+        total['cpu'] += event['args'].get('cpu_time', 0.0)
+        total['peak'] = max(total['peak'], event['args'].get('peak_rss_mb', 0.0))
+    lines = [f"{'category':<13}{'span':<22}{'count':>6}{'wall (s)':>10}{'CPU (s)':>10}{'peak (MB)':>11}"]
+    for (category, name), total in sorted(totals.items()):
+        lines.append(f"{category:<13}{name:<22}{total['count']:>6}{total['wall']:>10.2f}"
+                     f"{total['cpu']:>10.2f}{total['peak']:>11.0f}")
+    return lines
+
+
+def _write_on_exit(path):
+    try:
+        write_trace(path)
+    except OSError as e:
+        print(f"✗ Could not write trace {path}: {e}", file=sys.stderr)
+
+
+if os.environ.get(TRACE_ENV):
+    enable()
+    atexit.register(_write_on_exit, os.environ[TRACE_ENV])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize a build trace per span')
+    parser.add_argument('trace', help='Chrome trace JSON written by pipeline.py or a stage')
+    args = parser.parse_args()
+
+    trace = load_trace(args.trace)
+    for line in summarize_spans(trace['traceEvents']):
+        print(line)
+    usage = trace.get('otherData', {})
+    if 'wall_time' in usage:
+        print(f"\nWall time: {usage['wall_time']:.2f}s, CPU time: {usage['cpu_time']:.2f}s, "
+              f"peak RSS: {usage['peak_rss_mb']:.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
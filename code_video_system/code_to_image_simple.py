@@ -6,19 +6,23 @@ Only requires Pillow (PIL).
 
 Requirements:
     pip install pillow
+
+Pillow is imported when the first image is rendered, so importing this
+module (e.g. for `codevideo --help`) stays fast.
 """
 
+import os
+import re
 import sys
 
-try:
-    from PIL import Image, ImageDraw, ImageFont
-except ImportError:
-    print("Error: Pillow library is not installed.")
-    print("Please install it using: pip install pillow")
-    sys.exit(1)
 
-import os
-import re
+def _pil():
+    """Import Pillow on first use."""
+    try:
+        from PIL import Image, ImageDraw, ImageFont
+    except ImportError:
+        raise RuntimeError("Pillow library is not installed: pip install pillow")
+    return Image, ImageDraw, ImageFont
 
 
 class SimpleCodeImageGenerator:
@@ -81,6 +85,12 @@ class SimpleCodeImageGenerator:
         self.font_size = font_size
         self.line_height = int(font_size * line_height_ratio)
         
+        # Fonts by size and the compiled token patterns are kept for the
+        # lifetime of the generator, so reusing one generator for many
+        # images loads and compiles them only once
+        self._fonts = {}
+        self._patterns = self._compile_patterns()
+        
         # Try to load a monospace font
         self.font = self._load_font()
         
@@ -89,12 +99,36 @@ class SimpleCodeImageGenerator:
         self.line_number_padding = 15
         self.line_number_width = 50
         
+    def settings(self):
+        """Return the parameters that determine the rendered images.
+
+        Colours and highlighted words are listed by value, so editing a
+        theme or the word lists changes the settings too.
+        """
+        return {
+            'colors': dict(self.theme),
+            'keywords': sorted(self.KEYWORDS),
+            'builtins': sorted(self.BUILTINS),
+            'font': getattr(self.font, 'path', None),
+            'font_size': self.font_size,
+            'line_height': self.line_height,
+            'padding': self.padding,
+            'line_number_padding': self.line_number_padding,
+            'line_number_width': self.line_number_width,
+        }
+
     def _load_font(self):
         """Load a suitable monospace font."""
         return self._load_font_with_size(self.font_size)
     
     def _load_font_with_size(self, size):
-        """Load a suitable monospace font with specific size."""
+        """Load a suitable monospace font with specific size (cached per size)."""
+        if size not in self._fonts:
+            self._fonts[size] = self._find_font(size)
+        return self._fonts[size]
+    
+    def _find_font(self, size):
+        _, _, ImageFont = _pil()
         font_candidates = [
             # macOS - Japanese fonts first
             '/System/Library/Fonts/ヒラギノ角ゴシック W3.ttc',
@@ -138,6 +172,20 @@ class SimpleCodeImageGenerator:
         bbox = self.font.getbbox(text)
         return bbox[2] - bbox[0], bbox[3] - bbox[1]
     
+    def _compile_patterns(self):
+        """Regular expressions for the token types, in match order."""
+        patterns = [
+            (r'#.*$', 'comment'),  # Comments
+            (r'@\w+', 'decorator'),  # Decorators
+            (r'""".*?"""|\'\'\'.*?\'\'\'', 'string'),  # Triple quotes
+            (r'"[^"]*"|\'[^\']*\'', 'string'),  # Strings
+            (r'\b\d+\.?\d*\b', 'number'),  # Numbers
+            (r'\b(?:' + '|'.join(self.KEYWORDS) + r')\b', 'keyword'),  # Keywords
+            (r'\b(?:' + '|'.join(self.BUILTINS) + r')\b', 'function'),  # Built-ins
+            (r'\b\w+(?=\s*\()', 'function'),  # Function calls
+        ]
+        return [(re.compile(pattern), token_type) for pattern, token_type in patterns]
+    
     def _tokenize_line(self, line):
         """Simple tokenizer for Python code."""
         tokens = []
@@ -150,25 +198,12 @@ class SimpleCodeImageGenerator:
         if line.strip().startswith('#'):
             return [(line, 'comment')]
         
-        # Regular expressions for different token types
-        patterns = [
-            (r'#.*$', 'comment'),  # Comments
-            (r'@\w+', 'decorator'),  # Decorators
-            (r'""".*?"""|\'\'\'.*?\'\'\'', 'string'),  # Triple quotes
-            (r'"[^"]*"|\'[^\']*\'', 'string'),  # Strings
-            (r'\b\d+\.?\d*\b', 'number'),  # Numbers
-            (r'\b(?:' + '|'.join(self.KEYWORDS) + r')\b', 'keyword'),  # Keywords
-            (r'\b(?:' + '|'.join(self.BUILTINS) + r')\b', 'function'),  # Built-ins
-            (r'\b\w+(?=\s*\()', 'function'),  # Function calls
-        ]
-        
         # Tokenize the line
         position = 0
         while position < len(line):
             matched = False
             
-            for pattern, token_type in patterns:
-                regex = re.compile(pattern)
+            for regex, token_type in self._patterns:
                 match = regex.match(line, position)
                 if match:
                     # Add any text before the match as default
@@ -188,8 +223,9 @@ class SimpleCodeImageGenerator:
         
         return tokens
     
-    def generate_image(self, code, output_path, title=None):
-        """Generate an image from source code."""
+    def render_image(self, code, title=None):
+        """Render source code to an in-memory PIL image."""
+        Image, ImageDraw, _ = _pil()
         # Split code into lines
         lines = code.split('\n')
         num_lines = len(lines)
@@ -277,7 +313,11 @@ class SimpleCodeImageGenerator:
             draw.line([(i, i), (i, (img_height * scale) - i)], fill=shadow_color, width=1)
         
         # Resize back to target resolution with antialiasing
-        img = img.resize((img_width, img_height), Image.Resampling.LANCZOS)
+        return img.resize((img_width, img_height), Image.Resampling.LANCZOS)
+    
+    def generate_image(self, code, output_path, title=None):
+        """Generate an image file from source code."""
+        img = self.render_image(code, title)
         
         # Save image with higher quality
         img.save(output_path, quality=100, dpi=(600, 600))
@@ -313,8 +353,12 @@ def main():
     base_name = os.path.splitext(os.path.basename(input_file))[0]
     
     # Generate images with both themes
-    generator_dark = SimpleCodeImageGenerator(theme='dark', font_size=14)
-    generator_light = SimpleCodeImageGenerator(theme='light', font_size=14)
+    try:
+        generator_dark = SimpleCodeImageGenerator(theme='dark', font_size=14)
+        generator_light = SimpleCodeImageGenerator(theme='light', font_size=14)
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
     
     # Generate dark theme image
     output_dark = f'{base_name}_dark_simple.png'
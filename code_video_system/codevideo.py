@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+codevideo: one command for all code video tools
+
+Each subcommand is one of the scripts in this folder; its arguments are
+passed on unchanged, so `codevideo audio -j 4` is `python
+generate_audio.py -j 4`. A script's module is only imported when its
+subcommand runs, and Pillow only when an image is rendered, so `--help`,
+`manifest`, `script` and `cache` start without loading any of the media
+stages.
+
+`codevideo build --in-process` runs all stages in this one process
+instead of starting an interpreter per stage (see pipeline.py).
+
+Usage:
+    python codevideo.py --help
+    python codevideo.py build --in-process
+    python codevideo.py manifest
+"""
+
+import argparse
+import importlib
+import sys
+
+# Subcommand -> (module with a main(), description)
+COMMANDS = {
+    'build': ('pipeline', 'build the video, re-running only the stages whose inputs changed'),
+    'screenshots': ('generate_screenshots', 'render the code of each scene'),
+    'audio': ('generate_audio', 'synthesize the narration of each scene'),
+    'resize': ('resize_screenshots', 'letterbox the screenshots to the video resolution'),
+    'video': ('create_video_resized_correct', 'assemble the video from screenshots and narration'),
+    'subtitles': ('subtitles', 'write SRT/WebVTT subtitles from the narration'),
+    'script': ('scene_script', 'show the scenes in script.txt and what changed'),
+    'manifest': ('scene_manifest', 'print the scene manifest'),
+    'cache': ('content_cache', 'show or clear the media caches'),
+    'batch': ('batch', 'build videos for many source files'),
+    'server': ('render_server', 'run or use the resident render service'),
+    'preview': ('preview', 'rebuild a low-resolution preview on every save'),
+    'render': ('code_to_image_simple', 'render a whole source file to an image'),
+    'media': ('media_info', 'print the duration and format of audio files'),
+    'profile': ('build_profiler', 'summarize a build trace'),
+    'benchmark': ('pipeline_benchmark', 'benchmark the pipeline on synthetic sources'),
+}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    width = max(map(len, COMMANDS))
+    parser = argparse.ArgumentParser(
+        prog='codevideo',
+        description='Turn source code into a narrated tutorial video',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='commands:\n' + '\n'.join(f"  {name:<{width}}  {description}"
+                                         for name, (_, description) in COMMANDS.items())
+               + "\n\nRun 'codevideo COMMAND --help' for the options of a command.",
+    )
+    parser.add_argument('command', metavar='COMMAND', help='command to run (see below)')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.command not in COMMANDS:
+        parser.error(f"unknown command '{args.command}' (choose from {', '.join(COMMANDS)})")
+
+    module = importlib.import_module(COMMANDS[args.command][0])
+    # The command parses its own arguments and names itself in its usage
+    sys.argv = [f"codevideo {args.command}", *args.args]
+    module.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache for generated media files
+
+Entries are keyed by a hash of every input that affects the file, e.g. the
+narration text with the backend, voice, rate and encoder settings, or a
+scene's image and audio hashes with the video encoder settings. The cache
+is bounded in size; the least recently used entries are evicted first.
+
+Usage:
+    python content_cache.py                 # entries and size of each cache
+    python content_cache.py --clear audio   # empty .cache/audio
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentCache:
+    """Stores generated files under the hash of their inputs."""
+
+    def __init__(self, cache_dir, max_bytes=500 * 1024 * 1024, extension='.mp3'):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self._lock = threading.Lock()
+        # Running total of the entries' sizes; None until the first put
+        # walks the directory. Eviction re-syncs it with the disk.
+        self._total_bytes = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(text, *settings):
+        """Return the cache key for `text` rendered with the given settings dicts."""
+        payload = {'text': text, 'settings': settings}
+        data = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        return hashlib.sha256(data).hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + self.extension)
+
+    def lookup(self, key):
+        """Return the path of the cached entry for `key`, or None on a miss."""
+        path = self.path_for(key)
+        try:
+            # Mark as recently used for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def get(self, key, dest_path):
+        """Copy the cached entry for `key` to `dest_path`. Returns True on a hit."""
+        path = self.lookup(key)
+        if path is None:
+            return False
+        try:
+            shutil.copyfile(path, dest_path)
+        except FileNotFoundError:
+            return False  # evicted in the meantime
+        return True
+
+    def put(self, key, source_path, move=False):
+        """Store `source_path` under `key` and enforce the size limit.
+
+        With move=True the source file is moved into the cache instead of
+        copied; it must be on the same filesystem as the cache.
+        """
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+
+        if move:
+            os.replace(source_path, path)
+            self._added(path, replaced)
+            return path
+
+        # Write to a temporary file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        os.close(fd)
+        try:
+            shutil.copyfile(source_path, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self._added(path, replaced)
+        return path
+
+    def _added(self, path, replaced):
+        """Count a new entry and evict only when the cache is over its limit."""
+        size = os.path.getsize(path)
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self.entries())
+            else:
+                self._total_bytes += size - replaced
+            over = self._total_bytes > self.max_bytes
+        if over:
+            self.evict()
+
+    def entries(self):
+        """Return (path, size, mtime) for every cache entry."""
+        result = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(self.extension):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                result.append((path, stat.st_size, stat.st_mtime))
+        return result
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        with self._lock:
+            entries = sorted(self.entries(), key=lambda entry: entry[2])
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for path, size, _ in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+            self._total_bytes = total
+            return removed
+
+
+def cache_stats(cache_dir):
+    """Return (entries, total bytes, last used mtime or None) of a cache directory."""
+    count = total = 0
+    last_used = None
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            if name.endswith('.tmp'):
+                continue
+            try:
+                stat = os.stat(os.path.join(root, name))
+            except FileNotFoundError:
+                continue
+            count += 1
+            total += stat.st_size
+            last_used = max(last_used or 0.0, stat.st_mtime)
+    return count, total, last_used
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show the size of the media caches or clear one')
+    parser.add_argument('--root', default='.cache', help='directory holding the caches (default: .cache)')
+    parser.add_argument('--clear', metavar='NAME', action='append', default=[],
+                        help='remove every entry of the named cache (e.g. audio, segments)')
+    args = parser.parse_args()
+
+    names = sorted(name for name in os.listdir(args.root)
+                   if os.path.isdir(os.path.join(args.root, name))) if os.path.isdir(args.root) else []
+    for name in args.clear:
+        if name not in names:
+            parser.error(f"no cache named '{name}' in {args.root}")
+        shutil.rmtree(os.path.join(args.root, name))
+        print(f"✓ Cleared {os.path.join(args.root, name)}")
+    if args.clear:
+        return
+
+    if not names:
+        print(f"No caches in {args.root}")
+        return
+    for name in names:
+        count, total, last_used = cache_stats(os.path.join(args.root, name))
+        used = time.strftime('%Y-%m-%d %H:%M', time.localtime(last_used)) if last_used else '-'
+        print(f"  {name:<12}{count:>7} entries{total / (1024 * 1024):>10.1f} MB   last used {used}")
+
+
+if __name__ == '__main__':
+    main()
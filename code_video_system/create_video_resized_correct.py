@@ -1,130 +1,549 @@
 #!/usr/bin/env python3
 """
 Create video from screenshots and audio narration using ffmpeg
+
+Scenes (image, narration, duration and gap) are read from the scene
+manifest written by generate_screenshots.py and generate_audio.py.
+The video is encoded without audio; all narrations are laid out on one
+PCM timeline and encoded to a single AAC track (audio_timeline.py) that is
+muxed in while the video is written.
+
+Assembly modes:
+    segments    - encode one segment per scene, then join them with the
+                  concat demuxer (-c copy)
+    filtergraph - a single ffmpeg run whose concat filtergraph covers every
+                  image, narration and gap, encoded in one pass
+    pipe        - the original screenshots are letterboxed in memory and
+                  written to the encoder's stdin as raw frames
+                  (frame_sink.py), one timestamped frame per scene; no
+                  resized PNGs are needed
+
+Subtitles generated from the narration text (subtitles.py) are muxed in
+as a soft mov_text stream unless --no-subtitles is given.
+
+Every ffmpeg run goes through ffmpeg_runner.py: its output is logged to
+logs/ffmpeg/<step>.log and --timeout bounds how long a single run may take.
 """
 
-import subprocess
+import argparse
 import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from audio_timeline import build_audio_track, frame_aligned_timeline
+from build_profiler import propagate, span
+from content_cache import ContentCache, hash_file
+from ffmpeg_runner import progress_printer, run_ffmpeg, summarize
+from frame_sink import FrameSink
+from scene_manifest import MANIFEST_FILE, load_manifest
+from subtitles import write_subtitles
 
 # Video settings
 output_video = "rbeta_tutorial.mp4"
 resolution = "1920x1080"
-fps = 30
 video_codec = "libx264"
 audio_codec = "aac"
+audio_bitrate = "192k"
+subtitle_language = "jpn"
+
+# Encoding profiles
+#   standard - 30fps with x264 defaults (original behaviour)
+#   still    - every scene is a static slide: 5fps constant frame rate,
+#              keyframes only at scene cuts and x264 settings that spend
+#              almost nothing on the repeated frames
+encoding_profiles = {
+    'standard': {
+        'fps': 30,
+        'preset': 'medium',
+        'crf': 23,
+        'x264_params': None,
+        'scene_keyframes_only': False,
+    },
+    'still': {
+        'fps': 5,
+        'preset': 'fast',
+        'crf': 20,
+        'x264_params': 'keyint=infinite:min-keyint=1:scenecut=0:bframes=8:b-adapt=1:ref=2:rc-lookahead=10',
+        'scene_keyframes_only': True,
+    },
+}
+default_profile = 'standard'
+
+# Folder of the 1920x1080 screenshots, for scenes whose resized_image is
+# not recorded in the manifest (resize_screenshots.py records it)
+resized_dir = "pic_resized"
 
-# Define scenes with their durations (including 1 second gap after each scene)
-scenes = [
-    {'id': 'scene01', 'duration': 7.4, 'gap': 1.0},
-    {'id': 'scene02', 'duration': 17.7, 'gap': 1.0},
-    {'id': 'scene03', 'duration': 16.5, 'gap': 1.0},
-    {'id': 'scene04', 'duration': 9.9, 'gap': 1.0},
-    {'id': 'scene05', 'duration': 16.6, 'gap': 1.0},
-    {'id': 'scene06', 'duration': 6.6, 'gap': 1.0},
-    {'id': 'scene07', 'duration': 9.6, 'gap': 1.0},
-    {'id': 'scene08', 'duration': 19.8, 'gap': 1.0},
-    {'id': 'scene09', 'duration': 10.7, 'gap': 1.0},
-    {'id': 'scene10', 'duration': 8.7, 'gap': 0.0},  # No gap after last scene
-]
-
-# Create a temporary directory for intermediate files
+# Temporary directory for intermediate files (segments mode)
 temp_dir = "temp_video_files"
-os.makedirs(temp_dir, exist_ok=True)
-
-print("Creating video segments for each scene...")
-
-# Process each scene
-for i, scene in enumerate(scenes):
-    scene_id = scene['id']
-    duration = scene['duration']
-    gap = scene['gap']
-    total_duration = duration + gap
-    
-    print(f"\nProcessing {scene_id}...")
-    
-    # Create video from image
-    image_file = f"pic_resized/{scene_id}_import.png" if scene_id == 'scene01' else f"pic_resized/{scene_id}_{scene_id.replace('scene', '').replace('0', '')}.png"
-    
-    # Check for correct image filename
-    possible_image_files = [
-        f"pic_resized/{scene_id}_import.png",
-        f"pic_resized/{scene_id}_settings.png",
-        f"pic_resized/{scene_id}_calculate_resize.png",
-        f"pic_resized/{scene_id}_resize_image.png",
-        f"pic_resized/{scene_id}_validation.png",
-        f"pic_resized/{scene_id}_output_folder.png",
-        f"pic_resized/{scene_id}_main_loop_start.png",
-        f"pic_resized/{scene_id}_image_processing.png",
-        f"pic_resized/{scene_id}_error_handling.png",
-        f"pic_resized/{scene_id}_summary.png"
+
+# Persistent cache of encoded scene segments (segments mode)
+segment_cache_dir = ".cache/segments"
+segment_cache_size_mb = 2000
+
+# Number of CPUs shared between concurrent segment encoders
+cpu_count = os.cpu_count() or 1
+
+# Seconds before a single ffmpeg run is stopped (None: no limit)
+ffmpeg_timeout = None
+
+
+def load_scenes(manifest_path=MANIFEST_FILE):
+    """Return the scenes to assemble, in order, from the scene manifest.
+
+    Each scene is a dict with id, image, source_image, audio, duration, gap
+    and text. `image` is the resized copy published by resize_screenshots.py
+    (resized_image), or the screenshot's name in resized_dir for manifests
+    written before that stage ran; `source_image` is the original.
+    """
+    manifest = load_manifest(manifest_path)
+    scenes = []
+    for entry in manifest['scenes']:
+        missing = [field for field in ('image', 'audio', 'duration') if field not in entry]
+        if missing:
+            print(f"  ✗ Error: {entry['id']} has no {', '.join(missing)} in {manifest_path}")
+            continue
+        scenes.append({
+            'id': entry['id'],
+            'image': entry.get('resized_image') or os.path.join(resized_dir, os.path.basename(entry['image'])),
+            'source_image': entry['image'],
+            'audio': entry['audio'],
+            'duration': entry['duration'],
+            'gap': entry.get('gap', 0.0),
+            'text': entry.get('text'),
+        })
+    return scenes
+
+
+def video_encoder_args(profile, keyframe_times=None):
+    """Return the ffmpeg output options for the video stream of `profile`.
+
+    keyframe_times lists the scene start times (seconds) for profiles that
+    place keyframes only at scene cuts.
+    """
+    settings = encoding_profiles[profile]
+    args = [
+        '-c:v', video_codec,
+        '-preset', settings['preset'],
+        '-crf', str(settings['crf']),
+        '-tune', 'stillimage',
+        '-pix_fmt', 'yuv420p',
+        '-r', str(settings['fps']),
+        '-vsync', 'cfr',
+    ]
+    if settings['x264_params']:
+        args += ['-x264-params', settings['x264_params']]
+    if settings['scene_keyframes_only'] and keyframe_times:
+        args += ['-force_key_frames', ','.join(f"{t:.3f}" for t in keyframe_times)]
+    return args
+
+
+def segment_settings(profile=default_profile):
+    """Encoder settings that determine a segment's contents (part of the cache key)."""
+    return {
+        'resolution': resolution,
+        'video_codec': video_codec,
+        'profile': dict(encoding_profiles[profile], name=profile),
+    }
+
+
+def segment_key(scene, frames, profile=default_profile):
+    """Cache key for a video-only scene segment: image hash, length and encoder settings."""
+    return ContentCache.make_key(
+        scene['id'],
+        {
+            'image': hash_file(scene['image']),
+            'frames': frames,
+        },
+        segment_settings(profile),
+    )
+
+
+def create_audio_track(scenes, work_dir, profile=default_profile, log_dir=None):
+    """Encode the narration timeline to an AAC file in work_dir and return its path."""
+    audio_track = os.path.join(work_dir, 'narration.m4a')
+    print("Encoding narration track...")
+    with span('narration_track', 'video', scenes=len(scenes)):
+        build_audio_track(scenes, audio_track, encoding_profiles[profile]['fps'],
+                          codec=audio_codec, bitrate=audio_bitrate, timeout=ffmpeg_timeout,
+                          log_dir=log_dir)
+    return audio_track
+
+
+def create_subtitle_track(scenes, work_dir, profile=default_profile):
+    """Write the narration subtitles to an SRT file in work_dir.
+
+    Returns its path, or None when no scene has narration text.
+    """
+    if not any(scene.get('text') for scene in scenes):
+        return None
+    subtitle_track = os.path.join(work_dir, 'subtitles.srt')
+    write_subtitles(scenes, subtitle_track, encoding_profiles[profile]['fps'])
+    return subtitle_track
+
+
+def subtitle_args(subtitle_track, input_index):
+    """Output options that map input `input_index` as a soft subtitle stream."""
+    if subtitle_track is None:
+        return []
+    return [
+        '-map', f'{input_index}:s',
+        '-c:s', 'mov_text',
+        '-metadata:s:s:0', f'language={subtitle_language}',
     ]
-    
-    image_file = None
-    for possible_file in possible_image_files:
-        if os.path.exists(possible_file):
-            image_file = possible_file
-            break
-    
-    if not image_file:
-        print(f"  ✗ Error: Image file for {scene_id} not found")
-        continue
-    
-    audio_file = f"audio/{scene_id}_narration.mp3"
-    video_segment = f"{temp_dir}/{scene_id}_video.mp4"
-    
-    # Create video segment with audio
+
+
+def encoder_threads(jobs):
+    """Threads per encoder so that `jobs` encoders together use every CPU once."""
+    return max(1, cpu_count // max(1, jobs))
+
+
+def create_segment(scene, frames, video_segment, threads=0, profile=default_profile):
+    """Encode a single scene's still image to a video-only MP4 of `frames` frames.
+
+    threads=0 lets the encoder pick its own thread count. A segment always
+    starts with a keyframe, so no extra keyframes are forced.
+    """
+    fps = encoding_profiles[profile]['fps']
     cmd = [
         'ffmpeg',
         '-loop', '1',
-        '-i', image_file,
-        '-i', audio_file,
-        '-c:v', video_codec,
-        '-tune', 'stillimage',
-        '-c:a', audio_codec,
-        '-b:a', '192k',
-        '-pix_fmt', 'yuv420p',
+        '-framerate', str(fps),
+        '-i', scene['image'],
+        *video_encoder_args(profile),
+        '-an',
         '-s', resolution,
-        '-r', str(fps),
-        '-t', str(total_duration),
-        '-shortest',
+        '-frames:v', str(frames),
+        '-threads', str(threads),
         video_segment,
         '-y'
     ]
-    
+    with span('segment', 'video', scene=scene['id'], frames=frames):
+        run_ffmpeg(cmd, duration=frames / fps, timeout=ffmpeg_timeout, label=f"segment_{scene['id']}")
+    return video_segment
+
+
+def concat_segments(segment_files, audio_track, output_video, work_dir, subtitle_track=None):
+    """Join encoded segments with the concat demuxer and mux in the audio track.
+
+    Both streams are copied without re-encoding; the optional subtitle
+    track is converted to mov_text.
+    """
+    concat_file = f"{work_dir}/concat.txt"
+    with open(concat_file, 'w') as f:
+        for video_file in segment_files:
+            f.write(f"file '{os.path.abspath(video_file)}'\n")
+
+    concat_cmd = [
+        'ffmpeg',
+        '-f', 'concat',
+        '-safe', '0',
+        '-i', concat_file,
+        '-i', audio_track,
+        *(['-i', subtitle_track] if subtitle_track else []),
+        '-map', '0:v',
+        '-map', '1:a',
+        '-c', 'copy',
+        *subtitle_args(subtitle_track, 2),
+        '-movflags', '+faststart',
+        output_video,
+        '-y'
+    ]
+    run_ffmpeg(concat_cmd, timeout=ffmpeg_timeout, label='concat')
+
+
+def assemble_segments(scenes, output_video, work_dir=temp_dir, jobs=1, cache_dir=None,
+                      profile=default_profile, subtitles=True, on_progress=None):
+    """Encode each scene separately, then concatenate. Returns True on success.
+
+    Up to `jobs` segments are encoded at once; each encoder gets an equal
+    share of the CPUs so the pool does not oversubscribe the machine. The
+    narration track is built once and muxed in by the concat step.
+
+    With a `cache_dir`, segments are kept between runs under a key built from
+    the image hash, frame count and encoder settings. Only scenes whose key
+    changed are re-encoded; the rest are stream-copied from the cache by the
+    concat step.
+
+    With `subtitles`, the narration text is muxed in as a soft subtitle
+    stream.
+
+    on_progress receives an ffmpeg_runner progress dict after each
+    segment, with the share of finished segments as the percentage.
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    jobs = max(1, jobs)
+    threads = encoder_threads(jobs) if jobs > 1 else 0
+    timeline = frame_aligned_timeline(scenes, encoding_profiles[profile]['fps'])
+    cache = None
+    if cache_dir is not None:
+        cache = ContentCache(cache_dir, max_bytes=segment_cache_size_mb * 1024 * 1024, extension='.mp4')
+
+    def build(scene, frames):
+        if cache is None:
+            video_segment = f"{work_dir}/{scene['id']}_video.mp4"
+            return create_segment(scene, frames, video_segment, threads, profile), False
+        key = segment_key(scene, frames, profile)
+        cached_segment = cache.lookup(key)
+        if cached_segment is not None:
+            return cached_segment, True
+        # Encode next to the cache entry so it can be moved in atomically
+        part_file = f"{cache.path_for(key)}.{os.getpid()}.part.mp4"
+        os.makedirs(os.path.dirname(part_file), exist_ok=True)
+        try:
+            create_segment(scene, frames, part_file, threads, profile)
+            return cache.put(key, part_file, move=True), False
+        finally:
+            if os.path.exists(part_file):
+                os.remove(part_file)
+
+    print(f"Creating video segments for each scene ({jobs} jobs)...")
+
     try:
-        subprocess.run(cmd, check=True, capture_output=True)
-        print(f"  ✓ Created video segment: {video_segment}")
-    except subprocess.CalledProcessError as e:
-        print(f"  ✗ Error creating video segment: {e}")
-        print(f"    stderr: {e.stderr.decode()}")
-        continue
-
-# Create concat file
-concat_file = f"{temp_dir}/concat.txt"
-with open(concat_file, 'w') as f:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            # The workers' encodes count towards the caller's spans (assemble)
+            build_segment = propagate(build)
+            futures = [executor.submit(build_segment, scene, frames)
+                       for scene, (_, frames) in zip(scenes, timeline)]
+            # The narration track is encoded while the segments are
+            audio_future = executor.submit(propagate(create_audio_track), scenes, work_dir, profile)
+
+            # Collect in scene order so the concat list stays ordered
+            segment_files = []
+            for scene, future in zip(scenes, futures):
+                print(f"\nProcessing {scene['id']}...")
+                try:
+                    video_segment, cached = future.result()
+                    if cached:
+                        print(f"  ✓ Reused cached segment: {video_segment}")
+                    else:
+                        print(f"  ✓ Created video segment: {video_segment}")
+                    segment_files.append(video_segment)
+                    if on_progress is not None:
+                        on_progress({'frame': None, 'fps': None, 'speed': None, 'out_time': None,
+                                     'percent': len(segment_files) / len(scenes) * 100, 'eta': None,
+                                     'done': False})
+                except subprocess.CalledProcessError as e:
+                    print(f"  ✗ Error creating video segment: {e}")
+                    print(f"    stderr: {e.stderr.decode()}")
+                except OSError as e:
+                    # Hashing the image for the cache key fails before ffmpeg would
+                    if isinstance(e, FileNotFoundError) and e.filename == scene['image']:
+                        print(f"  ✗ Error: Image file for {scene['id']} not found ({e.filename})")
+                    else:
+                        print(f"  ✗ Error creating video segment: {e}")
+
+            try:
+                audio_track = audio_future.result()
+            except subprocess.CalledProcessError as e:
+                print(f"\n✗ Error creating narration track: {e}")
+                print(f"  stderr: {e.stderr.decode()}")
+                return False
+            except OSError as e:
+                print(f"\n✗ Error creating narration track: {e}")
+                return False
+
+        if len(segment_files) != len(scenes):
+            # A missing segment would shift every later scene against the audio
+            print("\n✗ Error: some segments failed; not concatenating")
+            return False
+
+        print("\nConcatenating all video segments...")
+        try:
+            subtitle_track = create_subtitle_track(scenes, work_dir, profile) if subtitles else None
+            concat_segments(segment_files, audio_track, output_video, work_dir, subtitle_track)
+        except subprocess.CalledProcessError as e:
+            print(f"\n✗ Error concatenating videos: {e}")
+            print(f"  stderr: {e.stderr.decode()}")
+            return False
+        except OSError as e:
+            print(f"\n✗ Error concatenating videos: {e}")
+            return False
+        return True
+    finally:
+        # Clean up temporary files
+        print("\nCleaning up temporary files...")
+        for file in os.listdir(work_dir):
+            os.remove(os.path.join(work_dir, file))
+        os.rmdir(work_dir)
+        print("✓ Cleanup complete")
+
+
+def build_filtergraph_command(scenes, audio_track, output_video, profile=default_profile,
+                              subtitle_track=None):
+    """Build one ffmpeg command that assembles every scene in a single encode.
+
+    Each image is looped and trimmed to its scene's frame count (duration
+    plus gap), the scenes are joined with the concat filter, and the
+    pre-built narration track (and subtitle track, if any) is muxed in
+    alongside.
+    """
+    width, height = resolution.split('x')
+    fps = encoding_profiles[profile]['fps']
+    timeline = frame_aligned_timeline(scenes, fps)
+
+    cmd = ['ffmpeg']
     for scene in scenes:
-        video_file = f"{temp_dir}/{scene['id']}_video.mp4"
-        if os.path.exists(video_file):
-            f.write(f"file '{os.path.abspath(video_file)}'\n")
+        cmd += ['-loop', '1', '-framerate', str(fps), '-i', scene['image']]
+    cmd += ['-i', audio_track]
+    if subtitle_track:
+        cmd += ['-i', subtitle_track]
+
+    filters = []
+    concat_inputs = ''
+    for i, (_, frames) in enumerate(timeline):
+        filters.append(
+            f"[{i}:v]trim=end_frame={frames},setpts=PTS-STARTPTS,"
+            f"scale={width}:{height},setsar=1,format=yuv420p[v{i}]"
+        )
+        concat_inputs += f"[v{i}]"
+    filters.append(f"{concat_inputs}concat=n={len(scenes)}:v=1:a=0[v]")
+
+    # Scene start times, for profiles that only place keyframes at cuts
+    keyframe_times = [start for start, _ in timeline]
+
+    cmd += [
+        '-filter_complex', ';'.join(filters),
+        '-map', '[v]',
+        '-map', f'{len(scenes)}:a',
+        *video_encoder_args(profile, keyframe_times),
+        '-c:a', 'copy',
+        *subtitle_args(subtitle_track, len(scenes) + 1),
+        '-movflags', '+faststart',
+        output_video,
+        '-y'
+    ]
+    return cmd
 
-print("\nConcatenating all video segments...")
-
-# Concatenate all videos
-concat_cmd = [
-    'ffmpeg',
-    '-f', 'concat',
-    '-safe', '0',
-    '-i', concat_file,
-    '-c', 'copy',
-    output_video,
-    '-y'
-]
-
-try:
-    subprocess.run(concat_cmd, check=True, capture_output=True)
-    print(f"\n✓ Successfully created video: {output_video}")
-    
-    # Get video info
+
+def assemble_filtergraph(scenes, output_video, work_dir=None, jobs=1, cache_dir=None,
+                         profile=default_profile, subtitles=True, on_progress=None):
+    """Encode the whole video in one ffmpeg invocation. Returns True on success.
+
+    `jobs` and `cache_dir` are accepted for interface parity with the
+    segments mode; the single encoder threads itself and there are no
+    segments to cache. The narration track is built in `work_dir` (a
+    temporary directory by default). Encoder progress goes to on_progress
+    (default: a progress line on stdout).
+    """
+    if work_dir is not None:
+        os.makedirs(work_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=work_dir) as track_dir:
+        try:
+            audio_track = create_audio_track(scenes, track_dir, profile)
+        except subprocess.CalledProcessError as e:
+            print(f"\n✗ Error creating narration track: {e}")
+            print(f"  stderr: {e.stderr.decode()}")
+            return False
+        except OSError as e:
+            print(f"\n✗ Error creating narration track: {e}")
+            return False
+
+        print(f"Encoding {len(scenes)} scenes in a single pass...")
+        subtitle_track = create_subtitle_track(scenes, track_dir, profile) if subtitles else None
+        cmd = build_filtergraph_command(scenes, audio_track, output_video, profile, subtitle_track)
+        fps = encoding_profiles[profile]['fps']
+        total_duration = sum(frames for _, frames in frame_aligned_timeline(scenes, fps)) / fps
+        try:
+            with span('encode', 'video', mode='filtergraph'):
+                run_ffmpeg(cmd, duration=total_duration, timeout=ffmpeg_timeout, label='filtergraph',
+                           on_progress=on_progress or progress_printer('video'))
+        except subprocess.CalledProcessError as e:
+            print(f"\n✗ Error encoding video: {e}")
+            print(f"  stderr: {e.stderr.decode()}")
+            return False
+        except OSError as e:
+            print(f"\n✗ Error encoding video: {e}")
+            return False
+    return True
+
+
+def load_frame(scene):
+    """Default frame source for pipe mode: the scene's screenshot, letterboxed in memory."""
+    from PIL import Image
+    from resize_screenshots import letterbox
+
+    width, height = (int(n) for n in resolution.split('x'))
+    with Image.open(scene['source_image']) as image:
+        return letterbox(image, width, height)
+
+
+def assemble_pipe(scenes, output_video, work_dir=None, jobs=1, cache_dir=None,
+                  profile=default_profile, subtitles=True, frame_source=load_frame, on_progress=None,
+                  log_dir=None):
+    """Encode the whole video from in-memory frames. Returns True on success.
+
+    frame_source(scene) returns the scene's frame as a PIL image or raw RGB
+    buffer at the output resolution; each scene contributes one frame that
+    is held for its duration plus gap. `jobs` and `cache_dir` are accepted
+    for interface parity with the segments mode. Encoder progress goes to
+    on_progress (default: a progress line on stdout). ffmpeg logs go to
+    log_dir (default: ffmpeg_runner.log_dir).
+    """
+    if work_dir is not None:
+        os.makedirs(work_dir, exist_ok=True)
+    fps = encoding_profiles[profile]['fps']
+    timeline = frame_aligned_timeline(scenes, fps)
+    total_duration = sum(frames for _, frames in timeline) / fps
+    width, height = (int(n) for n in resolution.split('x'))
+
+    with tempfile.TemporaryDirectory(dir=work_dir) as track_dir:
+        try:
+            audio_track = create_audio_track(scenes, track_dir, profile, log_dir)
+        except subprocess.CalledProcessError as e:
+            print(f"\n✗ Error creating narration track: {e}")
+            print(f"  stderr: {e.stderr.decode()}")
+            return False
+        except OSError as e:
+            print(f"\n✗ Error creating narration track: {e}")
+            return False
+
+        subtitle_track = create_subtitle_track(scenes, track_dir, profile) if subtitles else None
+        input_args = ['-i', audio_track]
+        if subtitle_track:
+            input_args += ['-i', subtitle_track]
+
+        print(f"Piping {len(scenes)} scenes to the encoder...")
+        output_args = [
+            '-map', '0:v',
+            '-map', '1:a',
+            *video_encoder_args(profile, [start for start, _ in timeline]),
+            '-c:a', 'copy',
+            *subtitle_args(subtitle_track, 2),
+            '-movflags', '+faststart',
+        ]
+        sink = FrameSink(output_video, width, height, fps, input_args=input_args,
+                         output_args=output_args, timeout=ffmpeg_timeout, label='pipe', log_dir=log_dir,
+                         on_progress=on_progress or progress_printer('video'))
+        try:
+            with sink, span('encode', 'video', mode='pipe'):
+                sink.start()  # so the encoder thread counts towards this span
+                for scene, (start, _) in zip(scenes, timeline):
+                    with span('frame', 'video', scene=scene['id']):
+                        sink.add_frame(frame_source(scene), start)
+                sink.close(end_time=total_duration)
+        except subprocess.CalledProcessError as e:
+            print(f"\n✗ Error encoding video: {e}")
+            print(f"  stderr: {e.stderr.decode(errors='replace')}")
+            return False
+        except (OSError, ValueError) as e:
+            print(f"\n✗ Error reading scene frames: {e}")
+            return False
+        print(f"  {sink.unique_frames} distinct frames, {sink.duplicates_skipped} duplicates skipped, "
+              f"{sink.frames_written} frames encoded")
+    return True
+
+
+ASSEMBLY_MODES = {
+    'segments': assemble_segments,
+    'filtergraph': assemble_filtergraph,
+    'pipe': assemble_pipe,
+}
+
+
+def print_video_info(output_video):
+    """Print resolution, frame rate, duration and size of the output."""
     probe_cmd = [
         'ffprobe',
         '-v', 'error',
@@ -133,27 +552,59 @@ try:
         '-of', 'default=noprint_wrappers=1',
         output_video
     ]
-    
+
     try:
         result = subprocess.run(probe_cmd, capture_output=True, text=True, check=True)
         print(f"\nVideo info:")
         print(result.stdout)
     except:
         pass
-    
+
     # Get file size
     file_size = os.path.getsize(output_video) / (1024 * 1024)  # MB
     print(f"File size: {file_size:.2f} MB")
-    
-except subprocess.CalledProcessError as e:
-    print(f"\n✗ Error concatenating videos: {e}")
-    print(f"  stderr: {e.stderr.decode()}")
-
-# Clean up temporary files
-print("\nCleaning up temporary files...")
-for file in os.listdir(temp_dir):
-    os.remove(os.path.join(temp_dir, file))
-os.rmdir(temp_dir)
-print("✓ Cleanup complete")
-
-print(f"\nVideo creation complete! Output file: {output_video}")
\ No newline at end of file
+
+
+def main():
+    global ffmpeg_timeout
+    parser = argparse.ArgumentParser(description='Create the tutorial video from screenshots and narration')
+    parser.add_argument('--mode', choices=sorted(ASSEMBLY_MODES), default='segments',
+                        help='assembly mode (default: segments)')
+    parser.add_argument('-o', '--output', default=output_video,
+                        help=f'output file (default: {output_video})')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='segments encoded concurrently in segments mode (default: 1)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='re-encode every segment instead of reusing cached ones')
+    parser.add_argument('--profile', choices=sorted(encoding_profiles), default=default_profile,
+                        help=f'encoding profile (default: {default_profile})')
+    parser.add_argument('--manifest', default=MANIFEST_FILE,
+                        help=f'scene manifest to read (default: {MANIFEST_FILE})')
+    parser.add_argument('--no-subtitles', action='store_true',
+                        help='do not mux the narration subtitles into the video')
+    parser.add_argument('--timeout', type=float, default=ffmpeg_timeout,
+                        help='seconds before a single ffmpeg run is stopped (default: no limit)')
+    args = parser.parse_args()
+    ffmpeg_timeout = args.timeout
+
+    scenes = load_scenes(args.manifest)
+    if not scenes:
+        print(f"✗ Error: no scenes found in {args.manifest}")
+        print("  Run generate_screenshots.py and generate_audio.py first.")
+        sys.exit(1)
+
+    cache_dir = None if args.no_cache else segment_cache_dir
+    with span('assemble', 'video', mode=args.mode, scenes=len(scenes)):
+        ok = ASSEMBLY_MODES[args.mode](scenes, args.output, jobs=args.jobs, cache_dir=cache_dir,
+                                       profile=args.profile, subtitles=not args.no_subtitles)
+    if ok:
+        print(f"\n✓ Successfully created video: {args.output}")
+        print_video_info(args.output)
+        print(f"\nVideo creation complete! Output file: {args.output}")
+    print(summarize())
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
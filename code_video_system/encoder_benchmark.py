@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+CPU encoder benchmark matrix for the video stage
+
+Encodes the scene set of create_video_resized_correct.py (video only, one
+pass through the concat filtergraph) with every combination of codec,
+preset/speed, CRF and frame rate in the matrix, and reports wall time, CPU
+time, output size, bitrate, SSIM and PSNR as a table and as JSON.
+
+Codecs that the local ffmpeg was built without are skipped.
+
+Usage:
+    python encoder_benchmark.py
+    python encoder_benchmark.py --codecs libx264 libvpx-vp9 --fps 5 30 --scenes 3
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+
+import create_video_resized_correct as video
+from audio_timeline import frame_aligned_timeline
+from ffmpeg_runner import run_ffmpeg
+from video_benchmark import children_cpu_time, mean_quality
+
+# Presets (x264/x265) or cpu-used speeds (VP9/AV1) and CRF values per codec
+CODEC_MATRIX = {
+    'libx264': {'presets': ['ultrafast', 'veryfast', 'medium'], 'crf': [23]},
+    'libx265': {'presets': ['ultrafast', 'medium'], 'crf': [28]},
+    'libvpx-vp9': {'presets': ['8', '4'], 'crf': [32]},
+    'libaom-av1': {'presets': ['8', '6'], 'crf': [32]},
+}
+FPS_VALUES = [5, 30]
+
+results_file = 'encoder_benchmark.json'
+
+
+def available_encoders():
+    """Return the names of the video encoders compiled into ffmpeg."""
+    result = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'],
+                            capture_output=True, text=True, check=True)
+    names = set()
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].startswith('V'):
+            names.add(parts[1])
+    return names
+
+
+def codec_args(codec, preset, crf):
+    """ffmpeg output options for one matrix entry."""
+    if codec == 'libx264':
+        return ['-c:v', codec, '-preset', preset, '-crf', str(crf), '-tune', 'stillimage']
+    if codec == 'libx265':
+        return ['-c:v', codec, '-preset', preset, '-crf', str(crf), '-tag:v', 'hvc1',
+                '-x265-params', 'log-level=error']
+    if codec in ('libvpx-vp9', 'libaom-av1'):
+        return ['-c:v', codec, '-crf', str(crf), '-b:v', '0', '-cpu-used', preset, '-row-mt', '1']
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def encode(scenes, codec, preset, crf, fps, output):
+    """Encode the scenes' images to `output` in a single pass."""
+    width, height = video.resolution.split('x')
+    timeline = frame_aligned_timeline(scenes, fps)
+
+    cmd = ['ffmpeg', '-v', 'error']
+    for scene in scenes:
+        cmd += ['-loop', '1', '-framerate', str(fps), '-i', scene['image']]
+
+    filters = []
+    concat_inputs = ''
+    for i, (_, frames) in enumerate(timeline):
+        filters.append(
+            f"[{i}:v]trim=end_frame={frames},setpts=PTS-STARTPTS,"
+            f"scale={width}:{height},setsar=1,format=yuv420p[v{i}]"
+        )
+        concat_inputs += f"[v{i}]"
+    filters.append(f"{concat_inputs}concat=n={len(scenes)}:v=1:a=0[v]")
+
+    cmd += [
+        '-filter_complex', ';'.join(filters),
+        '-map', '[v]',
+        *codec_args(codec, preset, crf),
+        '-pix_fmt', 'yuv420p',
+        '-r', str(fps),
+        output,
+        '-y'
+    ]
+    run_ffmpeg(cmd, timeout=video.ffmpeg_timeout,
+               label=f"bench_{os.path.splitext(os.path.basename(output))[0]}")
+
+
+def run_entry(scenes, codec, preset, crf, fps, output_dir, measure_quality=True):
+    """Encode one matrix entry and return its measurements."""
+    output = os.path.join(output_dir, f"{codec}_{preset}_crf{crf}_{fps}fps.mp4")
+    total_duration = sum(frames for _, frames in frame_aligned_timeline(scenes, fps)) / fps
+
+    cpu_start = children_cpu_time()
+    start = time.perf_counter()
+    encode(scenes, codec, preset, crf, fps, output)
+    wall_time = time.perf_counter() - start
+    cpu_time = children_cpu_time() - cpu_start
+
+    size = os.path.getsize(output)
+    ssim = psnr = None
+    if measure_quality:
+        ssim, psnr = mean_quality(output, scenes, fps)
+
+    return {
+        'codec': codec,
+        'preset': preset,
+        'crf': crf,
+        'fps': fps,
+        'wall_time': round(wall_time, 3),
+        'cpu_time': round(cpu_time, 3),
+        'size_bytes': size,
+        'bitrate_kbps': round(size * 8 / total_duration / 1000, 1),
+        'realtime_factor': round(total_duration / wall_time, 2) if wall_time else None,
+        'ssim': ssim,
+        'psnr': psnr,
+    }
+
+
+def print_table(results):
+    print(f"\n{'codec':<12}{'preset':<11}{'crf':>4}{'fps':>5}{'wall (s)':>10}{'cpu (s)':>10}"
+          f"{'size (MB)':>11}{'kbps':>8}{'x rt':>7}{'SSIM':>9}{'PSNR':>8}")
+    for r in results:
+        ssim = f"{r['ssim']:.4f}" if r['ssim'] is not None else '-'
+        psnr = f"{r['psnr']:.2f}" if r['psnr'] is not None else '-'
+        print(f"{r['codec']:<12}{r['preset']:<11}{r['crf']:>4}{r['fps']:>5}"
+              f"{r['wall_time']:>10.2f}{r['cpu_time']:>10.2f}"
+              f"{r['size_bytes'] / (1024 * 1024):>11.2f}{r['bitrate_kbps']:>8.0f}"
+              f"{r['realtime_factor']:>7.1f}{ssim:>9}{psnr:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark CPU video encoders on the tutorial scenes')
+    parser.add_argument('--codecs', nargs='+', choices=sorted(CODEC_MATRIX), default=sorted(CODEC_MATRIX))
+    parser.add_argument('--fps', nargs='+', type=int, default=FPS_VALUES, help='frame rates to test')
+    parser.add_argument('--scenes', type=int, default=None, help='only use the first N scenes')
+    parser.add_argument('--no-quality', action='store_true', help='skip the SSIM/PSNR measurement')
+    parser.add_argument('--json', default=results_file, help=f'JSON output file (default: {results_file})')
+    args = parser.parse_args()
+
+    scenes = video.load_scenes()[:args.scenes]
+    if not scenes:
+        print("✗ Error: no scenes found in the scene manifest")
+        return
+
+    encoders = available_encoders()
+    results = []
+    with tempfile.TemporaryDirectory(prefix='encoder-bench-') as output_dir:
+        for codec in args.codecs:
+            if codec not in encoders:
+                print(f"  - {codec}: not available in this ffmpeg build, skipped")
+                continue
+            matrix = CODEC_MATRIX[codec]
+            for preset in matrix['presets']:
+                for crf in matrix['crf']:
+                    for fps in args.fps:
+                        label = f"{codec} preset={preset} crf={crf} fps={fps}"
+                        print(f"Encoding {label}...")
+                        try:
+                            results.append(run_entry(scenes, codec, preset, crf, fps, output_dir,
+                                                     not args.no_quality))
+                        except subprocess.CalledProcessError as e:
+                            print(f"  ✗ {label}: {e}")
+                            print(f"    stderr: {e.stderr.decode(errors='replace').strip()}")
+
+    print_table(results)
+
+    with open(args.json, 'w', encoding='utf-8') as f:
+        json.dump({'scenes': len(scenes), 'cpu_count': os.cpu_count(), 'results': results}, f, indent=2)
+        f.write('\n')
+    print(f"\n✓ Results written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Shared runner for ffmpeg invocations
+
+run_ffmpeg() replaces subprocess.run(..., capture_output=True) for ffmpeg:
+
+  - progress is read from `-progress` on a dedicated pipe and reported as
+    frame, fps, speed, percentage and ETA
+  - stderr goes to a log file instead of being buffered in memory
+  - a timeout or a cancel event stops ffmpeg cleanly (SIGTERM so it can
+    finalise the output, then SIGKILL)
+  - wall time, CPU time and peak RSS of every invocation are recorded in
+    `invocations` (see summarize()) and attributed to the calling thread's
+    profiling spans (build_profiler.py)
+
+Errors raise FFmpegError, a subclass of subprocess.CalledProcessError whose
+stderr holds the tail of the log, so existing error handling keeps working.
+"""
+
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from build_profiler import attach, current_spans, record_child
+
+# Directory for per-invocation ffmpeg logs
+log_dir = os.path.join('logs', 'ffmpeg')
+
+# Resource usage of every invocation in this process
+invocations = []
+_invocations_lock = threading.Lock()
+
+_LOG_TAIL_BYTES = 4000
+
+
+class FFmpegError(subprocess.CalledProcessError):
+    """ffmpeg exited with an error, timed out or was cancelled."""
+
+    def __init__(self, returncode, cmd, stderr=None, log_file=None, reason=None):
+        super().__init__(returncode, cmd, stderr=stderr)
+        self.log_file = log_file
+        self.reason = reason
+
+    def __str__(self):
+        message = f"ffmpeg {self.reason}" if self.reason else super().__str__()
+        if self.log_file:
+            message += f" (log: {self.log_file})"
+        return message
+
+
+def log_path(label, directory=None):
+    """Return the log file path for an invocation label (in log_dir by default)."""
+    safe_label = re.sub(r'[^A-Za-z0-9_.-]+', '_', label)
+    return os.path.join(directory or log_dir, f"{safe_label}.log")
+
+
+def _parse_speed(value):
+    try:
+        return float(value.rstrip('x'))
+    except (AttributeError, ValueError):
+        return None
+
+
+def _format_seconds(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+def progress_printer(label, interval=0.5):
+    """Return an on_progress callback that prints a single updating line."""
+    last = [0.0]
+
+    def on_progress(progress):
+        now = time.monotonic()
+        if progress['done'] or now - last[0] >= interval:
+            last[0] = now
+            parts = [f"  {label}:"]
+            if progress['percent'] is not None:
+                parts.append(f"{progress['percent']:5.1f}%")
+            if progress['fps'] is not None:
+                parts.append(f"fps={progress['fps']:.0f}")
+            if progress['speed'] is not None:
+                parts.append(f"speed={progress['speed']:.2f}x")
+            if progress['eta'] is not None:
+                parts.append(f"eta {_format_seconds(progress['eta'])}")
+            end = '\n' if progress['done'] else ''
+            print('\r' + ' '.join(parts) + ' ' * 8, end=end, flush=True)
+
+    return on_progress
+
+
+def _read_progress(stream, duration, on_progress):
+    """Parse `-progress` key=value blocks and call on_progress after each."""
+    values = {}
+    for raw_line in stream:
+        line = raw_line.decode('utf-8', errors='replace').strip()
+        if '=' not in line:
+            continue
+        key, value = line.split('=', 1)
+        values[key] = value
+        if key != 'progress':
+            continue
+
+        out_time = None
+        for time_key in ('out_time_us', 'out_time_ms'):  # both are microseconds
+            if values.get(time_key, 'N/A') not in ('N/A', ''):
+                out_time = int(values[time_key]) / 1_000_000
+                break
+        speed = _parse_speed(values.get('speed'))
+        try:
+            fps = float(values.get('fps', ''))
+        except ValueError:
+            fps = None
+
+        percent = eta = None
+        if duration and out_time is not None:
+            percent = min(100.0, max(0.0, out_time / duration * 100))
+            if speed:
+                eta = max(0.0, (duration - out_time) / speed)
+
+        if on_progress is not None:
+            on_progress({
+                'frame': int(values['frame']) if values.get('frame', '').isdigit() else None,
+                'fps': fps,
+                'speed': speed,
+                'out_time': out_time,
+                'percent': percent,
+                'eta': eta,
+                'done': value == 'end',
+            })
+        values = {}
+
+
+def _wait(proc, deadline, cancel_event):
+    """Wait for proc, returning (returncode, rusage, reason) with reason set if stopped."""
+    reason = None
+    while True:
+        if hasattr(os, 'wait4'):
+            pid, status, rusage = os.wait4(proc.pid, os.WNOHANG)
+            if pid:
+                proc.returncode = os.waitstatus_to_exitcode(status)
+                return proc.returncode, rusage, reason
+        else:
+            try:
+                return proc.wait(timeout=0.1), None, reason
+            except subprocess.TimeoutExpired:
+                pass
+
+        if reason is None:
+            if deadline is not None and time.monotonic() > deadline:
+                reason = 'timed out'
+            elif cancel_event is not None and cancel_event.is_set():
+                reason = 'cancelled'
+            if reason is not None:
+                _stop(proc)
+        time.sleep(0.1)
+
+
+def _stop(proc, grace=5.0):
+    """Ask ffmpeg to finish (SIGTERM), then kill it if it does not exit."""
+    proc.terminate()
+
+    def kill_later():
+        time.sleep(grace)
+        if proc.returncode is None:
+            try:
+                proc.kill()
+            except OSError:
+                pass
+
+    threading.Thread(target=kill_later, daemon=True).start()
+
+
+def _read_tail(path):
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - _LOG_TAIL_BYTES))
+        return f.read()
+
+
+def run_ffmpeg(cmd, duration=None, timeout=None, log_file=None, label=None,
+               on_progress=None, stdin_writer=None, stdout_reader=None, cancel_event=None,
+               log_dir=None):
+    """Run an ffmpeg command list and return its resource usage.
+
+    duration:      expected output duration in seconds, for percent/ETA
+    timeout:       seconds before ffmpeg is stopped and FFmpegError raised
+    log_file:      where stderr is written (default: log_path(label), or a
+                   temporary file that is removed when no label is given)
+    on_progress:   callback receiving progress dicts (see progress_printer)
+    stdin_writer:  callable(pipe) that feeds ffmpeg's stdin; it is closed
+                   afterwards
+    stdout_reader: callable(pipe) that consumes ffmpeg's stdout
+    cancel_event:  threading.Event that stops ffmpeg when set
+    log_dir:       directory for the label's log (default: the module's
+                   log_dir); callers building several outputs at once pass
+                   one per output so equal labels do not share a log
+
+    Returns a dict with label, wall_time, cpu_time, max_rss_mb and log_file.
+    """
+    if log_file is None and label is not None:
+        log_file = log_path(label, log_dir)
+    temporary_log = log_file is None
+    if temporary_log:
+        fd, log_file = tempfile.mkstemp(prefix='ffmpeg-', suffix='.log')
+        os.close(fd)
+    else:
+        os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+
+    # Progress goes to its own pipe so stdout stays free for media data
+    progress_read, progress_write = os.pipe()
+    pass_fds = (progress_write,) if os.name == 'posix' else ()
+    progress_target = f"pipe:{progress_write}" if pass_fds else 'pipe:1'
+    if not pass_fds and stdout_reader is not None:
+        os.close(progress_read)
+        os.close(progress_write)
+        raise ValueError('stdout_reader requires a POSIX system')
+
+    full_cmd = [cmd[0], '-hide_banner', '-nostats', '-progress', progress_target] + list(cmd[1:])
+
+    start = time.perf_counter()
+    try:
+        with open(log_file, 'wb') as log:
+            proc = subprocess.Popen(
+                full_cmd,
+                stdin=subprocess.PIPE if stdin_writer else subprocess.DEVNULL,
+                stdout=subprocess.PIPE if (stdout_reader or not pass_fds) else subprocess.DEVNULL,
+                stderr=log,
+                pass_fds=pass_fds,
+            )
+        os.close(progress_write)
+        progress_write = None
+
+        if pass_fds:
+            progress_stream = os.fdopen(progress_read, 'rb')
+        else:
+            os.close(progress_read)
+            progress_stream = proc.stdout
+        progress_read = None
+
+        threads = [threading.Thread(target=_read_progress,
+                                    args=(progress_stream, duration, on_progress), daemon=True)]
+        errors = []
+        # The feeder and drainer work for the caller's spans (in-process TTS
+        # runs in the stdin writer, for instance)
+        parents = current_spans()
+
+        def guarded(target, stream, close):
+            try:
+                with attach(parents):
+                    target(stream)
+            except BrokenPipeError:
+                pass  # ffmpeg exited early; its return code explains why
+            except BaseException as e:
+                errors.append(e)
+                _stop(proc, grace=0)
+            finally:
+                if close:
+                    try:
+                        stream.close()
+                    except BrokenPipeError:
+                        pass
+
+        # Feeding, draining and progress run in threads so that this thread
+        # can enforce the timeout and react to cancellation at any point
+        if stdin_writer is not None:
+            threads.append(threading.Thread(target=guarded, args=(stdin_writer, proc.stdin, True), daemon=True))
+        if stdout_reader is not None:
+            threads.append(threading.Thread(target=guarded, args=(stdout_reader, proc.stdout, False), daemon=True))
+        for thread in threads:
+            thread.start()
+
+        deadline = time.monotonic() + timeout if timeout else None
+        try:
+            returncode, rusage, reason = _wait(proc, deadline, cancel_event)
+        except BaseException:
+            # KeyboardInterrupt etc.: stop ffmpeg before propagating
+            _stop(proc, grace=2.0)
+            proc.wait()
+            raise
+        finally:
+            for thread in threads:
+                thread.join(timeout=5)
+            if pass_fds:
+                progress_stream.close()
+            if proc.stdout is not None:
+                proc.stdout.close()
+
+        usage = {
+            'label': label or 'ffmpeg',
+            'wall_time': time.perf_counter() - start,
+            'cpu_time': (rusage.ru_utime + rusage.ru_stime) if rusage else None,
+            # ru_maxrss is KiB on Linux and bytes on macOS
+            'max_rss_mb': (rusage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+                           if rusage else None),
+            'log_file': None if temporary_log else log_file,
+            'returncode': returncode,
+        }
+        with _invocations_lock:
+            invocations.append(usage)
+        record_child(usage)
+
+        if errors:
+            raise errors[0]
+        if reason is not None or returncode != 0:
+            raise FFmpegError(returncode, full_cmd, stderr=_read_tail(log_file),
+                              log_file=usage['log_file'], reason=reason)
+        return usage
+    finally:
+        for fd in (progress_read, progress_write):
+            if fd is not None:
+                os.close(fd)
+        if temporary_log and os.path.exists(log_file):
+            os.remove(log_file)
+
+
+def take_invocations():
+    """Return the recorded invocations and clear the record.
+
+    Long-lived processes (render_server.py) call this after each job so the
+    record does not grow for the life of the process.
+    """
+    with _invocations_lock:
+        records = list(invocations)
+        del invocations[:]
+    return records
+
+
+def summarize(records=None):
+    """Return a one-line summary of the recorded invocations."""
+    records = invocations if records is None else records
+    if not records:
+        return "ffmpeg: no invocations"
+    wall = sum(r['wall_time'] for r in records)
+    cpu = sum(r['cpu_time'] or 0.0 for r in records)
+    peak = max((r['max_rss_mb'] or 0.0) for r in records)
+    return (f"ffmpeg: {len(records)} invocations, {wall:.2f}s wall, {cpu:.2f}s CPU, "
+            f"peak RSS {peak:.0f} MB")
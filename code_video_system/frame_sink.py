@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Pipe in-memory frames straight into an ffmpeg encoder
+
+FrameSink takes PIL images or NumPy/bytes buffers together with the time
+at which each one appears, and writes them as raw video to ffmpeg's stdin
+(-f rawvideo), so rendered frames reach the encoder without a PNG being
+written, compressed or decoded.
+
+A frame stays on screen until the next one's timestamp. Identical
+consecutive frames are dropped, which only extends the previous frame's
+display time. Each distinct frame is converted to raw bytes once and
+repeated for every output frame slot it covers at the constant output
+frame rate (rawvideo carries no timestamps of its own).
+
+Usage:
+    with FrameSink('out.mp4', 1920, 1080, fps=5, output_args=[...]) as sink:
+        sink.add_frame(image, 0.0)
+        sink.add_frame(other_image, 7.3)
+        sink.close(end_time=12.0)
+"""
+
+import queue
+import threading
+
+from build_profiler import attach, current_spans
+from ffmpeg_runner import run_ffmpeg
+
+# Bytes per pixel of the supported raw pixel formats
+PIXEL_FORMATS = {
+    'rgb24': 3,
+    'gray': 1,
+    'yuv420p': 1.5,
+}
+
+# PIL image mode matching each pixel format (None: pass planar buffers)
+_PIL_MODES = {
+    'rgb24': 'RGB',
+    'gray': 'L',
+    'yuv420p': None,
+}
+
+
+class FrameSink:
+    """Feeds timestamped frames to one ffmpeg process as raw video."""
+
+    def __init__(self, output, width, height, fps, pix_fmt='rgb24', input_args=None,
+                 output_args=None, timeout=None, label='frames', on_progress=None, log_dir=None):
+        if pix_fmt not in PIXEL_FORMATS:
+            raise ValueError(f"Unsupported pixel format: {pix_fmt}")
+        if pix_fmt == 'yuv420p' and (width % 2 or height % 2):
+            raise ValueError("yuv420p frames need an even width and height")
+
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.pix_fmt = pix_fmt
+        self.frame_size = int(width * height * PIXEL_FORMATS[pix_fmt])
+
+        self.cmd = [
+            'ffmpeg',
+            '-f', 'rawvideo',
+            '-pix_fmt', pix_fmt,
+            '-s', f"{width}x{height}",
+            '-framerate', str(fps),
+            '-i', 'pipe:0',
+            *(input_args or []),
+            *(output_args or []),
+            output,
+            '-y'
+        ]
+        self.timeout = timeout
+        self.label = label
+        self.log_dir = log_dir
+        self.on_progress = on_progress
+
+        self.unique_frames = 0
+        self.duplicates_skipped = 0
+        self.frames_written = 0
+
+        self._queue = queue.Queue(maxsize=4)
+        self._cancel = threading.Event()
+        self._pending = None      # (data, start_slot) of the frame on screen
+        self._last_timestamp = None
+        self._thread = None
+        self._parents = []
+        self._error = None
+        self._closed = False
+
+    # -- ffmpeg side ---------------------------------------------------------
+
+    def start(self):
+        """Start the encoder; called automatically by the first frame.
+
+        The encoder's CPU time is counted towards the build_profiler spans
+        open in the calling thread.
+        """
+        if self._thread is None:
+            self._parents = current_spans()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            with attach(self._parents):
+                run_ffmpeg(self.cmd, timeout=self.timeout, label=self.label, log_dir=self.log_dir,
+                           on_progress=self.on_progress, stdin_writer=self._write_frames,
+                           cancel_event=self._cancel)
+        except BaseException as e:
+            self._error = e
+
+    def _write_frames(self, stdin):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            data, count = item
+            for _ in range(count):
+                stdin.write(data)
+
+    def _put(self, item):
+        # Never block forever on a queue whose consumer has died
+        while True:
+            if self._error is not None:
+                raise self._error
+            if not self._thread.is_alive():
+                raise RuntimeError('ffmpeg exited before all frames were written')
+            try:
+                self._queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                pass
+
+    # -- frame side ----------------------------------------------------------
+
+    def _frame_bytes(self, frame):
+        """Return the raw bytes of a PIL image or buffer in self.pix_fmt."""
+        if hasattr(frame, 'mode') and hasattr(frame, 'size'):  # PIL image
+            mode = _PIL_MODES[self.pix_fmt]
+            if mode is None:
+                raise ValueError(f"PIL images cannot be sent as {self.pix_fmt}; pass a planar buffer")
+            if frame.size != (self.width, self.height):
+                raise ValueError(f"Frame is {frame.size[0]}x{frame.size[1]}, "
+                                 f"expected {self.width}x{self.height}")
+            if frame.mode != mode:
+                frame = frame.convert(mode)
+            return frame.tobytes()
+
+        data = memoryview(frame)
+        if not data.c_contiguous:
+            data = memoryview(data.tobytes())
+        data = data.cast('B')
+        if data.nbytes != self.frame_size:
+            raise ValueError(f"Frame buffer has {data.nbytes} bytes, expected {self.frame_size} "
+                             f"for {self.width}x{self.height} {self.pix_fmt}")
+        return bytes(data)
+
+    def _slot(self, timestamp):
+        return round(timestamp * self.fps)
+
+    def _flush_pending(self, end_slot):
+        data, start_slot = self._pending
+        count = max(0, end_slot - start_slot)
+        if count:
+            self._put((data, count))
+            self.frames_written += count
+        self._pending = None
+
+    def add_frame(self, frame, timestamp):
+        """Show `frame` from `timestamp` (seconds) until the next frame."""
+        if self._closed:
+            raise RuntimeError('FrameSink is closed')
+        if self._last_timestamp is not None and timestamp < self._last_timestamp:
+            raise ValueError(f"Timestamps must not decrease ({timestamp} < {self._last_timestamp})")
+        self._last_timestamp = timestamp
+
+        data = self._frame_bytes(frame)
+        if self._pending is not None and self._pending[0] == data:
+            self.duplicates_skipped += 1
+            return
+
+        self.start()
+        if self._pending is None:
+            start_slot = 0  # the first frame also covers any leading time
+        else:
+            start_slot = max(self._slot(timestamp), self._pending[1])
+            self._flush_pending(start_slot)
+        self._pending = (data, start_slot)
+        self.unique_frames += 1
+
+    def close(self, end_time=None):
+        """Finish the video at `end_time` (default: one frame after the last frame)."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is None:
+            return
+        if self._pending is not None:
+            if end_time is None:
+                end_slot = self._slot(self._last_timestamp) + 1
+            else:
+                end_slot = self._slot(end_time)
+            self._flush_pending(max(end_slot, self._pending[1] + 1))
+        self._put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def cancel(self):
+        """Stop the encoder without finishing the output."""
+        self._closed = True
+        if self._thread is not None:
+            self._cancel.set()
+            # Unblock the writer so ffmpeg's stdin is closed
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                pass
+            self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.cancel()
+        return False
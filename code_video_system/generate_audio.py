@@ -1,171 +1,252 @@
 #!/usr/bin/env python3
 """
-Generate audio files for each scene using macOS say command
+Generate audio files for each scene using a pluggable TTS backend
+(macOS say or espeak-ng, see tts_backends.py)
+
+Scenes and their narration are read from script.txt. Only scenes whose
+text, TTS settings (backend, voice, rate) or encoder settings changed
+since the last build, or whose MP3 is missing, are synthesized again
+(--force does all of them).
+
+Each scene is synthesized, converted to MP3 and measured as soon as the
+previous step for that scene finishes. Up to --jobs scenes run at once.
 """
 
+import argparse
 import os
 import subprocess
+import sys
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# Define the narration text for each scene
-scenes = [
-    {
-        'id': 'scene01',
-        'text': '''このプログラムは、PILライブラリを使用した画像リサイズツールです。
-必要なライブラリとして、PILのImageモジュール、osモジュール、sysモジュールをインポートしています。'''
-    },
-    {
-        'id': 'scene02',
-        'text': '''設定項目では、プログラムの動作をカスタマイズできます。
-sourceFolderで入力画像のフォルダを指定し、outputFolderで出力先を設定します。
-outputExtentionでは、pngまたはjpg形式を選択できます。
-sizeは、リサイズ時の基準となるピクセル数で、デフォルトは700ピクセルです。
-modeでは、リサイズするか元のサイズを維持するかを選択できます。'''
-    },
-    {
-        'id': 'scene03',
-        'text': '''calculate_resize_dimensions関数は、画像の縦横比を維持しながら適切なリサイズサイズを計算します。
-リサイズモードの場合、横長画像は幅を基準に、縦長画像は高さを基準にサイズを調整します。
-これにより、画像の変形を防ぎながら、指定されたサイズに収まるように処理します。
-オリジナルモードでは、元の画像サイズをそのまま返します。'''
-    },
-    {
-        'id': 'scene04',
-        'text': '''resize_image関数は、実際に画像をリサイズする処理を行います。
-PILのresize メソッドを使用して、指定された幅と高さに画像を変更します。
-この関数はシンプルですが、プログラムの中核となる処理です。'''
-    },
-    {
-        'id': 'scene05',
-        'text': '''プログラムの安全性を確保するため、設定値の検証を行います。
-出力形式がpngまたはjpgであることを確認し、
-処理モードがresizeまたはoriginalであることをチェックします。
-サイズが正の整数であることも検証し、
-入力フォルダが存在することを確認します。
-エラーがある場合は、分かりやすいメッセージを表示して終了します。'''
-    },
-    {
-        'id': 'scene06',
-        'text': '''出力フォルダが存在しない場合は、自動的に作成します。
-エラーハンドリングにより、フォルダ作成に失敗した場合も適切に処理します。'''
-    },
-    {
-        'id': 'scene07',
-        'text': '''処理した画像数とエラー数をカウントする変数を初期化します。
-入力フォルダ内のファイルリストを取得し、
-jpg、jpeg、png、bmp、gif形式の画像ファイルのみを処理対象とします。'''
-    },
-    {
-        'id': 'scene08',
-        'text': '''各画像ファイルに対して以下の処理を実行します。
-まず、画像を読み込み、CMYK形式の場合はRGB形式に変換します。
-ファイル名から拡張子を除去し、処理中であることを表示します。
-calculate_resize_dimensions関数でリサイズ後のサイズを計算し、
-resize_image関数で実際にリサイズを実行します。
-最後に、指定された形式で画像を保存し、品質は90に設定しています。'''
-    },
-    {
-        'id': 'scene09',
-        'text': '''画像処理中に発生する可能性のあるエラーを適切に処理します。
-IOErrorは画像の読み込みや保存に関するエラーを、
-その他の例外は予期しないエラーをキャッチします。
-エラーが発生しても、他の画像の処理は継続されます。'''
-    },
-    {
-        'id': 'scene10',
-        'text': '''すべての処理が完了したら、結果のサマリーを表示します。
-処理に成功した画像数と、エラーが発生した画像数を報告し、
-ユーザーが処理結果を一目で確認できるようにしています。'''
-    }
-]
+from audio_encoders import ENCODERS
+from build_profiler import span
+from content_cache import ContentCache
+from ffmpeg_runner import invocations as ffmpeg_invocations, summarize as summarize_ffmpeg
+from media_info import get_duration
+from scene_manifest import MANIFEST_FILE, load_manifest, update_scenes
+from scene_script import SCRIPT_FILE, diff_scenes, load_script, settings_hash
+from tts_backends import BACKENDS, TTSError, get_backend
+
+# TTS backend: 'say' (macOS) or 'espeak' (espeak-ng, Linux/macOS/Windows)
+backend_name = 'say' if sys.platform == 'darwin' else 'espeak'
 
 # Japanese voice options for macOS say command
-# Available voices: Kyoko, Otoya
-voice = 'Kyoko'  # Female Japanese voice
+# Available voices: Kyoko, Otoya (None uses the backend default: Kyoko for say, ja for espeak)
+voice = None
 rate = 225  # Speech rate (words per minute) - 1.5x faster than default 150
 
-print(f"Using voice: {voice}")
-print(f"Speech rate: {rate} words per minute\n")
-
-# Generate audio for each scene
-for scene in scenes:
-    output_file = f"audio/{scene['id']}_narration.aiff"
-    
-    print(f"Generating audio for {scene['id']}...")
-    
-    # Create the say command
-    cmd = [
-        'say',
-        '-v', voice,
-        '-r', str(rate),
-        '-o', output_file,
-        scene['text']
+# MP3 encoder: 'ffmpeg' (child process fed through a pipe) or 'lame' (in-process, needs lameenc)
+encoder_name = 'ffmpeg'
+encoder_settings = {'codec': 'mp3', 'bitrate': '128k'}  # part of the cache key
+
+# Cache of previously generated narrations
+cache_dir = '.cache/audio'
+cache_size_mb = 500
+
+# Number of scenes processed concurrently (TTS/ffmpeg are separate processes)
+default_jobs = os.cpu_count() or 1
+
+
+def generation_settings(backend, encoder=encoder_name):
+    """The backend and encoder settings dicts that determine a narration's MP3."""
+    return backend.settings(), dict(encoder_settings, encoder=encoder)
+
+
+def audio_settings(backend, encoder=encoder_name):
+    """Hash of the settings narrations are generated with, for the manifest."""
+    return settings_hash(*generation_settings(backend, encoder))
+
+
+def process_scene(scene, backend, cache=None, encoder=encoder_name, log_dir=None):
+    """Synthesize, encode and measure one scene, timing each step.
+
+    PCM from the backend is streamed straight into the encoder, so no
+    intermediate AIFF/WAV file is written to the audio folder. When a
+    cache is given, a narration with the same text and settings is copied
+    from it instead of being synthesized again. ffmpeg logs go to log_dir
+    (see ffmpeg_runner.run_ffmpeg).
+    """
+    with span('tts', 'audio', scene=scene['id']) as record:
+        result = _process_scene(scene, backend, cache, encoder, log_dir)
+        if record is not None:
+            record['args']['cached'] = result['cached']
+        return result
+
+
+def _process_scene(scene, backend, cache, encoder, log_dir):
+    mp3_file = scene['audio']
+    timings = {}
+    cached = False
+
+    key = None
+    if cache is not None:
+        key = cache.make_key(scene['text'], *generation_settings(backend, encoder))
+
+    if cache is not None and cache.get(key, mp3_file):
+        cached = True
+        timings['generate'] = 0.0
+    else:
+        # Synthesis and encoding run concurrently, so they are timed together
+        start = time.perf_counter()
+        ENCODERS[encoder](
+            lambda sink: backend.stream(scene['text'], sink),
+            mp3_file,
+            backend.sample_rate,
+            bitrate=encoder_settings['bitrate'],
+            log_dir=log_dir,
+        )
+        timings['generate'] = time.perf_counter() - start
+
+    # Read from the MP3 headers in-process (no ffprobe)
+    start = time.perf_counter()
+    duration = get_duration(mp3_file)
+    timings['probe'] = time.perf_counter() - start
+
+    # Only a narration that parses is cached, so a truncated encode is not replayed
+    if cache is not None and not cached:
+        cache.put(key, mp3_file)
+
+    return {
+        'id': scene['id'],
+        'audio_file': mp3_file,
+        'duration': duration,
+        'cached': cached,
+        'timings': timings,
+    }
+
+
+def generate_all(scenes, backend, jobs=default_jobs, cache=None, encoder=encoder_name, on_done=None):
+    """Process every scene on a pool of at most `jobs` workers.
+
+    Returns a dict mapping scene id to the result of process_scene for
+    the scenes that succeeded. on_done(scene_id, result, error) is called
+    as each scene finishes, with either result or error set.
+    """
+    for directory in {os.path.dirname(scene['audio']) or '.' for scene in scenes}:
+        os.makedirs(directory, exist_ok=True)
+    results = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = {executor.submit(process_scene, scene, backend, cache, encoder): scene for scene in scenes}
+        for future in as_completed(futures):
+            scene_id = futures[future]['id']
+            try:
+                result = future.result()
+            except subprocess.CalledProcessError as e:
+                print(f"  ✗ {scene_id}: Error running {e.cmd[0]}: {e}")
+                if e.stderr:
+                    stderr = e.stderr.decode(errors='replace') if isinstance(e.stderr, bytes) else e.stderr
+                    print(f"    stderr: {stderr.strip()}")
+                if on_done is not None:
+                    on_done(scene_id, None, e)
+                continue
+            except Exception as e:
+                print(f"  ✗ {scene_id}: Unexpected error: {e}")
+                if on_done is not None:
+                    on_done(scene_id, None, e)
+                continue
+
+            results[scene_id] = result
+            if on_done is not None:
+                on_done(scene_id, result, None)
+            source = 'cached' if result['cached'] else 'generated'
+            print(f"  ✓ {scene_id}: {result['audio_file']} ({result['duration']:.1f}s, {source})")
+
+    return results
+
+
+def manifest_updates(scenes, results, settings):
+    """Manifest entries (audio, duration, text, audio_settings) for the scenes that succeeded."""
+    return [
+        {'id': scene['id'], 'audio': results[scene['id']]['audio_file'],
+         'duration': round(results[scene['id']]['duration'], 3), 'text': scene['text'],
+         'audio_settings': settings}
+        for scene in scenes if scene['id'] in results
     ]
-    
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate narration audio for each scene')
+    parser.add_argument('-j', '--jobs', type=int, default=default_jobs,
+                        help=f'number of scenes processed concurrently (default: {default_jobs})')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default=backend_name,
+                        help=f'TTS engine (default: {backend_name})')
+    parser.add_argument('--voice', default=voice, help='voice name (default: backend specific)')
+    parser.add_argument('--rate', type=int, default=rate, help=f'words per minute (default: {rate})')
+    parser.add_argument('--encoder', choices=sorted(ENCODERS), default=encoder_name,
+                        help=f'MP3 encoder (default: {encoder_name})')
+    parser.add_argument('--no-cache', action='store_true', help='always regenerate every scene')
+    parser.add_argument('--cache-dir', default=cache_dir, help=f'audio cache directory (default: {cache_dir})')
+    parser.add_argument('--cache-size', type=int, default=cache_size_mb,
+                        help=f'maximum cache size in MB (default: {cache_size_mb})')
+    parser.add_argument('--manifest', default=MANIFEST_FILE,
+                        help=f'scene manifest to update (default: {MANIFEST_FILE})')
+    parser.add_argument('--script', default=SCRIPT_FILE, help=f'scene script (default: {SCRIPT_FILE})')
+    parser.add_argument('--force', action='store_true', help='synthesize every scene, changed or not')
+    args = parser.parse_args()
+
+    all_scenes = load_script(args.script)
+
+    # The backend is created once and shared by every scene; its settings
+    # also decide which narrations are out of date
     try:
-        # Execute the command
-        subprocess.run(cmd, check=True)
-        print(f"  ✓ Saved to {output_file}")
-        
-        # Get file info
-        file_size = os.path.getsize(output_file) / 1024 / 1024  # MB
-        print(f"  File size: {file_size:.2f} MB")
-        
-    except subprocess.CalledProcessError as e:
-        print(f"  ✗ Error generating audio: {e}")
-    except Exception as e:
-        print(f"  ✗ Unexpected error: {e}")
-
-print("\nConverting AIFF files to MP3...")
-
-# Convert AIFF to MP3 for smaller file size
-for scene in scenes:
-    aiff_file = f"audio/{scene['id']}_narration.aiff"
-    mp3_file = f"audio/{scene['id']}_narration.mp3"
-    
-    if os.path.exists(aiff_file):
-        print(f"Converting {scene['id']}...")
-        cmd = [
-            'ffmpeg',
-            '-i', aiff_file,
-            '-acodec', 'mp3',
-            '-ab', '128k',
-            mp3_file,
-            '-y'  # Overwrite output file
-        ]
-        
-        try:
-            subprocess.run(cmd, check=True, capture_output=True)
-            print(f"  ✓ Converted to {mp3_file}")
-            
-            # Remove the original AIFF file
-            os.remove(aiff_file)
-            print(f"  ✓ Removed {aiff_file}")
-            
-        except subprocess.CalledProcessError as e:
-            print(f"  ✗ Error converting to MP3: {e}")
-        except Exception as e:
-            print(f"  ✗ Unexpected error: {e}")
-
-print("\nAll audio files generated successfully!")
-
-# Calculate duration of each audio file
-print("\nAudio file durations:")
-for scene in scenes:
-    mp3_file = f"audio/{scene['id']}_narration.mp3"
-    if os.path.exists(mp3_file):
-        # Get duration using ffprobe
-        cmd = [
-            'ffprobe',
-            '-v', 'error',
-            '-show_entries', 'format=duration',
-            '-of', 'default=noprint_wrappers=1:nokey=1',
-            mp3_file
-        ]
-        
-        try:
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            duration = float(result.stdout.strip())
-            print(f"  {scene['id']}: {duration:.1f} seconds")
-        except:
-            print(f"  {scene['id']}: Unable to get duration")
\ No newline at end of file
+        backend = get_backend(args.backend, voice=args.voice, rate=args.rate)
+    except TTSError as e:
+        print(f"✗ Error: {e}")
+        sys.exit(1)
+    settings = audio_settings(backend, args.encoder)
+
+    changed = set(diff_scenes(all_scenes, load_manifest(args.manifest), audio_settings=settings)['audio'])
+    scenes = [scene for scene in all_scenes if args.force or scene['id'] in changed]
+    for scene in all_scenes:
+        if scene not in scenes:
+            print(f"Unchanged: {scene['audio']}")
+    if not scenes:
+        backend.close()
+        print("\n✓ All narrations are up to date")
+        return
+
+    cache = None
+    if not args.no_cache:
+        cache = ContentCache(args.cache_dir, max_bytes=args.cache_size * 1024 * 1024)
+
+    print(f"Using backend: {backend.name}")
+    print(f"Using voice: {backend.voice}")
+    print(f"Speech rate: {backend.rate} words per minute")
+    print(f"Encoder: {args.encoder}")
+    print(f"Concurrent jobs: {args.jobs}\n")
+
+    start = time.perf_counter()
+    try:
+        results = generate_all(scenes, backend, args.jobs, cache, args.encoder)
+    finally:
+        backend.close()
+    wall_time = time.perf_counter() - start
+
+    print("\nPer-scene timing (synthesize+encode / probe):")
+    for scene in scenes:
+        result = results.get(scene['id'])
+        if result is None:
+            print(f"  {scene['id']}: failed")
+            continue
+        t = result['timings']
+        print(f"  {scene['id']}: {result['duration']:.1f} seconds of audio, "
+              f"{t['generate']:.2f}s / {t['probe']:.3f}s")
+
+    # Record the measured durations for the video stage
+    update_scenes(manifest_updates(scenes, results, settings), args.manifest)
+    print(f"\n✓ Updated scene manifest: {args.manifest}")
+
+    busy_time = sum(sum(r['timings'].values()) for r in results.values())
+    cached_count = sum(1 for r in results.values() if r['cached'])
+    print(f"\nGenerated {len(results)}/{len(scenes)} audio files in {wall_time:.2f}s "
+          f"(serial work: {busy_time:.2f}s, {cached_count} from cache)")
+    if ffmpeg_invocations:
+        print(summarize_ffmpeg())
+    if len(results) < len(scenes):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,44 +1,100 @@
 #!/usr/bin/env python3
 """
 Generate screenshot images for each scene of rbeta.py
+
+Scenes (line ranges and image paths) are read from script.txt. Only
+scenes whose lines or renderer settings (theme, font, sizes) changed
+since the last build, or whose image is missing, are rendered again (use
+--force after changing the renderer's code). The image path, the gap
+that follows each scene and hashes of the rendered code and the renderer
+settings are recorded in the scene manifest (scenes.json) for the later
+stages; scenes no longer in the script are removed from it.
 """
 
+import argparse
 import os
-import sys
+from build_profiler import span
 from code_to_image_simple import SimpleCodeImageGenerator
+from scene_manifest import MANIFEST_FILE, load_manifest, update_scenes
+from scene_script import SCRIPT_FILE, code_hash, diff_scenes, load_script, settings_hash
+
+source_file = 'rbeta.py'
+
+# Silence inserted after each scene in the video (none after the last one)
+scene_gap = 1.0
+
+# Renderer settings (light theme for better visibility)
+theme = 'light'
+font_size = 16
+
+
+def create_generator():
+    """The code image generator the screenshots are rendered with."""
+    return SimpleCodeImageGenerator(theme=theme, font_size=font_size)
 
-# Read the source code
-with open('rbeta.py', 'r', encoding='utf-8') as f:
-    lines = f.readlines()
-
-# Define scenes with their line ranges and output filenames
-scenes = [
-    {'name': 'scene01_import', 'start': 1, 'end': 3},
-    {'name': 'scene02_settings', 'start': 5, 'end': 10},
-    {'name': 'scene03_calculate_resize', 'start': 13, 'end': 41},
-    {'name': 'scene04_resize_image', 'start': 44, 'end': 56},
-    {'name': 'scene05_validation', 'start': 59, 'end': 75},
-    {'name': 'scene06_output_folder', 'start': 77, 'end': 83},
-    {'name': 'scene07_main_loop_start', 'start': 85, 'end': 100},
-    {'name': 'scene08_image_processing', 'start': 102, 'end': 134},
-    {'name': 'scene09_error_handling', 'start': 136, 'end': 141},
-    {'name': 'scene10_summary', 'start': 143, 'end': 148}
-]
-
-# Create image generator (using light theme for better visibility)
-generator = SimpleCodeImageGenerator(theme='light', font_size=16)
-
-# Generate screenshots for each scene
-for scene in scenes:
+
+def render_scene(generator, scene, lines, source_name):
+    """Render the scene's lines of the source (`lines`, from readlines()) to its image."""
     # Extract the relevant lines (adjusting for 0-based indexing)
-    scene_lines = lines[scene['start']-1:scene['end']]
-    scene_code = ''.join(scene_lines)
-    
-    # Generate the image
-    output_path = f"pic/{scene['name']}.png"
-    title = f"rbeta.py - Lines {scene['start']}-{scene['end']}"
-    
-    print(f"Generating {output_path}...")
-    generator.generate_image(scene_code, output_path, title=title)
-
-print("\nAll screenshots generated successfully!")
\ No newline at end of file
+    scene_code = ''.join(lines[scene['start']-1:scene['end']])
+    title = f"{source_name} - Lines {scene['start']}-{scene['end']}"
+
+    os.makedirs(os.path.dirname(scene['image']) or '.', exist_ok=True)
+    with span('render', 'screenshots', scene=scene['id'], lines=scene['end'] - scene['start'] + 1):
+        generator.generate_image(scene_code, scene['image'], title=title)
+
+
+def render_settings(generator):
+    """Hash of the generator settings the images are rendered with."""
+    return settings_hash(generator.settings())
+
+
+def manifest_updates(scenes, lines, settings):
+    """Manifest entries (image, gap, code_hash, render_settings) for every scene of the script."""
+    return [{
+        'id': scene['id'],
+        'image': scene['image'],
+        'gap': scene_gap if index < len(scenes) - 1 else 0.0,
+        'code_hash': code_hash(scene, lines),
+        'render_settings': settings,
+    } for index, scene in enumerate(scenes)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render a screenshot of the code shown in each scene')
+    parser.add_argument('--script', default=SCRIPT_FILE, help=f'scene script (default: {SCRIPT_FILE})')
+    parser.add_argument('--manifest', default=MANIFEST_FILE,
+                        help=f'scene manifest to update (default: {MANIFEST_FILE})')
+    parser.add_argument('--source', default=source_file,
+                        help=f'source file the scenes show (default: {source_file})')
+    parser.add_argument('--force', action='store_true', help='render every scene, changed or not')
+    args = parser.parse_args()
+
+    scenes = load_script(args.script)
+
+    # Read the source code
+    with open(args.source, 'r', encoding='utf-8') as f:
+        lines = f.readlines()
+
+    generator = create_generator()
+    settings = render_settings(generator)
+
+    changed = set(diff_scenes(scenes, load_manifest(args.manifest), lines, settings)['screenshots'])
+
+    # Generate screenshots for each changed scene
+    for scene in scenes:
+        if not args.force and scene['id'] not in changed:
+            print(f"Unchanged: {scene['image']}")
+        else:
+            print(f"Generating {scene['image']}...")
+            render_scene(generator, scene, lines, os.path.basename(args.source))
+
+    # The script lists every scene, so it also sets the manifest's scene order
+    update_scenes(manifest_updates(scenes, lines, settings), args.manifest, prune=True)
+
+    print("\nAll screenshots generated successfully!")
+    print(f"✓ Updated scene manifest: {args.manifest}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Read audio duration and format information without spawning ffprobe
+
+Supports MP3 (Xing/Info and VBRI headers, LAME gapless info, frame scan
+fallback), WAV and AIFF/AIFC by parsing the file headers in-process.
+
+Usage:
+    python media_info.py audio/*.mp3
+"""
+
+import os
+import struct
+import sys
+
+# MPEG audio bitrate tables in kbps, indexed by [version_is_mpeg1][layer][index]
+_BITRATES = {
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+
+# Sample rates indexed by the 2-bit version field (0 = MPEG 2.5, 2 = MPEG 2, 3 = MPEG 1)
+_SAMPLE_RATES = {
+    0: [11025, 12000, 8000],
+    2: [22050, 24000, 16000],
+    3: [44100, 48000, 32000],
+}
+
+
+class MediaInfoError(Exception):
+    """Raised when a file cannot be parsed."""
+
+
+def _parse_mp3_frame_header(data, offset):
+    """Decode the 4-byte MPEG audio frame header at `offset`, or return None."""
+    if offset + 4 > len(data):
+        return None
+    b0, b1, b2, b3 = data[offset:offset + 4]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+
+    version = (b1 >> 3) & 0x03
+    layer_bits = (b1 >> 1) & 0x03
+    bitrate_index = b2 >> 4
+    sample_rate_index = (b2 >> 2) & 0x03
+    if version == 1 or layer_bits == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    layer = 4 - layer_bits
+    mpeg1 = version == 3
+    bitrate = _BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    padding = (b2 >> 1) & 0x01
+    mono = (b3 >> 6) == 3
+
+    if layer == 1:
+        samples_per_frame = 384
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 2 or mpeg1:
+        samples_per_frame = 1152
+        frame_length = 144 * bitrate // sample_rate + padding
+    else:
+        samples_per_frame = 576
+        frame_length = 72 * bitrate // sample_rate + padding
+
+    return {
+        'mpeg1': mpeg1,
+        'layer': layer,
+        'bitrate': bitrate,
+        'sample_rate': sample_rate,
+        'channels': 1 if mono else 2,
+        'samples_per_frame': samples_per_frame,
+        'frame_length': frame_length,
+    }
+
+
+def _read_xing(data, offset, header):
+    """Return (frames, encoder_delay, padding) from a Xing/Info/VBRI header, or None."""
+    if header['layer'] == 3:
+        if header['mpeg1']:
+            side_info = 17 if header['channels'] == 1 else 32
+        else:
+            side_info = 9 if header['channels'] == 1 else 17
+        pos = offset + 4 + side_info
+        tag = data[pos:pos + 4]
+        if tag in (b'Xing', b'Info'):
+            flags = struct.unpack('>I', data[pos + 4:pos + 8])[0]
+            pos += 8
+            frames = None
+            if flags & 0x01:
+                frames = struct.unpack('>I', data[pos:pos + 4])[0]
+                pos += 4
+            if flags & 0x02:
+                pos += 4
+            if flags & 0x04:
+                pos += 100
+            if flags & 0x08:
+                pos += 4
+            if frames is None:
+                return None
+
+            # LAME extension stores encoder delay and padding for gapless playback
+            delay = padding = 0
+            if data[pos:pos + 4] in (b'LAME', b'Lavf', b'Lavc'):
+                delay_bytes = data[pos + 21:pos + 24]
+                if len(delay_bytes) == 3:
+                    delay = (delay_bytes[0] << 4) | (delay_bytes[1] >> 4)
+                    padding = ((delay_bytes[1] & 0x0F) << 8) | delay_bytes[2]
+            return frames, delay, padding
+
+    # VBRI header (Fraunhofer encoder) sits at a fixed offset after the header
+    pos = offset + 4 + 32
+    if data[pos:pos + 4] == b'VBRI':
+        delay = struct.unpack('>H', data[pos + 6:pos + 8])[0]
+        frames = struct.unpack('>I', data[pos + 14:pos + 18])[0]
+        return frames, delay, 0
+
+    return None
+
+
+def _mp3_info(data):
+    offset = 0
+    # Skip an ID3v2 tag (size is a 28-bit synchsafe integer)
+    if data[:3] == b'ID3' and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        offset = 10 + size + (10 if data[5] & 0x10 else 0)
+
+    end = len(data)
+    if end >= 128 and data[end - 128:end - 125] == b'TAG':
+        end -= 128
+
+    # Find the first frame whose successor is also a valid frame
+    header = None
+    while offset < end - 4:
+        header = _parse_mp3_frame_header(data, offset)
+        if header is not None:
+            following = _parse_mp3_frame_header(data, offset + header['frame_length'])
+            if following is not None or offset + header['frame_length'] >= end:
+                break
+        header = None
+        offset += 1
+    if header is None:
+        raise MediaInfoError('no MPEG audio frames found')
+
+    xing = _read_xing(data, offset, header)
+    if xing is not None:
+        frames, delay, padding = xing
+        samples = frames * header['samples_per_frame'] - delay - padding
+    else:
+        # No VBR header: walk every frame
+        samples = 0
+        pos = offset
+        while pos < end:
+            frame = _parse_mp3_frame_header(data, pos)
+            if frame is None:
+                break
+            samples += frame['samples_per_frame']
+            pos += frame['frame_length']
+
+    return {
+        'format': 'mp3',
+        'duration': max(samples, 0) / header['sample_rate'],
+        'sample_rate': header['sample_rate'],
+        'channels': header['channels'],
+    }
+
+
+def _wav_info(data):
+    if data[:4] != b'RIFF' or data[8:12] != b'WAVE':
+        raise MediaInfoError('not a RIFF/WAVE file')
+    pos = 12
+    fmt = None
+    while pos + 8 <= len(data):
+        chunk_id = data[pos:pos + 4]
+        size = struct.unpack('<I', data[pos + 4:pos + 8])[0]
+        body_start = pos + 8
+        if chunk_id == b'fmt ':
+            channels, sample_rate, _, block_align = struct.unpack('<HIIH', data[body_start + 2:body_start + 14])
+            fmt = (channels, sample_rate, block_align)
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise MediaInfoError('data chunk before fmt chunk')
+            channels, sample_rate, block_align = fmt
+            # Streamed WAVs may carry a placeholder size; trust the file length
+            size = min(size, len(data) - body_start)
+            return {
+                'format': 'wav',
+                'duration': size // block_align / sample_rate,
+                'sample_rate': sample_rate,
+                'channels': channels,
+            }
+        pos = body_start + size + (size & 1)
+    raise MediaInfoError('no data chunk found')
+
+
+def _extended_to_float(data):
+    """Convert an 80-bit IEEE 754 extended float (AIFF sample rate)."""
+    exponent = struct.unpack('>H', data[:2])[0] & 0x7FFF
+    mantissa = struct.unpack('>Q', data[2:10])[0]
+    if exponent == 0 and mantissa == 0:
+        return 0.0
+    return mantissa * 2.0 ** (exponent - 16383 - 63)
+
+
+def _aiff_info(data):
+    if data[:4] != b'FORM' or data[8:12] not in (b'AIFF', b'AIFC'):
+        raise MediaInfoError('not an AIFF file')
+    pos = 12
+    while pos + 8 <= len(data):
+        chunk_id = data[pos:pos + 4]
+        size = struct.unpack('>I', data[pos + 4:pos + 8])[0]
+        if chunk_id == b'COMM':
+            body = data[pos + 8:pos + 26]
+            channels, frames = struct.unpack('>hI', body[:6])
+            sample_rate = _extended_to_float(body[8:18])
+            return {
+                'format': 'aiff',
+                'duration': frames / sample_rate if sample_rate else 0.0,
+                'sample_rate': int(sample_rate),
+                'channels': channels,
+            }
+        pos += 8 + size + (size & 1)
+    raise MediaInfoError('no COMM chunk found')
+
+
+def get_audio_info(path):
+    """Return a dict with format, duration (seconds), sample_rate and channels."""
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    if data[:4] == b'RIFF':
+        return _wav_info(data)
+    if data[:4] == b'FORM':
+        return _aiff_info(data)
+    return _mp3_info(data)
+
+
+def get_duration(path):
+    """Return the duration of an audio file in seconds."""
+    return get_audio_info(path)['duration']
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python media_info.py <audio file> [...]")
+        sys.exit(1)
+
+    for path in sys.argv[1:]:
+        if not os.path.exists(path):
+            print(f"  ✗ {path}: not found")
+            continue
+        try:
+            info = get_audio_info(path)
+        except MediaInfoError as e:
+            print(f"  ✗ {path}: {e}")
+            continue
+        print(f"  {path}: {info['duration']:.2f} seconds "
+              f"({info['format']}, {info['sample_rate']} Hz, {info['channels']} ch)")
+
+
+if __name__ == '__main__':
+    main()
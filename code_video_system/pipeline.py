@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Run the whole code video pipeline with one command
+
+The stages form a dependency graph with file-level inputs and outputs:
+
+    screenshots --> resize --.
+                              +--> video
+    audio -------------------'
+
+Stages whose dependencies are done run concurrently (screenshots and
+audio start together). With --in-process the stages run one after the
+other inside this process instead, so the interpreter, the imports and the
+loaded fonts are shared by all of them. A stage is skipped when the content hash of its
+inputs matches the last successful run and its outputs still exist. When
+the stage's own code or arguments changed since then (or with --force),
+the stage is run with its force arguments, so it rebuilds every scene
+instead of only those whose per-scene inputs changed. Each
+stage runs as its own process with its output logged to
+logs/pipeline/<stage>.log, and a timing report with the critical path is
+printed at the end.
+
+Every run is profiled (build_profiler.py): each stage records wall time,
+CPU time and peak RSS per scene, and the stage traces are merged into one
+Chrome trace, logs/pipeline/trace.json. The run fails if it exceeds the
+time budget for the number of lines in the source file or the memory
+budget (see --max-time, --max-memory and --no-budgets).
+
+Usage:
+    python pipeline.py                  # build everything that changed
+    python pipeline.py resize           # only resize and what it needs
+    python pipeline.py --force --dry-run
+    python pipeline.py --force --max-time 120
+    python pipeline.py --in-process
+"""
+
+import argparse
+import glob
+import hashlib
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import redirect_stderr, redirect_stdout
+
+import build_profiler
+import ffmpeg_runner
+from build_profiler import check_budgets, memory_budget_mb, span, summarize_spans, time_budget
+from content_cache import hash_file
+
+# Source file the video explains; its line count sets the time budget
+source_file = 'rbeta.py'
+
+# Stage graph: script to run, stages it depends on, the data files (glob
+# patterns) it reads and writes, the code that decides how it builds them,
+# and the arguments that make it rebuild every scene when that code changed
+# (the stages otherwise skip scenes whose per-scene inputs did not change)
+STAGES = {
+    'screenshots': {
+        'script': 'generate_screenshots.py',
+        'deps': [],
+        'inputs': ['script.txt', source_file],
+        'code': ['scene_script.py', 'generate_screenshots.py', 'code_to_image_simple.py'],
+        'outputs': ['pic/*.png'],
+        'force_args': ['--force'],
+    },
+    'audio': {
+        'script': 'generate_audio.py',
+        'deps': [],
+        'inputs': ['script.txt'],
+        'code': ['scene_script.py', 'generate_audio.py', 'tts_backends.py', 'audio_encoders.py'],
+        'outputs': ['audio/*.mp3'],
+        # Cached narrations were made by the old code too
+        'force_args': ['--force', '--no-cache'],
+    },
+    'resize': {
+        'script': 'resize_screenshots.py',
+        'deps': ['screenshots'],
+        'inputs': ['pic/*.png'],
+        'code': ['resize_screenshots.py'],
+        'outputs': ['pic_resized/*.png'],
+        'force_args': ['--force'],
+    },
+    'video': {
+        'script': 'create_video_resized_correct.py',
+        'deps': ['resize', 'audio'],
+        'inputs': ['scenes.json', 'pic_resized/*.png', 'audio/*.mp3'],
+        'code': ['create_video_resized_correct.py', 'audio_timeline.py', 'subtitles.py', 'frame_sink.py'],
+        'outputs': ['rbeta_tutorial.mp4'],
+        # Cached segments were encoded by the old code too
+        'force_args': ['--no-cache'],
+    },
+}
+
+# Input and code hashes of the last successful run of each stage
+state_file = '.cache/pipeline.json'
+
+log_dir = os.path.join('logs', 'pipeline')
+
+trace_file = os.path.join(log_dir, 'trace.json')
+
+
+def _expand(patterns):
+    paths = []
+    for pattern in patterns:
+        paths.extend(sorted(glob.glob(pattern)))
+    return paths
+
+
+def _files_hash(patterns, prefix=b''):
+    digest = hashlib.sha256(prefix)
+    for path in _expand(patterns):
+        digest.update(path.encode('utf-8'))
+        digest.update(hash_file(path).encode('ascii'))
+    return digest.hexdigest()
+
+
+def inputs_hash(stage):
+    """Hash of the contents of the stage's data input files."""
+    return _files_hash(stage['inputs'])
+
+
+def code_hash(stage):
+    """Hash of the stage's script arguments and the contents of its code files."""
+    return _files_hash(stage.get('code', []), json.dumps(stage.get('args', [])).encode('utf-8'))
+
+
+def outputs_exist(stage):
+    return all(glob.glob(pattern) for pattern in stage['outputs'])
+
+
+def load_state(path=state_file):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(state, path=state_file):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+        f.write('\n')
+    os.replace(tmp_path, path)
+
+
+def select_stages(stages, targets):
+    """Return the names of `targets` and everything they depend on."""
+    selected = set()
+
+    def add(name):
+        if name not in selected:
+            selected.add(name)
+            for dep in stages[name]['deps']:
+                add(dep)
+
+    for target in targets or stages:
+        add(target)
+    return [name for name in stages if name in selected]
+
+
+def stage_trace_path(name):
+    return os.path.join(log_dir, f"{name}.trace.json")
+
+
+def run_stage(name, stage):
+    """Run the stage's script, logging its output. Returns (ok, log_path).
+
+    The stage process writes its profiling trace to stage_trace_path(name).
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    log_path = os.path.join(log_dir, f"{name}.log")
+    trace_path = stage_trace_path(name)
+    if os.path.exists(trace_path):
+        os.remove(trace_path)
+    env = dict(os.environ, **{build_profiler.TRACE_ENV: trace_path})
+    with open(log_path, 'w', encoding='utf-8') as log, \
+            span(name, 'pipeline', script=stage['script']) as record:
+        result = subprocess.run([sys.executable, stage['script'], *stage.get('args', [])],
+                                stdout=log, stderr=subprocess.STDOUT, env=env)
+        if record is not None and os.path.exists(trace_path):
+            # The stage's CPU time and peak RSS, including its own children
+            usage = build_profiler.load_trace(trace_path)['otherData']
+            record['child_cpu_time'] += usage['cpu_time']
+            record['peak_rss_mb'] = max(record['peak_rss_mb'], usage['peak_rss_mb'])
+    return result.returncode == 0, log_path
+
+
+def run_stage_in_process(name, stage):
+    """Run the stage's main() in this process, logging its output. Returns (ok, log_path).
+
+    The script's module is imported once and stays loaded for later runs.
+    Its spans are recorded in this process's trace.
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    log_path = os.path.join(log_dir, f"{name}.log")
+    if os.path.exists(stage_trace_path(name)):
+        os.remove(stage_trace_path(name))
+    module = importlib.import_module(os.path.splitext(os.path.basename(stage['script']))[0])
+    saved_argv = sys.argv
+    # Each stage reports only its own ffmpeg runs
+    ffmpeg_runner.take_invocations()
+    with open(log_path, 'w', encoding='utf-8') as log, redirect_stdout(log), redirect_stderr(log), \
+            span(name, 'pipeline', script=stage['script']):
+        sys.argv = [stage['script'], *stage.get('args', [])]
+        try:
+            module.main()
+            ok = True
+        except SystemExit as e:
+            ok = e.code in (None, 0)
+        except Exception:
+            traceback.print_exc()
+            ok = False
+        finally:
+            sys.argv = saved_argv
+    return ok, log_path
+
+
+def run_pipeline(stages=STAGES, targets=None, jobs=4, force=False, dry_run=False, in_process=False):
+    """Run the selected stages in dependency order.
+
+    Returns {name: {'status', 'start', 'end'}}, with times in seconds from
+    the start of the run. Status is 'ran', 'skipped', 'failed', 'blocked'
+    (a dependency failed) or 'pending' (dry run). With in_process, the
+    stages run one at a time in this process (see run_stage_in_process).
+    """
+    names = select_stages(stages, targets)
+    runner = run_stage_in_process if in_process else run_stage
+    if in_process:
+        jobs = 1
+    state = load_state()
+    results = {}
+    origin = time.perf_counter()
+    running = {}   # future -> (name, start, fingerprint)
+
+    def ready(name):
+        return (name not in results and name not in (job[0] for job in running.values())
+                and all(results.get(dep, {}).get('status') in ('ran', 'skipped', 'pending')
+                        for dep in stages[name]['deps']))
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        while len(results) < len(names):
+            # Stages below a failure can never run
+            for name in names:
+                if name not in results and any(
+                        results.get(dep, {}).get('status') in ('failed', 'blocked')
+                        for dep in stages[name]['deps']):
+                    now = time.perf_counter() - origin
+                    results[name] = {'status': 'blocked', 'start': now, 'end': now}
+
+            for name in names:
+                if not ready(name):
+                    continue
+                stage = stages[name]
+                now = time.perf_counter() - origin
+                fingerprint = {'inputs': inputs_hash(stage), 'code': code_hash(stage)}
+                previous = state.get(name)
+                deps_pending = any(results[dep]['status'] == 'pending' for dep in stage['deps'])
+                # A stage that did not record its code hash yet is forced once
+                rebuild_all = force or not isinstance(previous, dict) or previous.get('code') != fingerprint['code']
+                if not rebuild_all and not deps_pending and previous == fingerprint and outputs_exist(stage):
+                    print(f"  - {name}: up to date")
+                    results[name] = {'status': 'skipped', 'start': now, 'end': now}
+                    continue
+                if rebuild_all and stage.get('force_args'):
+                    stage = dict(stage, args=[*stage.get('args', []), *stage['force_args']])
+                reason = ' (every scene)' if rebuild_all else ''
+                if dry_run:
+                    print(f"  * {name}: would run {stage['script']}{reason}")
+                    results[name] = {'status': 'pending', 'start': now, 'end': now}
+                else:
+                    print(f"  > {name}: running {stage['script']}{reason}")
+                    running[executor.submit(runner, name, stage)] = (name, now, fingerprint)
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, start, fingerprint = running.pop(future)
+                end = time.perf_counter() - origin
+                ok, log_path = future.result()
+                results[name] = {'status': 'ran' if ok else 'failed', 'start': start, 'end': end}
+                if ok:
+                    state[name] = fingerprint
+                    print(f"  ✓ {name}: done in {end - start:.2f}s")
+                else:
+                    state.pop(name, None)
+                    print(f"  ✗ {name}: failed (see {log_path})")
+                save_state(state)
+
+    return results
+
+
+def critical_path(stages, results):
+    """Return (names, seconds) of the longest chain of stage durations."""
+    best = {}
+
+    def finish(name):
+        if name not in best:
+            duration = results[name]['end'] - results[name]['start']
+            chains = [finish(dep) for dep in stages[name]['deps'] if dep in results]
+            chain, seconds = max(chains, key=lambda c: c[1], default=([], 0.0))
+            best[name] = (chain + [name], seconds + duration)
+        return best[name]
+
+    return max((finish(name) for name in results), key=lambda c: c[1], default=([], 0.0))
+
+
+def write_run_trace(names, path=trace_file):
+    """Merge this process's trace with those of the stages that ran into `path`."""
+    events = build_profiler.trace_events('pipeline')
+    for name in names:
+        try:
+            stage_trace = build_profiler.load_trace(stage_trace_path(name))
+        except (FileNotFoundError, ValueError):
+            continue
+        for event in build_profiler.merge_events(stage_trace):
+            if event.get('ph') == 'M' and event['name'] == 'process_name':
+                event['args'] = {'name': name}
+            events.append(event)
+    build_profiler.write_trace(path, events=events)
+    return events
+
+
+def source_lines(path=source_file):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return sum(1 for _ in f)
+    except FileNotFoundError:
+        return 0
+
+
+def print_report(stages, results):
+    print(f"\n{'stage':<14}{'status':<10}{'start (s)':>11}{'time (s)':>10}")
+    for name in (name for name in stages if name in results):
+        result = results[name]
+        print(f"{name:<14}{result['status']:<10}{result['start']:>11.2f}"
+              f"{result['end'] - result['start']:>10.2f}")
+
+    wall = max((r['end'] for r in results.values()), default=0.0)
+    busy = sum(r['end'] - r['start'] for r in results.values())
+    path, path_time = critical_path(stages, results)
+    print(f"\nCritical path: {' -> '.join(path) or '-'} ({path_time:.2f}s)")
+    print(f"Wall time: {wall:.2f}s, total stage time: {busy:.2f}s")
+
+
+def print_profile(events, usage):
+    print()
+    for line in summarize_spans(events):
+        print(line)
+    print(f"\nCPU time: {usage['cpu_time']:.2f}s, peak RSS (all processes): {usage['peak_rss_mb']:.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the code video, re-running only stages whose inputs changed')
+    parser.add_argument('targets', nargs='*', metavar='stage',
+                        help=f"stages to build with their dependencies ({', '.join(STAGES)}; default: all)")
+    parser.add_argument('-j', '--jobs', type=int, default=4, help='stages run concurrently (default: 4)')
+    parser.add_argument('--force', action='store_true', help='run every stage and make it rebuild every scene')
+    parser.add_argument('--dry-run', action='store_true', help='only show what would run')
+    parser.add_argument('--in-process', action='store_true',
+                        help='run the stages one at a time in this process instead of one process each')
+    parser.add_argument('--trace', default=trace_file, help=f'Chrome trace to write (default: {trace_file})')
+    parser.add_argument('--max-time', type=float, default=None,
+                        help=f'time budget in seconds (default: from the line count of {source_file})')
+    parser.add_argument('--max-memory', type=float, default=memory_budget_mb,
+                        help=f'memory budget in MB (default: {memory_budget_mb})')
+    parser.add_argument('--no-budgets', action='store_true', help='report usage without enforcing the budgets')
+    args = parser.parse_args()
+    unknown = [target for target in args.targets if target not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage: {', '.join(unknown)}")
+
+    build_profiler.enable()
+    results = run_pipeline(targets=args.targets, jobs=args.jobs, force=args.force, dry_run=args.dry_run,
+                           in_process=args.in_process)
+    print_report(STAGES, results)
+    failed = any(r['status'] in ('failed', 'blocked') for r in results.values())
+    if args.dry_run:
+        sys.exit(1 if failed else 0)
+
+    ran = [name for name in results if results[name]['status'] in ('ran', 'failed')]
+    events = write_run_trace(ran, args.trace)
+    usage = build_profiler.process_usage()
+    print_profile(events, usage)
+    print(f"✓ Wrote trace: {args.trace}")
+
+    lines = source_lines()
+    max_time = time_budget(lines) if args.max_time is None else args.max_time
+    print(f"Budgets: {max_time:.0f}s for {lines} lines, {args.max_memory:.0f} MB")
+    violations = check_budgets(usage['wall_time'], usage['peak_rss_mb'], lines, max_time, args.max_memory)
+    for violation in violations:
+        print(f"✗ Over budget: {violation}")
+    if failed or (violations and not args.no_budgets):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Reference-workload benchmark of the whole pipeline
+
+Synthesizes deterministic Python sources of 100, 1000 and 5000 lines,
+splits each into scenes as batch.py does, and builds the video with
+pipeline.py in a scratch directory: screenshots, narration, resize and
+video, every stage forced. Narration uses the 'silence' TTS backend
+(tts_backends.py), which emits silence of the text's reading time, so
+the numbers do not depend on a speech engine and are the same on every
+run.
+
+For every size the stage wall times, CPU time and peak RSS of all
+processes (build_profiler.py) are recorded and checked against the
+budgets in the requirements. They are also compared with the committed
+baseline, pipeline_benchmark_baseline.json; a stage or total that is
+slower (or a peak that is larger) than the baseline by more than the
+tolerance is reported as a regression and fails the run, and so does a
+missing baseline: a check that cannot compare must not pass. Record a
+new baseline with --save-baseline on the reference machine (with ffmpeg
+and Pillow) after an intentional change; --no-compare only measures.
+
+Usage:
+    python pipeline_benchmark.py
+    python pipeline_benchmark.py --sizes 100 1000 --mode pipe --no-compare
+    python pipeline_benchmark.py --save-baseline
+"""
+
+import argparse
+import copy
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import build_profiler
+import create_video_resized_correct as video
+from batch import segment_source
+from build_profiler import check_budgets, time_budget
+from pipeline import STAGES, run_pipeline
+from scene_script import save_script
+
+SIZES = [100, 1000, 5000]
+
+results_file = 'pipeline_benchmark.json'
+baseline_file = 'pipeline_benchmark_baseline.json'
+
+# Allowed slowdown against the baseline, and changes too small to count
+# (timer and sampling noise)
+default_tolerance = 0.25
+min_seconds_change = 1.0
+min_memory_change_mb = 50.0
+
+_ADJECTIVES = ['weighted', 'rolling', 'normalized', 'clipped', 'smoothed', 'cumulative']
+
+
+# -- workload ----------------------------------------------------------------
+
+def _function_block(rng, index):
+    modulus = rng.randint(2, 9)
+    lines = [
+        f"def compute_{index}(values, factor={rng.randint(1, 9)}):",
+        f'    """Return the {rng.choice(_ADJECTIVES)} total of values."""',
+        "    total = 0",
+        "    for value in values:",
+        f"        if value % {modulus} == 0:",
+        "            total += value * factor",
+        "        else:",
+        "            total -= math.sqrt(abs(value))",
+    ]
+    for step in range(rng.randint(0, 12)):
+        lines.append(f"    total = total * {rng.randint(2, 7)} % {rng.randint(1000, 9999)} + {step}")
+    lines += ["    return total", "", ""]
+    return lines
+
+
+def _class_block(rng, index):
+    fields = [f"field_{n}" for n in range(rng.randint(2, 6))]
+    lines = [
+        f"class Record{index}:",
+        f'    """A record with {len(fields)} fields."""',
+        "",
+        f"    def __init__(self, {', '.join(fields)}):",
+    ]
+    lines += [f"        self.{field} = {field}" for field in fields]
+    lines += [
+        "",
+        "    def describe(self):",
+        f"        values = ({', '.join(f'self.{field}' for field in fields)},)",
+        "        return ', '.join(str(value) for value in values)",
+        "",
+        "",
+    ]
+    return lines
+
+
+def make_source(lines, seed=0):
+    """Return a deterministic, valid Python module of exactly `lines` lines."""
+    rng = random.Random(seed)
+    output = ['"""Synthetic module for the pipeline benchmark."""', '', 'import math', '', '']
+    index = 0
+    while True:
+        block = (_class_block if rng.random() < 0.3 else _function_block)(rng, index)
+        if len(output) + len(block) > lines:
+            break
+        output.extend(block)
+        index += 1
+    while len(output) < lines:
+        output.append(f"CONSTANT_{len(output)} = {len(output)}")
+    return '\n'.join(output[:lines]) + '\n'
+
+
+def benchmark_stages(source_name, mode):
+    """The pipeline stages, runnable from a scratch directory on `source_name`."""
+    code_dir = os.path.dirname(os.path.abspath(__file__))
+    stages = copy.deepcopy(STAGES)
+    for stage in stages.values():
+        stage['script'] = os.path.join(code_dir, stage['script'])
+        stage['code'] = [os.path.join(code_dir, path) for path in stage['code']]
+    stages['screenshots']['args'] = ['--source', source_name]
+    stages['audio']['args'] = ['--backend', 'silence', '--no-cache']
+    stages['video']['args'] = ['--mode', mode]
+    return stages
+
+
+# -- runs --------------------------------------------------------------------
+
+def run_size(lines, work_dir, mode='segments', jobs=4, seed=0):
+    """Build the video for a `lines`-line source in work_dir and return its measurements."""
+    source_name = f"bench_{lines}.py"
+    with open(os.path.join(work_dir, source_name), 'w', encoding='utf-8') as f:
+        f.write(make_source(lines, seed))
+    scenes = [dict(scene, image=f"pic/{scene['id']}.png", audio=f"audio/{scene['id']}_narration.mp3")
+              for scene in segment_source(os.path.join(work_dir, source_name))]
+    save_script(scenes, os.path.join(work_dir, 'script.txt'))
+
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        origin = time.perf_counter()
+        results = run_pipeline(benchmark_stages(source_name, mode), jobs=jobs, force=True)
+    finally:
+        os.chdir(cwd)
+
+    records = {record['name']: record for record in build_profiler.spans()
+               if record['category'] == 'pipeline' and record['start'] >= origin}
+    stages = {}
+    for name, result in results.items():
+        record = records.get(name, {})
+        stages[name] = {
+            'status': result['status'],
+            'wall_time': round(result['end'] - result['start'], 3),
+            'cpu_time': round(record.get('cpu_time', 0.0), 3),
+            'peak_rss_mb': round(record.get('peak_rss_mb', 0.0), 1),
+        }
+    return {
+        'lines': lines,
+        'scenes': len(scenes),
+        'ok': all(stage['status'] == 'ran' for stage in stages.values()),
+        'wall_time': round(max((r['end'] for r in results.values()), default=0.0), 3),
+        'cpu_time': round(sum(stage['cpu_time'] for stage in stages.values()), 3),
+        'peak_rss_mb': round(max((stage['peak_rss_mb'] for stage in stages.values()), default=0.0), 1),
+        'budget_seconds': round(time_budget(lines), 1),
+        'stages': stages,
+    }
+
+
+def compare(results, baseline, tolerance=default_tolerance):
+    """Return (lines, metric, baseline, current) for every regression."""
+    previous = {entry['lines']: entry for entry in baseline.get('results', [])}
+    regressions = []
+    for entry in results:
+        base = previous.get(entry['lines'])
+        if base is None:
+            continue
+        metrics = [('wall_time', base['wall_time'], entry['wall_time'], min_seconds_change),
+                   ('peak_rss_mb', base['peak_rss_mb'], entry['peak_rss_mb'], min_memory_change_mb)]
+        for name, stage in entry['stages'].items():
+            if name in base['stages']:
+                metrics.append((f"{name}.wall_time", base['stages'][name]['wall_time'],
+                                stage['wall_time'], min_seconds_change))
+        for metric, old, new, noise in metrics:
+            if new - old > max(noise, old * tolerance):
+                regressions.append((entry['lines'], metric, old, new))
+    return regressions
+
+
+def print_table(results, baseline):
+    previous = {entry['lines']: entry for entry in baseline.get('results', [])}
+    names = list(STAGES)
+    print(f"\n{'lines':>6}{'scenes':>8}" + ''.join(f"{name:>13}" for name in names)
+          + f"{'total (s)':>11}{'budget (s)':>12}{'peak (MB)':>11}{'vs baseline':>13}")
+    for entry in results:
+        row = f"{entry['lines']:>6}{entry['scenes']:>8}"
+        for name in names:
+            stage = entry['stages'].get(name)
+            row += f"{stage['wall_time']:>13.2f}" if stage else f"{'-':>13}"
+        base = previous.get(entry['lines'])
+        change = (f"{(entry['wall_time'] / base['wall_time'] - 1) * 100:+.0f}%"
+                  if base and base['wall_time'] else '-')
+        print(row + f"{entry['wall_time']:>11.2f}{entry['budget_seconds']:>12.0f}"
+                    f"{entry['peak_rss_mb']:>11.0f}{change:>13}")
+
+
+def environment():
+    return {'cpu_count': os.cpu_count(), 'platform': platform.platform(),
+            'python': platform.python_version()}
+
+
+def load_baseline(path=baseline_file):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_json(data, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+        f.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the whole pipeline on synthetic 100-5000 line sources')
+    parser.add_argument('--sizes', nargs='+', type=int, default=SIZES,
+                        help=f"source sizes in lines (default: {' '.join(map(str, SIZES))})")
+    parser.add_argument('--mode', choices=sorted(video.ASSEMBLY_MODES), default='segments',
+                        help='video assembly mode (default: segments)')
+    parser.add_argument('-j', '--jobs', type=int, default=4, help='stages run concurrently (default: 4)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic sources (default: 0)')
+    parser.add_argument('--json', default=results_file, help=f'JSON output file (default: {results_file})')
+    parser.add_argument('--baseline', default=baseline_file, help=f'baseline to compare with (default: {baseline_file})')
+    parser.add_argument('--save-baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--no-compare', action='store_true',
+                        help='only measure and check the budgets, without a baseline')
+    parser.add_argument('--tolerance', type=float, default=default_tolerance,
+                        help=f'allowed slowdown against the baseline (default: {default_tolerance})')
+    parser.add_argument('--keep', metavar='DIR', default=None,
+                        help='build in DIR/<lines> and keep the outputs (default: temporary directories)')
+    args = parser.parse_args()
+
+    build_profiler.enable()
+    results = []
+    for lines in args.sizes:
+        print(f"\n=== {lines} lines ===")
+        if args.keep:
+            work_dir = os.path.join(args.keep, str(lines))
+            os.makedirs(work_dir, exist_ok=True)
+            results.append(run_size(lines, work_dir, args.mode, args.jobs, args.seed))
+        else:
+            with tempfile.TemporaryDirectory(prefix=f'pipeline-bench-{lines}-') as work_dir:
+                results.append(run_size(lines, work_dir, args.mode, args.jobs, args.seed))
+
+    baseline = load_baseline(args.baseline)
+    print_table(results, baseline)
+    report = {'environment': environment(), 'mode': args.mode, 'seed': args.seed, 'results': results}
+    save_json(report, args.json)
+    print(f"\n✓ Results written to {args.json}")
+
+    problems = [f"{entry['lines']} lines: build failed" for entry in results if not entry['ok']]
+    for entry in results:
+        problems += [f"{entry['lines']} lines: {violation}"
+                     for violation in check_budgets(entry['wall_time'], entry['peak_rss_mb'], entry['lines'])]
+
+    if args.save_baseline or args.no_compare:
+        pass
+    elif not baseline:
+        problems.append(f"no baseline at {args.baseline}; record one with --save-baseline "
+                        f"on the reference machine, or run with --no-compare")
+    else:
+        if baseline.get('environment', {}).get('cpu_count') != os.cpu_count():
+            print(f"  Note: the baseline was recorded on {baseline['environment'].get('platform')} "
+                  f"with {baseline['environment'].get('cpu_count')} CPUs")
+        compared = {entry['lines'] for entry in baseline.get('results', [])}
+        problems += [f"{entry['lines']} lines: not in the baseline" for entry in results
+                     if entry['lines'] not in compared]
+        problems += [f"{lines} lines: {metric} {old:.2f} -> {new:.2f} (regression)"
+                     for lines, metric, old, new in compare(results, baseline, args.tolerance)]
+
+    if args.save_baseline:
+        if any(not entry['ok'] for entry in results):
+            print("✗ Not saving a baseline from a failed run")
+            sys.exit(1)
+        save_json(report, args.baseline)
+        print(f"✓ Baseline written to {args.baseline}")
+
+    for problem in problems:
+        print(f"✗ {problem}")
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
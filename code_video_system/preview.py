@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Live preview: rebuild the changed scenes and a low-resolution video on save
+
+Watches script.txt and the source file. A burst of saves counts as one
+change once the files have been quiet for `debounce` seconds. Each change
+rebuilds only what it affects, with the render service's jobs
+(render_server.py) running in this process with warm fonts and engines:
+
+- screenshots of scenes whose code or line range changed
+- narrations whose text changed (through the audio cache)
+- the preview segment of every scene whose image, narration or timing
+  changed
+
+Preview segments are small MPEG-TS files (640x360, 5 fps, x264
+ultrafast) kept in a content cache. Untouched scenes are never
+re-encoded, and the preview is re-muxed by stream copy into
+preview/preview.mp4. With --hls a playlist, preview/index.m3u8, lists the
+segments directly and is rewritten without any muxing at all.
+
+The screenshots, narrations and scene manifest are the pipeline's real
+outputs, so a later `pipeline.py` build reuses them.
+
+Usage:
+    python preview.py                   # watch rbeta.py and script.txt
+    python preview.py --hls --backend silence
+    python preview.py --once            # build the preview and exit
+"""
+
+import argparse
+import math
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from audio_timeline import frame_aligned_timeline
+from content_cache import ContentCache, hash_file
+from ffmpeg_runner import run_ffmpeg
+from render_server import JobError, RenderService, audio_job, screenshots_job
+from resize_screenshots import BACKGROUND_COLOR, FILL_RATIO
+from scene_manifest import MANIFEST_FILE, load_manifest
+from scene_script import SCRIPT_FILE
+
+source_file = 'rbeta.py'
+
+# Preview output and encoding
+preview_dir = 'preview'
+preview_size = '640x360'
+preview_fps = 5
+preview_crf = 28
+preview_audio_bitrate = '64k'
+
+preview_cache_dir = '.cache/preview'
+preview_cache_size_mb = 500
+
+# Seconds the watched files must be unchanged before a rebuild, and
+# between checks for changes
+debounce = 0.2
+poll_interval = 0.1
+
+default_jobs = os.cpu_count() or 1
+
+
+# -- watching ----------------------------------------------------------------
+
+def snapshot(paths):
+    """Modification time and size of each path (None if it does not exist)."""
+    state = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            state[path] = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            state[path] = None
+    return state
+
+
+def watch(paths, on_change, debounce=debounce, poll_interval=poll_interval):
+    """Call on_change() after each burst of changes to `paths`, until interrupted."""
+    last = snapshot(paths)
+    while True:
+        time.sleep(poll_interval)
+        current = snapshot(paths)
+        if current == last:
+            continue
+        # Wait for the editor (or a formatter run on save) to finish writing
+        while True:
+            time.sleep(debounce)
+            settled = snapshot(paths)
+            if settled == current:
+                break
+            current = settled
+        last = current
+        on_change()
+
+
+# -- preview segments --------------------------------------------------------
+
+def preview_scenes(manifest_path=MANIFEST_FILE):
+    """Manifest scenes that have an image and a narration, in order."""
+    return [{'id': entry['id'], 'image': entry['image'], 'audio': entry['audio'],
+             'duration': entry['duration'], 'gap': entry.get('gap', 0.0)}
+            for entry in load_manifest(manifest_path)['scenes']
+            if all(field in entry for field in ('image', 'audio', 'duration'))
+            and os.path.exists(entry['image']) and os.path.exists(entry['audio'])]
+
+
+def preview_settings():
+    """Encoder settings that determine a preview segment (part of the cache key)."""
+    return {'size': preview_size, 'fps': preview_fps, 'crf': preview_crf,
+            'audio_bitrate': preview_audio_bitrate, 'background': BACKGROUND_COLOR,
+            'fill_ratio': FILL_RATIO}
+
+
+def segment_key(scene, frames):
+    """Cache key for a scene's preview segment: image and narration hashes and length."""
+    return ContentCache.make_key(
+        scene['id'],
+        {'image': hash_file(scene['image']), 'audio': hash_file(scene['audio']), 'frames': frames},
+        preview_settings(),
+    )
+
+
+def encode_segment(scene, frames, output_path):
+    """Encode one scene, letterboxed like resize_screenshots.py, to an MPEG-TS file."""
+    width, height = (int(n) for n in preview_size.split('x'))
+    box_width, box_height = int(width * FILL_RATIO), int(height * FILL_RATIO)
+    video_filter = (
+        f"[0:v]scale={box_width}:{box_height}:force_original_aspect_ratio=decrease:force_divisible_by=2,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:color={BACKGROUND_COLOR},setsar=1,format=yuv420p[v]"
+    )
+    cmd = [
+        'ffmpeg',
+        '-loop', '1',
+        '-framerate', str(preview_fps),
+        '-i', scene['image'],
+        '-i', scene['audio'],
+        '-filter_complex', f"{video_filter};[1:a]apad[a]",
+        '-map', '[v]',
+        '-map', '[a]',
+        '-frames:v', str(frames),
+        '-t', f"{frames / preview_fps:.3f}",
+        '-c:v', 'libx264',
+        '-preset', 'ultrafast',
+        '-tune', 'stillimage',
+        '-crf', str(preview_crf),
+        '-r', str(preview_fps),
+        '-c:a', 'aac',
+        '-b:a', preview_audio_bitrate,
+        '-ac', '1',
+        '-f', 'mpegts',
+        output_path,
+        '-y'
+    ]
+    run_ffmpeg(cmd, duration=frames / preview_fps, label=f"preview_{scene['id']}")
+    return output_path
+
+
+def build_segments(scenes, cache, jobs=default_jobs):
+    """Return [(scene, frames, segment_path)], encoding only the segments not in the cache."""
+    timeline = frame_aligned_timeline(scenes, preview_fps)
+
+    def build(scene, frames):
+        key = segment_key(scene, frames)
+        cached_segment = cache.lookup(key)
+        if cached_segment is not None:
+            return cached_segment, False
+        part_file = f"{cache.path_for(key)}.{os.getpid()}.part"
+        os.makedirs(os.path.dirname(part_file), exist_ok=True)
+        try:
+            encode_segment(scene, frames, part_file)
+            return cache.put(key, part_file, move=True), True
+        finally:
+            if os.path.exists(part_file):
+                os.remove(part_file)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = [executor.submit(build, scene, frames) for scene, (_, frames) in zip(scenes, timeline)]
+        segments = []
+        encoded = 0
+        for scene, (_, frames), future in zip(scenes, timeline, futures):
+            path, fresh = future.result()
+            encoded += fresh
+            segments.append((scene, frames, path))
+    return segments, encoded
+
+
+def write_mp4(segments, output_dir):
+    """Join the segments into output_dir/preview.mp4 by stream copy."""
+    os.makedirs(output_dir, exist_ok=True)
+    concat_file = os.path.join(output_dir, 'concat.txt')
+    with open(concat_file, 'w') as f:
+        for _, _, path in segments:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+    output = os.path.join(output_dir, 'preview.mp4')
+    part_file = output + '.part'
+    cmd = [
+        'ffmpeg',
+        '-f', 'concat',
+        '-safe', '0',
+        '-i', concat_file,
+        '-c', 'copy',
+        '-bsf:a', 'aac_adtstoasc',
+        '-movflags', '+faststart',
+        '-f', 'mp4',
+        part_file,
+        '-y'
+    ]
+    run_ffmpeg(cmd, label='preview_concat')
+    # Replaced in one step so a player never opens a half-written file
+    os.replace(part_file, output)
+    return output
+
+
+def write_hls(segments, output_dir):
+    """Publish the segments with an HLS playlist, output_dir/index.m3u8."""
+    os.makedirs(output_dir, exist_ok=True)
+    names = []
+    for scene, _, path in segments:
+        # The content hash in the name makes players fetch changed scenes again
+        name = f"{scene['id']}-{os.path.basename(path)[:8]}.ts"
+        target = os.path.join(output_dir, name)
+        if not os.path.exists(target):
+            try:
+                os.link(path, target)
+            except OSError:
+                shutil.copyfile(path, target)
+        names.append(name)
+
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3',
+             f"#EXT-X-TARGETDURATION:{max((math.ceil(frames / preview_fps) for _, frames, _ in segments), default=1)}",
+             '#EXT-X-MEDIA-SEQUENCE:0', '#EXT-X-PLAYLIST-TYPE:VOD']
+    for index, ((_, frames, _), name) in enumerate(zip(segments, names)):
+        if index:
+            lines.append('#EXT-X-DISCONTINUITY')  # every segment restarts its timestamps
+        lines += [f"#EXTINF:{frames / preview_fps:.3f},", name]
+    lines.append('#EXT-X-ENDLIST')
+
+    output = os.path.join(output_dir, 'index.m3u8')
+    with open(output + '.part', 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(output + '.part', output)
+
+    for filename in os.listdir(output_dir):
+        if filename.endswith('.ts') and filename not in names:
+            os.remove(os.path.join(output_dir, filename))
+    return output
+
+
+# -- rebuilds ----------------------------------------------------------------
+
+def _report(event):
+    if event['event'] == 'scene':
+        mark = '✗' if event['status'] == 'failed' else '✓'
+        detail = f": {event['message']}" if 'message' in event else ''
+        print(f"  {mark} {event['id']}: {event['status']}{detail}")
+
+
+def rebuild(service, args, cache):
+    """Bring the changed scenes and the preview up to date. Returns True on success."""
+    start = time.perf_counter()
+    params = {'script': args.script, 'manifest': args.manifest}
+    audio_params = dict(params, backend=args.backend) if args.backend else params
+    # Screenshots and narrations do not depend on each other
+    jobs = [service.jobs.submit(screenshots_job, service, dict(params, source=args.source), _report),
+            service.jobs.submit(audio_job, service, audio_params, _report)]
+    ok = True
+    for job in jobs:
+        try:
+            job.result()
+        except JobError as e:
+            print(f"  ✗ {e}")
+            ok = False
+        except Exception as e:
+            # Keep watching; the next save may fix it
+            print(f"  ✗ {type(e).__name__}: {e}")
+            ok = False
+
+    scenes = preview_scenes(args.manifest)
+    if not scenes:
+        print("✗ No scene has both a screenshot and a narration yet")
+        return False
+    try:
+        segments, encoded = build_segments(scenes, cache, args.jobs)
+        output = (write_hls if args.hls else write_mp4)(segments, args.output_dir)
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"✗ Error encoding the preview: {e}")
+        return False
+    mark = '✓' if ok else '!'
+    print(f"{mark} Preview updated in {time.perf_counter() - start:.2f}s "
+          f"({encoded} of {len(scenes)} scenes encoded): {output}", flush=True)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild a low-resolution preview whenever the script or source changes')
+    parser.add_argument('--source', default=source_file, help=f'source file the scenes show (default: {source_file})')
+    parser.add_argument('--script', default=SCRIPT_FILE, help=f'scene script (default: {SCRIPT_FILE})')
+    parser.add_argument('--manifest', default=MANIFEST_FILE, help=f'scene manifest (default: {MANIFEST_FILE})')
+    parser.add_argument('--output-dir', default=preview_dir, help=f'preview directory (default: {preview_dir})')
+    parser.add_argument('--hls', action='store_true', help='write an HLS playlist instead of an MP4')
+    parser.add_argument('--backend', help='TTS engine (default: as generate_audio.py)')
+    parser.add_argument('-j', '--jobs', type=int, default=default_jobs,
+                        help=f'preview segments encoded concurrently (default: {default_jobs})')
+    parser.add_argument('--debounce', type=float, default=debounce,
+                        help=f'seconds without changes before rebuilding (default: {debounce})')
+    parser.add_argument('--once', action='store_true', help='build the preview once and exit')
+    args = parser.parse_args()
+
+    service = RenderService(render_workers=args.jobs)
+    cache = ContentCache(preview_cache_dir, max_bytes=preview_cache_size_mb * 1024 * 1024, extension='.ts')
+    try:
+        service.preload()
+        ok = rebuild(service, args, cache)
+        if args.once:
+            if not ok:
+                sys.exit(1)
+            return
+        print(f"\nWatching {args.source} and {args.script} (Ctrl+C to stop)...", flush=True)
+        watch([args.source, args.script], lambda: rebuild(service, args, cache), args.debounce)
+    except KeyboardInterrupt:
+        print("\n✓ Stopped watching")
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
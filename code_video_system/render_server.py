@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+"""
+Resident render/synthesize/assemble service for the project folder
+
+`serve` starts a long-running process that keeps the code image
+generators (fonts and compiled token patterns), the TTS engines and all
+stage modules loaded, and accepts jobs on a Unix socket
+(.cache/codevideo.sock). Regenerating a scene then costs only the
+rendering or synthesis itself, not an interpreter start-up and imports.
+
+Jobs run on a small job pool; scenes within a screenshots job render on
+a shared render pool, and narrations on generate_audio's worker pool.
+Jobs that write or read the same outputs wait for each other (see
+JOB_RESOURCES), so a screenshots and an audio job run side by side but two
+video jobs, or an audio and a video job, run one after the other.
+The other subcommands are clients: they submit a job and print the
+progress the service streams back while it runs.
+
+Protocol: the client sends one JSON line {"job": NAME, "params": {...}}
+and receives JSON lines until the last one:
+
+    {"event": "accepted", "id": 3}
+    {"event": "scene", "id": "scene03", "status": "rendered"}
+    {"event": "progress", "percent": 42.0, ...}      (video, as ffmpeg_runner)
+    {"event": "done", "result": {...}, "seconds": 1.2}
+    {"event": "error", "message": "..."}
+
+Jobs: screenshots, audio, resize and video work on script.txt and the
+scene manifest in the directory the service was started in, like the
+stage scripts; ping and shutdown manage the service.
+
+Usage:
+    python render_server.py serve &
+    python render_server.py screenshots scene03     # re-render one scene
+    python render_server.py audio scene03 scene04
+    python render_server.py video --mode pipe
+    python render_server.py shutdown
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+
+socket_path = os.path.join('.cache', 'codevideo.sock')
+
+# Jobs run at once, and scenes rendered at once across screenshots jobs
+default_workers = 2
+default_render_workers = os.cpu_count() or 1
+
+
+class JobError(Exception):
+    """A job's parameters are invalid or the job failed."""
+
+
+class Warm:
+    """Code image generators and TTS backends kept loaded between jobs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generators = {}
+        self._backends = {}
+
+    def generator(self, theme='light', font_size=16):
+        from code_to_image_simple import SimpleCodeImageGenerator
+
+        key = (theme, font_size)
+        with self._lock:
+            if key not in self._generators:
+                self._generators[key] = SimpleCodeImageGenerator(theme=theme, font_size=font_size)
+            return self._generators[key]
+
+    def backend(self, name, voice=None, rate=225):
+        from tts_backends import TTSError, get_backend
+
+        key = (name, voice, rate)
+        with self._lock:
+            if key not in self._backends:
+                try:
+                    self._backends[key] = get_backend(name, voice=voice, rate=rate)
+                except TTSError as e:
+                    raise JobError(str(e))
+            return self._backends[key]
+
+    def describe(self):
+        with self._lock:
+            return {'generators': [list(key) for key in self._generators],
+                    'backends': [list(key) for key in self._backends]}
+
+    def close(self):
+        with self._lock:
+            for backend in self._backends.values():
+                backend.close()
+            self._backends.clear()
+
+
+# -- jobs --------------------------------------------------------------------
+
+def _select(scenes, wanted, changed, force):
+    """Scenes a job works on: the requested ids, else the changed ones (or all with force)."""
+    ids = {scene['id'] for scene in scenes}
+    unknown = [scene_id for scene_id in wanted if scene_id not in ids]
+    if unknown:
+        raise JobError(f"unknown scene: {', '.join(unknown)}")
+    if wanted:
+        return [scene for scene in scenes if scene['id'] in wanted]
+    return [scene for scene in scenes if force or scene['id'] in changed]
+
+
+def screenshots_job(service, params, report):
+    """Render the requested or changed scenes on the render pool."""
+    import generate_screenshots as stage
+    from scene_manifest import MANIFEST_FILE, load_manifest, update_scenes
+    from scene_script import SCRIPT_FILE, ScriptError, diff_scenes, load_script
+
+    source = params.get('source', stage.source_file)
+    manifest = params.get('manifest', MANIFEST_FILE)
+    try:
+        scenes = load_script(params.get('script', SCRIPT_FILE))
+        with open(source, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+    except (OSError, ScriptError) as e:
+        raise JobError(str(e))
+    generator = service.warm.generator(params.get('theme', 'light'), params.get('font_size', 16))
+    settings = stage.render_settings(generator)
+    changed = set(diff_scenes(scenes, load_manifest(manifest), lines, settings)['screenshots'])
+    targets = _select(scenes, params.get('scenes', []), changed, params.get('force', False))
+
+    futures = {service.render_pool.submit(stage.render_scene, generator, scene, lines,
+                                          os.path.basename(source)): scene['id']
+               for scene in targets}
+    failed = set()
+    for future in as_completed(futures):
+        scene_id = futures[future]
+        try:
+            future.result()
+        except Exception as e:
+            failed.add(scene_id)
+            report({'event': 'scene', 'id': scene_id, 'status': 'failed', 'message': str(e)})
+        else:
+            report({'event': 'scene', 'id': scene_id, 'status': 'rendered'})
+
+    updates = stage.manifest_updates(scenes, lines, settings)
+    for update in updates:
+        if update['id'] in failed:
+            del update['code_hash']  # keeps the scene marked as changed
+    update_scenes(updates, manifest, prune=True)
+    if failed:
+        raise JobError(f"rendering failed for {', '.join(sorted(failed))}")
+    return {'rendered': [scene['id'] for scene in targets]}
+
+
+def audio_job(service, params, report):
+    """Synthesize the requested or changed narrations with a warm backend."""
+    import generate_audio as stage
+    from content_cache import ContentCache
+    from scene_manifest import MANIFEST_FILE, load_manifest, update_scenes
+    from scene_script import SCRIPT_FILE, ScriptError, diff_scenes, load_script
+
+    manifest = params.get('manifest', MANIFEST_FILE)
+    try:
+        scenes = load_script(params.get('script', SCRIPT_FILE))
+    except (OSError, ScriptError) as e:
+        raise JobError(str(e))
+    backend = service.warm.backend(params.get('backend', stage.backend_name),
+                                   params.get('voice', stage.voice), params.get('rate', stage.rate))
+    encoder = params.get('encoder', stage.encoder_name)
+    settings = stage.audio_settings(backend, encoder)
+    changed = set(diff_scenes(scenes, load_manifest(manifest), audio_settings=settings)['audio'])
+    targets = _select(scenes, params.get('scenes', []), changed, params.get('force', False))
+
+    cache = None
+    if not params.get('no_cache', False):
+        cache = ContentCache(stage.cache_dir, max_bytes=stage.cache_size_mb * 1024 * 1024)
+
+    def on_done(scene_id, result, error):
+        if error is not None:
+            report({'event': 'scene', 'id': scene_id, 'status': 'failed', 'message': str(error)})
+        else:
+            report({'event': 'scene', 'id': scene_id,
+                    'status': 'cached' if result['cached'] else 'synthesized',
+                    'duration': round(result['duration'], 3)})
+
+    results = stage.generate_all(targets, backend, params.get('jobs', stage.default_jobs), cache,
+                                 encoder, on_done=on_done)
+    update_scenes(stage.manifest_updates(targets, results, settings), manifest)
+    failed = [scene['id'] for scene in targets if scene['id'] not in results]
+    if failed:
+        raise JobError(f"synthesis failed for {', '.join(failed)}")
+    return {'synthesized': sorted(results)}
+
+
+def resize_job(service, params, report):
+    """Letterbox the manifest's screenshots (see resize_screenshots.py)."""
+    import resize_screenshots as stage
+    from scene_manifest import MANIFEST_FILE
+
+    result = stage.resize_scenes(params.get('manifest', MANIFEST_FILE),
+                                    params.get('output_dir', stage.output_dir),
+                                    params.get('jobs', stage.default_jobs),
+                                    params.get('compress_level', stage.png_compress_level),
+                                    params.get('force', False))
+    if result is None:
+        raise JobError('no scene images in the manifest; run the screenshots job first')
+    published, failed = result
+    if failed:
+        raise JobError(f"resizing failed for {', '.join(failed)}")
+    return {'published': published}
+
+
+def video_job(service, params, report):
+    """Assemble the video, streaming the encoder's progress."""
+    import create_video_resized_correct as video
+    from scene_manifest import MANIFEST_FILE
+
+    mode = params.get('mode', 'segments')
+    if mode not in video.ASSEMBLY_MODES:
+        raise JobError(f"unknown assembly mode '{mode}'")
+    profile = params.get('profile', video.default_profile)
+    if profile not in video.encoding_profiles:
+        raise JobError(f"unknown encoding profile '{profile}'")
+    scenes = video.load_scenes(params.get('manifest', MANIFEST_FILE))
+    if not scenes:
+        raise JobError('no scenes in the manifest; run the screenshots and audio jobs first')
+
+    output = params.get('output', video.output_video)
+    ok = video.ASSEMBLY_MODES[mode](
+        scenes, output, jobs=params.get('jobs', 1),
+        cache_dir=None if params.get('no_cache', False) else video.segment_cache_dir,
+        profile=profile, subtitles=params.get('subtitles', True),
+        on_progress=lambda progress: report(dict(progress, event='progress')),
+    )
+    if not ok:
+        raise JobError('video assembly failed (see the service output)')
+    return {'output': output, 'size_bytes': os.path.getsize(output)}
+
+
+JOBS = {
+    'screenshots': screenshots_job,
+    'audio': audio_job,
+    'resize': resize_job,
+    'video': video_job,
+}
+
+# What each job writes or reads; jobs that share a resource run one at a
+# time. 'ffmpeg' is the process-wide record of ffmpeg runs, which a job
+# drains when it finishes.
+JOB_RESOURCES = {
+    'screenshots': ('screenshots',),
+    'audio': ('audio', 'ffmpeg'),
+    'resize': ('screenshots', 'resized'),
+    'video': ('screenshots', 'resized', 'audio', 'video', 'ffmpeg'),
+}
+
+
+# -- service -----------------------------------------------------------------
+
+class RenderService:
+    """Runs submitted jobs on pools, sharing the warm generators and engines."""
+
+    def __init__(self, workers=default_workers, render_workers=default_render_workers):
+        self.warm = Warm()
+        self.jobs = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='job')
+        self.render_pool = ThreadPoolExecutor(max_workers=max(1, render_workers), thread_name_prefix='render')
+        self.started = time.time()
+        self.server = None
+        self._lock = threading.Lock()
+        self._resource_locks = {name: threading.Lock()
+                                for names in JOB_RESOURCES.values() for name in names}
+        self._next_id = 1
+        self.completed = 0
+
+    def preload(self):
+        """Import the stage modules and load the default generator."""
+        import create_video_resized_correct  # noqa: F401
+        import generate_audio  # noqa: F401
+        import generate_screenshots  # noqa: F401
+        import resize_screenshots  # noqa: F401
+
+        try:
+            self.warm.generator()
+        except Exception as e:
+            # The other jobs do not need Pillow or the fonts
+            print(f"  Warning: cannot load the code image generator ({e}); screenshots jobs will fail")
+
+    def status(self):
+        return {'pid': os.getpid(), 'uptime': round(time.time() - self.started, 1),
+                'completed': self.completed, 'warm': self.warm.describe()}
+
+    def handle(self, request, send):
+        """Run one request, sending its events; returns when it is finished."""
+        kind = request.get('job')
+        if kind == 'ping':
+            send({'event': 'done', 'result': self.status(), 'seconds': 0.0})
+            return
+        if kind == 'shutdown':
+            send({'event': 'done', 'result': {'stopping': True}, 'seconds': 0.0})
+            # shutdown() waits for serve_forever(), so it cannot run on a handler thread's caller
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+            return
+        if kind not in JOBS:
+            send({'event': 'error', 'message': f"unknown job '{kind}' (available: {', '.join(JOBS)})"})
+            return
+
+        with self._lock:
+            job_id = self._next_id
+            self._next_id += 1
+        send({'event': 'accepted', 'id': job_id})
+        self.jobs.submit(self._run, kind, request.get('params') or {}, send).result()
+
+    def _run(self, kind, params, send):
+        resources = sorted(JOB_RESOURCES[kind])  # always locked in the same order
+        with ExitStack() as stack:
+            for name in resources:
+                stack.enter_context(self._resource_locks[name])
+            start = time.perf_counter()
+            try:
+                result = JOBS[kind](self, params, send)
+            except JobError as e:
+                send({'event': 'error', 'message': str(e)})
+            except Exception as e:
+                send({'event': 'error', 'message': f"{type(e).__name__}: {e}"})
+            else:
+                send({'event': 'done', 'result': result, 'seconds': round(time.perf_counter() - start, 3)})
+            finally:
+                if 'ffmpeg' in resources:
+                    # Nothing here reports the ffmpeg runs; do not keep them forever
+                    from ffmpeg_runner import take_invocations
+                    take_invocations()
+                with self._lock:
+                    self.completed += 1
+
+    def close(self):
+        self.jobs.shutdown(wait=True)
+        self.render_pool.shutdown(wait=True)
+        self.warm.close()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        lock = threading.Lock()
+        connected = [True]
+
+        def send(event):
+            if not connected[0]:
+                return  # the client went away; the job still finishes
+            data = (json.dumps(event, ensure_ascii=False) + '\n').encode('utf-8')
+            with lock:
+                try:
+                    self.wfile.write(data)
+                    self.wfile.flush()
+                except OSError:
+                    connected[0] = False
+
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            send({'event': 'error', 'message': 'expected one JSON request line'})
+            return
+        if not isinstance(request, dict):
+            send({'event': 'error', 'message': 'the request must be a JSON object'})
+            return
+        self.server.service.handle(request, send)
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _is_running(path):
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+        return True
+    except OSError:
+        return False
+
+
+def serve(path=socket_path, workers=default_workers, render_workers=default_render_workers):
+    """Run the service on the Unix socket at `path` until shutdown or SIGTERM."""
+    if not hasattr(socket, 'AF_UNIX'):
+        raise JobError('the render service needs Unix domain sockets')
+    if os.path.exists(path):
+        if _is_running(path):
+            raise JobError(f"a render service is already listening on {path}")
+        os.remove(path)  # left over from a service that did not exit cleanly
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    service = RenderService(workers, render_workers)
+    print("Loading stages and fonts...")
+    service.preload()
+    server = _Server(path, _RequestHandler)
+    server.service = service
+    service.server = server
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+    print(f"✓ Render service listening on {path} (pid {os.getpid()})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.remove(path)
+        service.close()
+    print("✓ Render service stopped")
+
+
+# -- client ------------------------------------------------------------------
+
+def submit(job, params=None, path=socket_path):
+    """Send a job to the service and yield its events until it finishes."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall((json.dumps({'job': job, 'params': params or {}}) + '\n').encode('utf-8'))
+        with sock.makefile('rb') as stream:
+            for line in stream:
+                event = json.loads(line)
+                yield event
+                if event['event'] in ('done', 'error'):
+                    return
+    raise ConnectionError('the render service closed the connection')
+
+
+def _print_events(job, events):
+    """Print a job's events as they arrive; returns True if it succeeded."""
+    from ffmpeg_runner import progress_printer
+
+    show_progress = progress_printer(job)
+    for event in events:
+        if event['event'] == 'scene':
+            mark = '✗' if event['status'] == 'failed' else '✓'
+            detail = f": {event['message']}" if 'message' in event else ''
+            print(f"  {mark} {event['id']}: {event['status']}{detail}")
+        elif event['event'] == 'progress':
+            show_progress(event)
+        elif event['event'] == 'done':
+            print(f"✓ {job} done in {event['seconds']:.2f}s: {json.dumps(event['result'], ensure_ascii=False)}")
+            return True
+        elif event['event'] == 'error':
+            print(f"✗ {job} failed: {event['message']}")
+            return False
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run or use the resident render service')
+    parser.add_argument('--socket', default=socket_path, help=f'service socket (default: {socket_path})')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help='start the service in this directory')
+    serve_parser.add_argument('--workers', type=int, default=default_workers,
+                              help=f'jobs run at once (default: {default_workers})')
+    serve_parser.add_argument('--render-workers', type=int, default=default_render_workers,
+                              help=f'scenes rendered at once (default: {default_render_workers})')
+
+    screenshots = commands.add_parser('screenshots', help='render scenes (default: the changed ones)')
+    audio = commands.add_parser('audio', help='synthesize narrations (default: the changed ones)')
+    for job_parser in (screenshots, audio):
+        job_parser.add_argument('scenes', nargs='*', help='scene ids to regenerate')
+        job_parser.add_argument('--force', action='store_true', help='regenerate every scene')
+    screenshots.add_argument('--source', help='source file the scenes show')
+    audio.add_argument('--backend', help='TTS engine')
+    audio.add_argument('--no-cache', action='store_true', help='do not reuse cached narrations')
+
+    resize = commands.add_parser('resize', help='letterbox the screenshots')
+    resize.add_argument('--force', action='store_true', help='rewrite outputs that are up to date')
+
+    video = commands.add_parser('video', help='assemble the video')
+    video.add_argument('--mode', help='assembly mode (default: segments)')
+    video.add_argument('--profile', help='encoding profile')
+    video.add_argument('-o', '--output', help='output file')
+    video.add_argument('-j', '--jobs', type=int, help='segments encoded concurrently')
+    video.add_argument('--no-cache', action='store_true', help='re-encode every segment')
+    video.add_argument('--no-subtitles', action='store_true', help='do not mux subtitles')
+
+    commands.add_parser('ping', help='show the status of the service')
+    commands.add_parser('shutdown', help='stop the service')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        try:
+            serve(args.socket, args.workers, args.render_workers)
+        except JobError as e:
+            print(f"✗ Error: {e}")
+            sys.exit(1)
+        return
+
+    params = {key: value for key, value in vars(args).items()
+              if key not in ('socket', 'command') and value not in (None, False, [])}
+    if params.pop('no_subtitles', False):
+        params['subtitles'] = False
+    try:
+        ok = _print_events(args.command, submit(args.command, params, args.socket))
+    except (ConnectionError, FileNotFoundError) as e:
+        print(f"✗ Error: cannot reach the render service at {args.socket} ({e})")
+        print("  Start it with: python render_server.py serve")
+        sys.exit(1)
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,34 @@
 #!/usr/bin/env python3
 """
 Resize all screenshots to 1920x1080 with proper scaling and centering
+
+The screenshots listed in the scene manifest (the 'image' written by
+generate_screenshots.py) are letterboxed on a worker pool into
+output_dir, and each resized path is recorded in the manifest as
+'resized_image' for the video stage. Without a manifest, every PNG in
+input_dir is resized.
+
+An output that is newer than its input is left alone, and every output is
+written to a temporary file and renamed into place, so an interrupted run
+never leaves a truncated PNG.
+
+letterbox() composes the frame in memory and can be used on its own to
+feed the encoder without writing a file (see create_video_resized_correct.py,
+pipe mode).
+
+Usage:
+    python resize_screenshots.py [-j JOBS] [--compress-level 0-9] [--force]
+                                 [--output-dir DIR] [--manifest scenes.json]
 """
 
-from PIL import Image
+import argparse
 import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from build_profiler import span
+from scene_manifest import FILE_MODE, MANIFEST_FILE, load_manifest, update_scenes
 
 # Target resolution
 TARGET_WIDTH = 1920
@@ -13,68 +37,170 @@ TARGET_HEIGHT = 1080
 # Background color (dark gray to match code theme)
 BACKGROUND_COLOR = '#2d2d2d'
 
-# Create output directory
+# Share of the frame the screenshot may fill, leaving some padding
+FILL_RATIO = 0.9
+
+input_dir = "pic"
 output_dir = "pic_resized"
-os.makedirs(output_dir, exist_ok=True)
 
-print(f"Resizing screenshots to {TARGET_WIDTH}x{TARGET_HEIGHT}...")
+# zlib level for the PNG outputs: 0 (none) to 9 (smallest, slowest).
+# The resized images are intermediates read once by the encoder, so a
+# fast level is the default.
+png_compress_level = 1
+
+default_jobs = os.cpu_count() or 1
+
 
-# Process all PNG files in pic directory
-pic_files = [f for f in os.listdir('pic') if f.endswith('.png')]
+def letterbox(img, width=TARGET_WIDTH, height=TARGET_HEIGHT, background=BACKGROUND_COLOR,
+              fill_ratio=FILL_RATIO):
+    """Scale `img` to fit width x height and center it on a solid background.
+
+    Returns the composed RGB frame as a new PIL image.
+    """
+    from PIL import Image
 
-for filename in pic_files:
-    input_path = os.path.join('pic', filename)
-    output_path = os.path.join(output_dir, filename)
-    
-    print(f"\nProcessing {filename}...")
-    
-    # Open the original image
-    img = Image.open(input_path)
     original_width, original_height = img.size
-    print(f"  Original size: {original_width}x{original_height}")
-    
+
     # Calculate scaling factor to fit within target resolution while maintaining aspect ratio
-    scale_x = TARGET_WIDTH / original_width
-    scale_y = TARGET_HEIGHT / original_height
-    scale = min(scale_x, scale_y) * 0.9  # Use 90% to leave some padding
-    
-    # Calculate new dimensions
+    scale = min(width / original_width, height / original_height) * fill_ratio
     new_width = int(original_width * scale)
     new_height = int(original_height * scale)
-    
+
     # Resize the image with high quality
-    resized_img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-    
-    # Create a new image with target resolution and background color
-    final_img = Image.new('RGB', (TARGET_WIDTH, TARGET_HEIGHT), BACKGROUND_COLOR)
-    
-    # Calculate position to center the resized image
-    x_offset = (TARGET_WIDTH - new_width) // 2
-    y_offset = (TARGET_HEIGHT - new_height) // 2
-    
-    # Paste the resized image onto the background
-    final_img.paste(resized_img, (x_offset, y_offset))
-    
-    # Save the final image
-    final_img.save(output_path, quality=95, dpi=(300, 300))
-    print(f"  ✓ Saved to {output_path}")
-    print(f"  Resized to: {new_width}x{new_height} (scale: {scale:.2f})")
-    print(f"  Centered at: ({x_offset}, {y_offset})")
-
-print(f"\n✓ All screenshots resized and saved to '{output_dir}' directory")
-
-# Update create_video.py to use resized images
-print("\nUpdating video creation script to use resized images...")
-
-# Read the current create_video.py
-with open('create_video.py', 'r') as f:
-    content = f.read()
-
-# Replace pic/ with pic_resized/
-updated_content = content.replace('pic/', 'pic_resized/')
-
-# Write the updated content
-with open('create_video_resized.py', 'w') as f:
-    f.write(updated_content)
-
-print("✓ Created 'create_video_resized.py' that uses resized images")
\ No newline at end of file
+    resized_img = img.convert('RGB').resize((new_width, new_height), Image.Resampling.LANCZOS)
+
+    # Paste it centered onto a background of the target resolution
+    final_img = Image.new('RGB', (width, height), background)
+    final_img.paste(resized_img, ((width - new_width) // 2, (height - new_height) // 2))
+    return final_img
+
+
+def is_up_to_date(input_path, output_path):
+    """True if output_path exists and is newer than input_path."""
+    try:
+        return os.path.getmtime(output_path) >= os.path.getmtime(input_path)
+    except FileNotFoundError:
+        return False
+
+
+def save_png(img, output_path, compress_level=png_compress_level):
+    """Write `img` as PNG through a temporary file in the same directory."""
+    directory = os.path.dirname(os.path.abspath(output_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.resize-', suffix='.png')
+    os.close(fd)
+    try:
+        img.save(tmp_path, format='PNG', compress_level=compress_level)
+        os.chmod(tmp_path, FILE_MODE)  # open()'s mode, not mkstemp's 0600
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def resize_file(input_path, output_path, compress_level=png_compress_level, force=False):
+    """Letterbox one screenshot to output_path.
+
+    Returns (original_size, skipped).
+    """
+    if not force and is_up_to_date(input_path, output_path):
+        return None, True
+    from PIL import Image
+
+    with span('resize', 'resize', scene=os.path.basename(input_path)):
+        with Image.open(input_path) as img:
+            original_size = img.size
+            final_img = letterbox(img)
+        save_png(final_img, output_path, compress_level)
+    return original_size, False
+
+
+def resize_files(pairs, jobs=default_jobs, compress_level=png_compress_level, force=False):
+    """Letterbox each (input_path, output_path) pair on a worker pool.
+
+    Returns (done, failed): the output paths that are now up to date, and
+    the input paths that could not be resized.
+    """
+    done = []
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = [executor.submit(resize_file, input_path, output_path, compress_level, force)
+                   for input_path, output_path in pairs]
+        for (input_path, output_path), future in zip(pairs, futures):
+            filename = os.path.basename(input_path)
+            try:
+                original_size, skipped = future.result()
+            except OSError as e:
+                print(f"  ✗ {filename}: {e}")
+                failed.append(input_path)
+                continue
+            done.append(output_path)
+            if skipped:
+                print(f"  - {filename}: up to date")
+            else:
+                print(f"  ✓ {filename}: {original_size[0]}x{original_size[1]} -> "
+                      f"{TARGET_WIDTH}x{TARGET_HEIGHT}")
+    return done, failed
+
+
+def resize_all(source_dir=input_dir, target_dir=output_dir, jobs=default_jobs,
+               compress_level=png_compress_level, force=False):
+    """Letterbox every PNG in source_dir into target_dir; returns (done, failed)."""
+    os.makedirs(target_dir, exist_ok=True)
+    pairs = [(os.path.join(source_dir, filename), os.path.join(target_dir, filename))
+             for filename in sorted(os.listdir(source_dir)) if filename.endswith('.png')]
+    return resize_files(pairs, jobs, compress_level, force)
+
+
+def resize_scenes(manifest_path=MANIFEST_FILE, target_dir=output_dir, jobs=default_jobs,
+                  compress_level=png_compress_level, force=False):
+    """Letterbox the manifest's scene images and record them as 'resized_image'.
+
+    Returns (published, failed): the number of scenes published and the ids
+    of the scenes that could not be resized, or None if the manifest lists no
+    images.
+    """
+    scenes = [scene for scene in load_manifest(manifest_path)['scenes'] if 'image' in scene]
+    if not scenes:
+        return None
+    os.makedirs(target_dir, exist_ok=True)
+    outputs = {scene['id']: os.path.join(target_dir, os.path.basename(scene['image']))
+               for scene in scenes}
+    done, _ = resize_files([(scene['image'], outputs[scene['id']]) for scene in scenes],
+                           jobs, compress_level, force)
+    done = set(done)
+    updates = [{'id': scene_id, 'resized_image': path}
+               for scene_id, path in outputs.items() if path in done]
+    update_scenes(updates, manifest_path)
+    return len(updates), [scene_id for scene_id, path in outputs.items() if path not in done]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=f'Letterbox screenshots to {TARGET_WIDTH}x{TARGET_HEIGHT}')
+    parser.add_argument('-j', '--jobs', type=int, default=default_jobs,
+                        help=f'images processed concurrently (default: {default_jobs})')
+    parser.add_argument('--compress-level', type=int, choices=range(10), default=png_compress_level,
+                        metavar='0-9', help=f'PNG compression level (default: {png_compress_level})')
+    parser.add_argument('--force', action='store_true', help='rewrite outputs that are up to date')
+    parser.add_argument('--output-dir', default=output_dir,
+                        help=f'directory for the resized images (default: {output_dir})')
+    parser.add_argument('--manifest', default=MANIFEST_FILE,
+                        help=f'scene manifest to read and update (default: {MANIFEST_FILE})')
+    args = parser.parse_args()
+
+    print(f"Resizing screenshots to {TARGET_WIDTH}x{TARGET_HEIGHT}...")
+    result = resize_scenes(args.manifest, args.output_dir, args.jobs, args.compress_level, args.force)
+    if result is None:
+        print(f"  No scene images in {args.manifest}; resizing every PNG in '{input_dir}'")
+        done, failed = resize_all(input_dir, args.output_dir, args.jobs, args.compress_level, args.force)
+        print(f"\n✓ {len(done)} screenshots saved to '{args.output_dir}' directory")
+    else:
+        published, failed = result
+        print(f"\n✓ {published} screenshots saved to '{args.output_dir}' directory")
+        print(f"✓ Updated scene manifest: {args.manifest}")
+    if failed:
+        print(f"✗ {len(failed)} screenshots could not be resized")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
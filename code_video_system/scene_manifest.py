@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Scene manifest shared by the pipeline stages
+
+The manifest (scenes.json) records what each stage produced for every
+scene, so later stages read those values instead of hard-coding or
+re-probing them:
+
+    generate_screenshots.py  -> image, gap, code_hash, render_settings
+    resize_screenshots.py    -> resized_image
+    generate_audio.py        -> audio, duration, text, audio_settings
+
+    {
+      "version": 1,
+      "scenes": [
+        {"id": "scene01", "image": "pic/scene01_import.png", "gap": 1.0,
+         "resized_image": "pic_resized/scene01_import.png",
+         "audio": "audio/scene01_narration.mp3", "duration": 7.326,
+         "text": "このプログラムは、..."},
+        ...
+      ]
+    }
+
+Usage:
+    python scene_manifest.py            # print the manifest
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+MANIFEST_FILE = 'scenes.json'
+MANIFEST_VERSION = 1
+
+_lock = threading.Lock()
+
+# mkstemp creates files with mode 0600; the manifest gets the mode open()
+# would give it. The umask can only be read by setting it, so that is done
+# once at import, before any worker threads exist.
+_umask = os.umask(0)
+os.umask(_umask)
+FILE_MODE = 0o666 & ~_umask
+
+
+@contextmanager
+def _locked(path):
+    """Hold the manifest lock for this process and, where supported, others.
+
+    Pipeline stages run as separate processes and may update the manifest
+    at the same time.
+    """
+    with _lock:
+        if fcntl is None:
+            yield
+            return
+        with open(f"{path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def load_manifest(path=MANIFEST_FILE):
+    """Return the manifest at `path`, or an empty manifest if it does not exist."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {'version': MANIFEST_VERSION, 'scenes': []}
+    manifest.setdefault('scenes', [])
+    return manifest
+
+
+def save_manifest(manifest, path=MANIFEST_FILE):
+    """Write the manifest atomically."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.scenes-', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        os.chmod(tmp_path, FILE_MODE)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def update_scenes(updates, path=MANIFEST_FILE, prune=False):
+    """Merge per-scene fields into the manifest.
+
+    `updates` is a list of dicts that each contain an 'id'. Existing scenes
+    keep their position; new scenes are appended in the given order. With
+    prune=True, `updates` lists every scene: others are dropped and the
+    manifest takes the order of `updates`.
+    """
+    with _locked(path):
+        manifest = load_manifest(path)
+        by_id = {scene['id']: scene for scene in manifest['scenes']}
+        for update in updates:
+            scene = by_id.get(update['id'])
+            if scene is None:
+                scene = {'id': update['id']}
+                manifest['scenes'].append(scene)
+                by_id[scene['id']] = scene
+            scene.update(update)
+        if prune:
+            manifest['scenes'] = [by_id[update['id']] for update in updates]
+        manifest['version'] = MANIFEST_VERSION
+        save_manifest(manifest, path)
+        return manifest
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else MANIFEST_FILE
+    manifest = load_manifest(path)
+    if not manifest['scenes']:
+        print(f"No scenes recorded in {path}")
+        return
+    for scene in manifest['scenes']:
+        fields = ', '.join(f"{key}={value}" for key, value in scene.items() if key != 'id')
+        print(f"  {scene['id']}: {fields}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+script.txt: the scene definitions shared by every stage
+
+Each scene is a block of the form
+
+    # インポート部分（行番号1-3）
+    [実際の表示時間: 7.3秒]
+    [表示行: 1-3]
+    [画像ファイル: pic/scene01_import.png]
+    [音声ファイル: audio/scene01_narration.mp3]
+
+    Narration text, one or more lines.
+
+generate_screenshots.py renders the 表示行 range of the source file to the
+画像ファイル, and generate_audio.py synthesizes the narration to the
+音声ファイル. The scene id is the image name up to the first underscore
+(scene01).
+
+Stages record what they built from each scene in the scene manifest
+(code_hash, text, and a hash of the renderer or TTS/encoder settings), so
+diff_scenes() can tell which scenes changed since the last build and only
+those are rendered or synthesized again. In the
+other direction, sync_display_times() writes the measured narration
+durations back into the 実際の表示時間 fields.
+
+Usage:
+    python scene_script.py                 # list scenes and what changed
+    python scene_script.py --sync-times    # write measured durations back
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+
+from scene_manifest import MANIFEST_FILE, load_manifest
+
+SCRIPT_FILE = 'script.txt'
+
+_HEADER = re.compile(r'^#\s*(?P<title>.*?)\s*(?:（行番号\s*\d+\s*-\s*\d+\s*）)?\s*$')
+_FIELD = re.compile(r'^\[(?P<key>[^:：\]]+)[:：]\s*(?P<value>.*?)\s*\]$')
+_RANGE = re.compile(r'^(\d+)\s*-\s*(\d+)$')
+_SECONDS = re.compile(r'^([0-9.]+)\s*秒?$')
+
+_FIELDS = {
+    '実際の表示時間': 'display_time',
+    '表示行': 'lines',
+    '画像ファイル': 'image',
+    '音声ファイル': 'audio',
+}
+
+
+class ScriptError(ValueError):
+    """script.txt is malformed."""
+
+
+def _finish(scene, path):
+    missing = [label for label, key in (('表示行', 'start'), ('画像ファイル', 'image'))
+               if key not in scene]
+    if missing:
+        raise ScriptError(f"{path}:{scene['line']}: scene '{scene['title']}' has no "
+                          f"{', '.join(missing)}")
+    scene['text'] = '\n'.join(scene.pop('_text')).strip()
+    scene['name'] = os.path.splitext(os.path.basename(scene['image']))[0]
+    scene['id'] = scene['name'].split('_', 1)[0]
+    scene.setdefault('audio', f"audio/{scene['id']}_narration.mp3")
+    return scene
+
+
+def parse_script(text, path=SCRIPT_FILE):
+    """Parse script text into a list of scene dicts.
+
+    Each scene has id, name, title, start, end, image, audio, text,
+    display_time (seconds or None) and line (of its header).
+    """
+    scenes = []
+    scene = None
+    for number, raw_line in enumerate(text.splitlines(), 1):
+        line = raw_line.strip()
+        header = _HEADER.match(line) if line.startswith('#') else None
+        if header:
+            if scene is not None:
+                scenes.append(_finish(scene, path))
+            scene = {'title': header.group('title'), 'line': number, 'display_time': None,
+                     '_text': []}
+            continue
+
+        field = _FIELD.match(line)
+        if field and field.group('key') in _FIELDS:
+            if scene is None:
+                raise ScriptError(f"{path}:{number}: field before the first scene header")
+            key, value = _FIELDS[field.group('key')], field.group('value')
+            if key == 'lines':
+                match = _RANGE.match(value)
+                if not match:
+                    raise ScriptError(f"{path}:{number}: bad line range '{value}'")
+                scene['start'], scene['end'] = int(match.group(1)), int(match.group(2))
+            elif key == 'display_time':
+                match = _SECONDS.match(value)
+                if not match:
+                    raise ScriptError(f"{path}:{number}: bad display time '{value}'")
+                scene['display_time'] = float(match.group(1))
+            else:
+                scene[key] = value
+            continue
+
+        if scene is None:
+            if line:
+                raise ScriptError(f"{path}:{number}: text before the first scene header")
+            continue
+        scene['_text'].append(line)
+
+    if scene is not None:
+        scenes.append(_finish(scene, path))
+
+    ids = [scene['id'] for scene in scenes]
+    duplicates = sorted({scene_id for scene_id in ids if ids.count(scene_id) > 1})
+    if duplicates:
+        raise ScriptError(f"{path}: duplicate scene ids: {', '.join(duplicates)}")
+    return scenes
+
+
+def load_script(path=SCRIPT_FILE):
+    """Read and parse the script file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return parse_script(f.read(), path)
+
+
+def format_script(scenes):
+    """Return script text for `scenes`, in the format parse_script() reads."""
+    blocks = []
+    for scene in scenes:
+        lines = [f"# {scene['title']}（行番号{scene['start']}-{scene['end']}）"]
+        if scene.get('display_time') is not None:
+            lines.append(f"[実際の表示時間: {scene['display_time']:.1f}秒]")
+        lines += [
+            f"[表示行: {scene['start']}-{scene['end']}]",
+            f"[画像ファイル: {scene['image']}]",
+            f"[音声ファイル: {scene['audio']}]",
+            '',
+            scene['text'],
+        ]
+        blocks.append('\n'.join(lines))
+    return '\n\n'.join(blocks) + '\n'
+
+
+def save_script(scenes, path=SCRIPT_FILE):
+    """Write `scenes` to the script file atomically."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(format_script(scenes))
+    os.replace(tmp_path, path)
+
+
+def code_hash(scene, source_lines):
+    """Hash of everything a scene's screenshot is rendered from."""
+    digest = hashlib.sha256()
+    digest.update(f"{scene['start']}-{scene['end']}\0".encode('utf-8'))
+    digest.update(''.join(source_lines[scene['start'] - 1:scene['end']]).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def settings_hash(*settings):
+    """Hash of the settings dicts an output is generated with."""
+    data = json.dumps(settings, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+def diff_scenes(scenes, manifest, source_lines=None, render_settings=None, audio_settings=None):
+    """Compare the script with what the manifest says was last built.
+
+    Returns {'screenshots': [...], 'audio': [...], 'removed': [...]} with
+    the ids of scenes whose screenshot or narration needs to be rebuilt
+    (new, edited, built with other settings, or with a missing output) and
+    of manifest scenes no longer in the script. Screenshots are only
+    compared when source_lines is given. render_settings and
+    audio_settings are settings_hash() values of the renderer and of the
+    TTS backend and encoder; a scene built with different ones has
+    changed (they are not compared when None).
+    """
+    built = {entry['id']: entry for entry in manifest['scenes']}
+    changes = {'screenshots': [], 'audio': [], 'removed': []}
+    for scene in scenes:
+        entry = built.get(scene['id'], {})
+        if source_lines is not None and (
+                entry.get('code_hash') != code_hash(scene, source_lines)
+                or (render_settings is not None and entry.get('render_settings') != render_settings)
+                or entry.get('image') != scene['image']
+                or not os.path.exists(scene['image'])):
+            changes['screenshots'].append(scene['id'])
+        if (entry.get('text') != scene['text'] or entry.get('audio') != scene['audio']
+                or (audio_settings is not None and entry.get('audio_settings') != audio_settings)
+                or 'duration' not in entry or not os.path.exists(scene['audio'])):
+            changes['audio'].append(scene['id'])
+    script_ids = {scene['id'] for scene in scenes}
+    changes['removed'] = [scene_id for scene_id in built if scene_id not in script_ids]
+    return changes
+
+
+def sync_display_times(scenes, manifest):
+    """Set each scene's display_time from the measured narration duration.
+
+    Returns the number of scenes whose display time changed.
+    """
+    built = {entry['id']: entry for entry in manifest['scenes']}
+    changed = 0
+    for scene in scenes:
+        duration = built.get(scene['id'], {}).get('duration')
+        if duration is None:
+            continue
+        display_time = round(duration, 1)
+        if scene.get('display_time') != display_time:
+            scene['display_time'] = display_time
+            changed += 1
+    return changed
+
+
+def current_settings(backend_name=None):
+    """(render_settings, audio_settings) hashes as the stages compute them.
+
+    Either is None, and not compared, when its renderer or TTS engine
+    cannot be loaded here.
+    """
+    # The stage modules import this one, so they are imported on use
+    import generate_audio
+    import generate_screenshots
+    from tts_backends import TTSError, get_backend
+
+    try:
+        render_settings = generate_screenshots.render_settings(generate_screenshots.create_generator())
+    except (OSError, RuntimeError) as e:
+        print(f"  Note: renderer settings not compared ({e})")
+        render_settings = None
+    try:
+        backend = get_backend(backend_name or generate_audio.backend_name,
+                              voice=generate_audio.voice, rate=generate_audio.rate)
+    except TTSError as e:
+        print(f"  Note: TTS settings not compared ({e})")
+        return render_settings, None
+    try:
+        return render_settings, generate_audio.audio_settings(backend)
+    finally:
+        backend.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show the scenes in script.txt and what changed since the last build')
+    parser.add_argument('--script', default=SCRIPT_FILE, help=f'script file (default: {SCRIPT_FILE})')
+    parser.add_argument('--source', default='rbeta.py', help='source file the screenshots show (default: rbeta.py)')
+    parser.add_argument('--manifest', default=MANIFEST_FILE,
+                        help=f'scene manifest to compare with (default: {MANIFEST_FILE})')
+    parser.add_argument('--sync-times', action='store_true',
+                        help='write the measured narration durations back to the script')
+    parser.add_argument('--backend', default=None,
+                        help="TTS engine the narrations are built with (default: generate_audio.py's)")
+    args = parser.parse_args()
+
+    scenes = load_script(args.script)
+    manifest = load_manifest(args.manifest)
+
+    if args.sync_times:
+        changed = sync_display_times(scenes, manifest)
+        if changed:
+            save_script(scenes, args.script)
+        print(f"✓ Updated {changed} display times in {args.script}")
+        return
+
+    with open(args.source, 'r', encoding='utf-8') as f:
+        source_lines = f.readlines()
+    changes = diff_scenes(scenes, manifest, source_lines, *current_settings(args.backend))
+
+    for scene in scenes:
+        marks = [kind for kind in ('screenshots', 'audio') if scene['id'] in changes[kind]]
+        status = f"changed: {', '.join(marks)}" if marks else 'up to date'
+        print(f"  {scene['id']}: lines {scene['start']}-{scene['end']}, {scene['title']} ({status})")
+    for scene_id in changes['removed']:
+        print(f"  {scene_id}: removed from the script")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Subtitles from the narration text
+
+Each scene's narration (the 'text' recorded in the scene manifest by
+generate_audio.py) is split into cues at sentence ends, and long sentences
+again at commas. The cues share the scene's measured narration duration in
+proportion to their length in characters, and each scene starts at its
+frame-aligned position on the video timeline (audio_timeline.py).
+
+The result is written as SRT or WebVTT. create_video_resized_correct.py
+muxes the SRT into the MP4 as a soft mov_text stream, so the subtitles can
+be switched off and never require the frames to be re-rendered.
+
+Usage:
+    python subtitles.py                     # rbeta_tutorial.srt
+    python subtitles.py -o rbeta_tutorial.vtt --fps 5
+"""
+
+import argparse
+import os
+import re
+
+from audio_timeline import frame_aligned_timeline
+from scene_manifest import MANIFEST_FILE, load_manifest
+
+# Longest cue, in characters, before a sentence is split at commas
+max_cue_chars = 40
+
+_SENTENCE_END = re.compile(r'(?<=[。．！？!?])|\n')
+_CLAUSE_END = re.compile(r'(?<=[、，,])')
+
+
+def _weight(text):
+    """Reading length of a cue: its characters without whitespace."""
+    return len(re.sub(r'\s+', '', text)) or 1
+
+
+def split_cues(text, max_chars=max_cue_chars):
+    """Split narration text into cue strings."""
+    cues = []
+    for sentence in _SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(sentence) <= max_chars:
+            cues.append(sentence)
+            continue
+        # Pack clauses into cues of at most max_chars where possible
+        current = ''
+        for clause in _CLAUSE_END.split(sentence):
+            if current and len(current) + len(clause) > max_chars:
+                cues.append(current.strip())
+                current = ''
+            current += clause
+        if current.strip():
+            cues.append(current.strip())
+    return cues
+
+
+def scene_cues(scenes, fps):
+    """Return [(start, end, text)] for every scene that has narration text.
+
+    Cues cover the narration only; the scene's gap stays without subtitles.
+    """
+    cues = []
+    for scene, (start, _) in zip(scenes, frame_aligned_timeline(scenes, fps)):
+        parts = split_cues(scene.get('text') or '')
+        if not parts:
+            continue
+        total_weight = sum(_weight(part) for part in parts)
+        position = start
+        for part in parts:
+            length = scene['duration'] * _weight(part) / total_weight
+            cues.append((position, position + length, part))
+            position += length
+    return cues
+
+
+def _timestamp(seconds, separator):
+    millis = max(0, round(seconds * 1000))
+    hours, millis = divmod(millis, 3_600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+
+def format_srt(cues):
+    blocks = []
+    for index, (start, end, text) in enumerate(cues, 1):
+        blocks.append(f"{index}\n{_timestamp(start, ',')} --> {_timestamp(end, ',')}\n{text}\n")
+    return '\n'.join(blocks)
+
+
+def format_vtt(cues):
+    blocks = ['WEBVTT\n']
+    for start, end, text in cues:
+        blocks.append(f"{_timestamp(start, '.')} --> {_timestamp(end, '.')}\n{text}\n")
+    return '\n'.join(blocks)
+
+
+FORMATS = {
+    '.srt': format_srt,
+    '.vtt': format_vtt,
+}
+
+
+def write_subtitles(scenes, path, fps):
+    """Write subtitles for `scenes` to `path` (.srt or .vtt); returns the cue count."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unsupported subtitle format: {extension} (use .srt or .vtt)")
+    cues = scene_cues(scenes, fps)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(FORMATS[extension](cues))
+    return len(cues)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write subtitles from the narration text')
+    parser.add_argument('-o', '--output', default='rbeta_tutorial.srt',
+                        help='output file, .srt or .vtt (default: rbeta_tutorial.srt)')
+    parser.add_argument('--fps', type=int, default=30,
+                        help='frame rate of the video the subtitles are for (default: 30)')
+    parser.add_argument('--manifest', default=MANIFEST_FILE,
+                        help=f'scene manifest to read (default: {MANIFEST_FILE})')
+    args = parser.parse_args()
+
+    scenes = [scene for scene in load_manifest(args.manifest)['scenes'] if 'duration' in scene]
+    for scene in scenes:
+        scene.setdefault('gap', 0.0)
+    count = write_subtitles(scenes, args.output, args.fps)
+    print(f"✓ Wrote {count} cues to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
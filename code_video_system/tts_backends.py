@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Text-to-speech backends for the narration stage
+
+All backends share one interface so generate_audio.py does not depend on a
+particular engine:
+
+    backend = get_backend('espeak', voice='ja', rate=225)
+    backend.stream(text, sink)            # raw PCM written to sink
+
+PCM is always signed 16-bit little-endian mono at backend.sample_rate.
+The 'silence' backend needs no engine: it emits silence as long as the
+narration would take to read, for benchmarks and tests of the later stages.
+A backend is created once and reused for every scene, so engines that can
+stay loaded (libespeak-ng) are initialised only once per run.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import wave
+
+
+class TTSError(Exception):
+    """Raised when a TTS engine is unavailable or fails."""
+
+
+class TTSBackend:
+    """Base class for text-to-speech engines."""
+
+    name = None
+    default_voice = None
+    sample_rate = 22050
+
+    def __init__(self, voice=None, rate=225):
+        self.voice = voice or self.default_voice
+        self.rate = rate
+
+    def stream(self, text, sink):
+        """Write raw PCM for `text` to the file-like `sink`."""
+        raise NotImplementedError
+
+    def settings(self):
+        """Return the parameters that determine the generated audio."""
+        return {
+            'backend': self.name,
+            'voice': self.voice,
+            'rate': self.rate,
+            'sample_rate': self.sample_rate,
+        }
+
+    def close(self):
+        """Release engine resources."""
+
+
+class SayBackend(TTSBackend):
+    """macOS `say` command (Kyoko/Otoya voices for Japanese).
+
+    say can only write to a seekable file, so stream() renders into a
+    private temporary directory that is removed even if the run fails.
+    """
+
+    name = 'say'
+    default_voice = 'Kyoko'
+
+    def __init__(self, voice=None, rate=225):
+        super().__init__(voice, rate)
+        if shutil.which('say') is None:
+            raise TTSError("'say' command not found (macOS only)")
+
+    def stream(self, text, sink):
+        with tempfile.TemporaryDirectory(prefix='say-') as tmp_dir:
+            wav_path = os.path.join(tmp_dir, 'narration.wav')
+            cmd = [
+                'say',
+                '-v', self.voice,
+                '-r', str(self.rate),
+                f'--data-format=LEI16@{self.sample_rate}',
+                '-o', wav_path,
+                text
+            ]
+            subprocess.run(cmd, check=True, capture_output=True)
+            with wave.open(wav_path, 'rb') as wav_file:
+                while True:
+                    frames = wav_file.readframes(8192)
+                    if not frames:
+                        break
+                    sink.write(frames)
+
+
+class _EspeakLibrary:
+    """ctypes wrapper around libespeak-ng, initialised once per process."""
+
+    AUDIO_OUTPUT_SYNCHRONOUS = 0x02
+    POS_CHARACTER = 1
+    ESPEAK_CHARS_UTF8 = 1
+    ESPEAK_RATE = 1
+
+    SYNTH_CALLBACK = ctypes.CFUNCTYPE(
+        ctypes.c_int, ctypes.POINTER(ctypes.c_short), ctypes.c_int, ctypes.c_void_p
+    )
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get(cls):
+        """Return the shared library instance, or None if it is not installed."""
+        with cls._instance_lock:
+            if cls._instance is None:
+                path = ctypes.util.find_library('espeak-ng')
+                if path is None:
+                    return None
+                cls._instance = cls(path)
+            return cls._instance
+
+    def __init__(self, path):
+        lib = ctypes.CDLL(path)
+        lib.espeak_Initialize.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_char_p, ctypes.c_int]
+        lib.espeak_SetSynthCallback.argtypes = [self.SYNTH_CALLBACK]
+        lib.espeak_SetVoiceByName.argtypes = [ctypes.c_char_p]
+        lib.espeak_SetParameter.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int]
+        lib.espeak_Synth.argtypes = [
+            ctypes.c_char_p, ctypes.c_size_t, ctypes.c_uint, ctypes.c_int,
+            ctypes.c_uint, ctypes.c_uint, ctypes.c_void_p, ctypes.c_void_p
+        ]
+
+        self.sample_rate = lib.espeak_Initialize(self.AUDIO_OUTPUT_SYNCHRONOUS, 0, None, 0)
+        if self.sample_rate <= 0:
+            raise TTSError(f"espeak_Initialize failed ({self.sample_rate})")
+
+        # Keep a reference to the callback so it is not garbage collected
+        self._callback = self.SYNTH_CALLBACK(self._on_audio)
+        lib.espeak_SetSynthCallback(self._callback)
+
+        self.lib = lib
+        self._sink = None
+        self._error = None
+        # The engine has global state, so synthesis is serialised
+        self.lock = threading.Lock()
+
+    def _on_audio(self, wav, num_samples, events):
+        if wav and num_samples > 0:
+            try:
+                self._sink.write(ctypes.string_at(wav, num_samples * 2))
+            except Exception as e:
+                # ctypes would print and ignore an exception raised here;
+                # keep it for speak() and make espeak_Synth stop
+                self._error = e
+                return 1
+        return 0
+
+    def speak(self, text, voice, rate, sink):
+        data = text.encode('utf-8') + b'\0'
+        with self.lock:
+            if self.lib.espeak_SetVoiceByName(voice.encode('utf-8')) != 0:
+                raise TTSError(f"espeak-ng voice '{voice}' not found")
+            self.lib.espeak_SetParameter(self.ESPEAK_RATE, int(rate), 0)
+            self._sink = sink
+            self._error = None
+            try:
+                result = self.lib.espeak_Synth(
+                    data, len(data), 0, self.POS_CHARACTER, 0,
+                    self.ESPEAK_CHARS_UTF8, None, None
+                )
+                if self._error is None:
+                    self.lib.espeak_Synchronize()
+                if self._error is not None:
+                    raise self._error
+                if result != 0:
+                    raise TTSError(f"espeak_Synth failed ({result})")
+            finally:
+                self._sink = None
+                self._error = None
+
+
+class EspeakBackend(TTSBackend):
+    """espeak-ng, an offline engine available on Linux, macOS and Windows.
+
+    libespeak-ng is loaded in-process when available so the engine stays
+    warm across scenes. Otherwise each scene runs the espeak-ng command and
+    its WAV output is read from a pipe.
+    """
+
+    name = 'espeak'
+    default_voice = 'ja'
+
+    def __init__(self, voice=None, rate=225):
+        super().__init__(voice, rate)
+        self._library = _EspeakLibrary.get()
+        if self._library is not None:
+            self.sample_rate = self._library.sample_rate
+        else:
+            self._command = shutil.which('espeak-ng') or shutil.which('espeak')
+            if self._command is None:
+                raise TTSError('espeak-ng is not installed (library or command)')
+
+    def stream(self, text, sink):
+        if self._library is not None:
+            self._library.speak(text, self.voice, self.rate, sink)
+            return
+
+        cmd = [self._command, '-v', self.voice, '-s', str(self.rate), '--stdout', text]
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            _skip_wav_header(proc.stdout, self.sample_rate)
+            shutil.copyfileobj(proc.stdout, sink)
+        finally:
+            proc.stdout.close()
+            stderr = proc.stderr.read()
+            proc.stderr.close()
+            proc.wait()
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=stderr)
+
+
+def _skip_wav_header(stream, expected_rate):
+    """Consume a streamed RIFF/WAVE header up to the start of the data chunk."""
+    header = stream.read(12)
+    if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+        raise TTSError('espeak-ng did not produce WAV output')
+    while True:
+        chunk = stream.read(8)
+        if len(chunk) < 8:
+            raise TTSError('WAV stream ended before the data chunk')
+        chunk_id, size = chunk[:4], struct.unpack('<I', chunk[4:])[0]
+        if chunk_id == b'data':
+            return
+        body = stream.read(size + (size & 1))
+        if chunk_id == b'fmt ':
+            channels, rate = struct.unpack('<HI', body[2:8])
+            bits = struct.unpack('<H', body[14:16])[0]
+            if (channels, rate, bits) != (1, expected_rate, 16):
+                raise TTSError(f'unexpected WAV format: {channels}ch {rate}Hz {bits}bit')
+
+
+class SilenceBackend(TTSBackend):
+    """Silence of the narration's estimated reading time, without an engine.
+
+    The duration depends only on the text and rate, so runs are
+    reproducible: `rate` words per minute at chars_per_word characters per
+    word, whitespace excluded.
+    """
+
+    name = 'silence'
+    default_voice = 'none'
+    chars_per_word = 2
+    min_duration = 0.5
+
+    def duration(self, text):
+        """Seconds of silence emitted for `text`."""
+        chars = len(''.join(text.split()))
+        return max(self.min_duration, chars / (self.rate / 60 * self.chars_per_word))
+
+    def stream(self, text, sink):
+        remaining = int(self.duration(text) * self.sample_rate) * 2
+        chunk = bytes(8192)
+        while remaining > 0:
+            sink.write(chunk[:remaining])
+            remaining -= len(chunk)
+
+
+BACKENDS = {
+    'say': SayBackend,
+    'espeak': EspeakBackend,
+    'silence': SilenceBackend,
+}
+
+
+def get_backend(name, voice=None, rate=225):
+    """Create the backend registered under `name`."""
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise TTSError(f"Unknown TTS backend '{name}' (available: {', '.join(BACKENDS)})")
+    return backend_class(voice=voice, rate=rate)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark the video assembly modes and encoding profiles of
+create_video_resized_correct.py
+
+Runs every mode/profile combination on the same scenes and reports wall
+time, CPU time of the ffmpeg child processes, output size, SSIM and PSNR.
+Quality is measured locally with ffmpeg's ssim/psnr filters, comparing a
+frame from the middle of each scene with the source screenshot.
+
+Usage:
+    python video_benchmark.py [--repeat N] [--profiles standard still]
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import create_video_resized_correct as video
+from audio_timeline import frame_aligned_timeline
+
+
+def children_cpu_time():
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def scene_quality(output, scene, timestamp):
+    """Return (SSIM, PSNR) of the frame at `timestamp` against the scene's source image."""
+    width, height = video.resolution.split('x')
+    cmd = [
+        'ffmpeg',
+        '-ss', f"{timestamp:.3f}",
+        '-i', output,
+        '-i', scene['image'],
+        '-frames:v', '1',
+        '-lavfi',
+        f"[0:v]format=yuv420p,split[enc1][enc2];"
+        f"[1:v]scale={width}:{height},format=yuv420p,split[ref1][ref2];"
+        f"[enc1][ref1]ssim;[enc2][ref2]psnr",
+        '-f', 'null', '-'
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    ssim = re.search(r'SSIM .*All:([0-9.]+)', result.stderr)
+    psnr = re.search(r'PSNR .*average:([0-9.]+|inf)', result.stderr)
+    return (float(ssim.group(1)) if ssim else None,
+            float(psnr.group(1)) if psnr else None)
+
+
+def _average(values):
+    return sum(values) / len(values) if values else None
+
+
+def mean_quality(output, scenes, fps):
+    """Average (SSIM, PSNR) over the middle frame of every scene."""
+    ssim_values = []
+    psnr_values = []
+    for scene, (start, _) in zip(scenes, frame_aligned_timeline(scenes, fps)):
+        ssim, psnr = scene_quality(output, scene, start + scene['duration'] / 2)
+        if ssim is not None:
+            ssim_values.append(ssim)
+        if psnr is not None:
+            psnr_values.append(psnr)
+    return _average(ssim_values), _average(psnr_values)
+
+
+def run_mode(mode, scenes, output_dir, jobs=1, profile=video.default_profile):
+    """Assemble the video and return its measurements, or None on failure."""
+    output = os.path.join(output_dir, f"{mode}_{profile}.mp4")
+    work_dir = os.path.join(output_dir, f"{mode}_{profile}_work")
+
+    cpu_start = children_cpu_time()
+    start = time.perf_counter()
+    ok = video.ASSEMBLY_MODES[mode](scenes, output, work_dir, jobs=jobs, profile=profile)
+    wall_time = time.perf_counter() - start
+    cpu_time = children_cpu_time() - cpu_start
+
+    if not ok:
+        return None
+    return {
+        'mode': mode,
+        'profile': profile,
+        'output': output,
+        'wall_time': wall_time,
+        'cpu_time': cpu_time,
+        'size': os.path.getsize(output),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare video assembly modes and encoding profiles')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per combination (best is reported)')
+    parser.add_argument('--modes', nargs='+', choices=sorted(video.ASSEMBLY_MODES),
+                        default=sorted(video.ASSEMBLY_MODES))
+    parser.add_argument('--profiles', nargs='+', choices=sorted(video.encoding_profiles),
+                        default=sorted(video.encoding_profiles))
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='concurrent segment encoders')
+    parser.add_argument('--no-quality', action='store_true', help='skip the SSIM/PSNR measurement')
+    args = parser.parse_args()
+
+    scenes = video.load_scenes()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='video-bench-') as output_dir:
+        for mode in args.modes:
+            for profile in args.profiles:
+                runs = []
+                for _ in range(args.repeat):
+                    result = run_mode(mode, scenes, output_dir, args.jobs, profile)
+                    if result is not None:
+                        runs.append(result)
+                if not runs:
+                    print(f"✗ {mode}/{profile}: failed")
+                    continue
+                best = min(runs, key=lambda r: r['wall_time'])
+                best['ssim'] = best['psnr'] = None
+                if not args.no_quality:
+                    fps = video.encoding_profiles[profile]['fps']
+                    best['ssim'], best['psnr'] = mean_quality(best['output'], scenes, fps)
+                results.append(best)
+
+    print(f"\n{'mode':<14}{'profile':<10}{'wall (s)':>10}{'cpu (s)':>10}{'size (MB)':>11}"
+          f"{'SSIM':>9}{'PSNR':>8}")
+    for r in results:
+        ssim = f"{r['ssim']:.4f}" if r['ssim'] is not None else '-'
+        psnr = f"{r['psnr']:.2f}" if r['psnr'] is not None else '-'
+        print(f"{r['mode']:<14}{r['profile']:<10}{r['wall_time']:>10.2f}{r['cpu_time']:>10.2f}"
+              f"{r['size'] / (1024 * 1024):>11.2f}{ssim:>9}{psnr:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -11,6 +11,11 @@ import subprocess
 from pathlib import Path
 import tempfile
 import shutil
+import sys
+
+# ffmpegの実行は code_video_system の共通ランナーを使う
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "code_video_system"))
+from ffmpeg_runner import progress_printer, run_ffmpeg
 
 class ProfessionalVideoCreator:
     def __init__(self):
@@ -401,7 +406,9 @@ class ProfessionalVideoCreator:
                     str(output_with_audio)
                 ]
                 
-                subprocess.run(cmd, check=True, capture_output=True)
+                run_ffmpeg(cmd, duration=self.total_duration,
+                           log_file=str(self.output_dir / "add_audio_ffmpeg.log"),
+                           on_progress=progress_printer("audio mux"))
                 print(f"✅ Audio added successfully: {output_with_audio}")
                 return str(output_with_audio)
             else: